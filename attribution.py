@@ -0,0 +1,151 @@
+"""
+Per-prediction feature attribution for the shipped models.
+
+Both attributors split a model output into a base value plus one contribution
+per raw input column, so that ``base + contributions.sum()`` reproduces the
+model output exactly:
+
+* ``TreeAttributor`` (Random Forest) decomposes every tree along the decision
+  path of the row: each split moves the node value from the parent to the
+  child, and that change is credited to the split feature. Averaged over the
+  trees this adds up to ``predict_proba``. The sum along the path to every
+  leaf is precomputed once on the flattened forest (``FlatForest``), so
+  explaining a row costs one traversal and a table lookup. Units: probability.
+* ``LinearAttributor`` (Logistic Regression) uses coefficient × encoded value,
+  with One-Hot dummy columns summed back into their raw column. This adds up to
+  ``decision_function``. Units: log-odds.
+"""
+import threading
+import weakref
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from encoder import FeatureEncoder
+from forest_engine import FlatForest
+
+
+class TreeAttributor:
+    """
+    Path decomposition of a fitted ``RandomForestClassifier`` or ``FlatForest``.
+
+    Args:
+        forest: Fitted forest.
+        feature_names (Sequence[str], optional): Input column names; defaults
+            to ``forest.feature_names_in_``.
+    """
+    units = "probability"
+
+    def __init__(self, forest, feature_names: Optional[Sequence[str]] = None):
+        if feature_names is None:
+            feature_names = forest.feature_names_in_
+        self.feature_names: List[str] = list(feature_names)
+        self.forest = forest if isinstance(forest, FlatForest) else FlatForest.from_sklearn(forest)
+        self.classes = np.asarray(self.forest.classes_)
+        flat = self.forest
+        n_nodes, n_features, n_classes = len(flat.feature), len(self.feature_names), len(self.classes)
+
+        # node -> ผลรวมการเปลี่ยนแปลงของค่าทำนายตามเส้นทางจาก root มายัง node นี้ แยกตาม feature ที่ใช้แบ่ง
+        value = flat.leaf_value / flat.n_estimators
+        path = np.zeros((n_nodes, n_features, n_classes))
+        # node ลูกมี id มากกว่า node แม่เสมอ จึงสะสมค่าตามลำดับ id ได้
+        for parent in np.flatnonzero(flat.children_left != np.arange(n_nodes)):
+            feature = flat.feature[parent]
+            for child in (flat.children_left[parent], flat.children_right[parent]):
+                path[child] = path[parent]
+                path[child, feature] += value[child] - value[parent]
+        self.path_contributions = path.reshape(n_nodes, -1)
+        self.base = value[flat.roots].sum(axis=0)
+
+    def explain(self, X) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns ``(base, contributions)``.
+
+        Args:
+            X: Model input, ``(n_rows, n_features)``.
+
+        Returns:
+            tuple: ``base`` of shape ``(n_classes,)`` and ``contributions`` of
+            shape ``(n_rows, n_features, n_classes)``.
+        """
+        leaves = self.forest.apply(X)
+        total = np.zeros((leaves.shape[0], self.path_contributions.shape[1]))
+        for tree in range(leaves.shape[1]):
+            total += self.path_contributions[leaves[:, tree]]
+        return self.base, total.reshape(leaves.shape[0], len(self.feature_names), len(self.classes))
+
+
+class LinearAttributor:
+    """
+    Coefficient × value decomposition of a fitted linear classifier.
+
+    Args:
+        model: Fitted ``LogisticRegression``.
+        encoder (FeatureEncoder): Encoder that produced the model input; its
+            dummy columns are summed into their raw column.
+    """
+    units = "log-odds"
+
+    def __init__(self, model, encoder: FeatureEncoder):
+        self.classes = np.asarray(model.classes_)
+        coef = np.atleast_2d(model.coef_)
+        intercept = np.atleast_1d(model.intercept_)
+        if coef.shape[0] == 1:
+            # binary: decision_function เป็นคะแนนของ class บวก
+            coef = np.vstack([-coef, coef])
+            intercept = np.array([-intercept[0], intercept[0]])
+
+        raw_of = {idx: name for name, idx in encoder.numeric}
+        for col, values in encoder.dummies.items():
+            raw_of.update({idx: col for _, _, idx in values})
+        self.feature_names: List[str] = list(dict.fromkeys(raw_of[i] for i in range(encoder.n_features)))
+        # (encoded feature, raw feature) 0/1 matrix ที่รวม dummy กลับเป็นคอลัมน์เดิม
+        grouping = np.zeros((encoder.n_features, len(self.feature_names)))
+        grouping[np.arange(encoder.n_features), [self.feature_names.index(raw_of[i]) for i in range(encoder.n_features)]] = 1
+        self.grouping = grouping
+        self.coef = coef
+        self.base = intercept
+
+    def explain(self, X) -> Tuple[np.ndarray, np.ndarray]:
+        """Same contract as ``TreeAttributor.explain``, in log-odds."""
+        X = np.asarray(X, dtype=float)
+        contributions = X[:, :, None] * self.coef.T[None, :, :]
+        return self.base, np.einsum("nec,er->nrc", contributions, self.grouping)
+
+
+_attributors: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_attributors_lock = threading.Lock()
+
+
+def get_attributor(model, encoder: Optional[FeatureEncoder] = None, feature_names: Optional[Sequence[str]] = None):
+    """
+    Returns the attributor for ``model``, building it on first use.
+
+    Attributors are cached per model object and dropped together with it, so
+    a model reloaded by the registry gets a fresh one.
+
+    Args:
+        model: Fitted Random Forest or Logistic Regression model.
+        encoder (FeatureEncoder, optional): Required for linear models.
+        feature_names (Sequence[str], optional): Column names for forests
+            fitted without feature names.
+    """
+    with _attributors_lock:
+        attributor = _attributors.get(model)
+        if attributor is None:
+            if hasattr(model, "estimators_") or isinstance(model, FlatForest):
+                attributor = TreeAttributor(model, feature_names)
+            elif hasattr(model, "coef_"):
+                if encoder is None:
+                    raise ValueError("Linear models need the FeatureEncoder that built their input")
+                attributor = LinearAttributor(model, encoder)
+            else:
+                raise TypeError(f"Feature attribution is not supported for {type(model).__name__}")
+            _attributors[model] = attributor
+        return attributor
+
+
+def top_contributors(contributions: np.ndarray, feature_names: Sequence[str], k: int = 5) -> List[Tuple[str, float]]:
+    """Returns the ``k`` largest contributions of one row by absolute value, largest first."""
+    order = np.argsort(-np.abs(contributions), kind="stable")[:k]
+    return [(feature_names[i], float(contributions[i])) for i in order]
@@ -0,0 +1,165 @@
+"""
+Headless batch scoring.
+
+Reads a CSV or Parquet file of applicants with the same columns as the app's
+``data_to_predict`` and writes one scored row per applicant, chunk by chunk, so
+files larger than memory can be scored overnight.
+
+Usage:
+    python batch_score.py applicants.csv scored.csv
+    python batch_score.py applicants.csv scored.csv --explain rules
+    python batch_score.py applicants.csv scored.csv --top-factors 3
+    python batch_score.py applicants.parquet scored.parquet --model C2M1_Credit_score_with_Logistic_Regression_Model.pkl
+    python batch_score.py applicants.csv scored.csv --backend onnx
+    python batch_score.py applicants.csv scored.csv --explain rules --top-factors 5 --reports reports.zip
+"""
+import argparse
+import os
+import sys
+import time
+from contextlib import ExitStack
+from typing import Dict, Iterator, Optional
+
+import pandas as pd
+
+from model_descriptor import load_descriptor
+from model_registry import get_registry
+from scoring import (
+    backend_model_file, csv_read_options, inference_backend, inference_backends, iter_score_chunks,
+    summarize_throughput,
+)
+
+DEFAULT_MODEL = "C2M2_Credit_score_with_Random_Forest_Model.pkl"
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def _is_parquet(path: str) -> bool:
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def read_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Yields the input file in chunks of at most ``chunk_size`` rows."""
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, **csv_read_options)
+
+
+class ChunkWriter:
+    """Appends scored chunks to a CSV or Parquet file as they are produced."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._parquet_writer = None
+        self._wrote_header = False
+
+    def write(self, chunk: pd.DataFrame):
+        if _is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            chunk.to_csv(self.path, mode="a" if self._wrote_header else "w",
+                         header=not self._wrote_header, index=False)
+            self._wrote_header = True
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def score_file(input_path: str, output_path: str, model_file: str = DEFAULT_MODEL,
+               chunk_size: int = DEFAULT_CHUNK_SIZE, verbose: bool = False,
+               explain_rules: bool = False, top_factors: int = 0, backend: str = None,
+               reports_path: Optional[str] = None, report_format: str = "html",
+               report_workers: Optional[int] = None) -> Dict[str, float]:
+    """
+    Scores ``input_path`` into ``output_path`` and returns throughput figures.
+
+    With ``explain_rules`` every row also gets rule-based ``reasons``; with
+    ``top_factors`` > 0 it also gets its strongest feature contributions.
+    ``backend`` picks the inference engine (see ``scoring.backend_model_file``).
+    With ``reports_path`` a report document is written for every row, into
+    that directory or ``.zip`` archive (see ``report_renderer``).
+
+    Returns:
+        dict: ``rows``, ``seconds`` and ``rows_per_second`` for the whole run,
+        plus ``reports`` (``ReportWriter.stats``) when reports were written.
+    """
+    model = get_registry().get(backend_model_file(model_file, backend))
+    rows = 0
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        writer = stack.enter_context(ChunkWriter(output_path))
+        reports = None
+        if reports_path:
+            from report_renderer import ReportWriter
+
+            reports = stack.enter_context(ReportWriter(reports_path, report_format, report_workers,
+                                                       model_name=load_descriptor(model_file).name))
+        chunks = read_chunks(input_path, chunk_size)
+        for scored in iter_score_chunks(model, model_file, chunks, explain_rules=explain_rules,
+                                        top_factors=top_factors):
+            writer.write(scored)
+            if reports is not None:
+                reports.write(scored)
+            rows += len(scored)
+            if verbose:
+                elapsed = time.perf_counter() - start
+                print(f"  {rows:,} rows  ({rows / elapsed:,.0f} rows/s)", file=sys.stderr)
+    stats = summarize_throughput(rows, time.perf_counter() - start)
+    if reports is not None:
+        stats["reports"] = reports.stats()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV/Parquet file of loan applicants.")
+    parser.add_argument("input", help="CSV or Parquet file with the data_to_predict columns")
+    parser.add_argument("output", help="Destination CSV or Parquet file")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"Model file (default: {DEFAULT_MODEL})")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--explain", choices=["none", "rules"], default="none",
+                        help="Add rule-based reasons to every row (LLM explanations are not available in bulk)")
+    parser.add_argument("--top-factors", type=int, default=0, metavar="K",
+                        help="Add the K strongest per-feature contributions of the model to every row")
+    parser.add_argument("--backend", choices=inference_backends, default=inference_backend,
+                        help=f"Inference engine (default: INFERENCE_BACKEND or sklearn, now {inference_backend})")
+    parser.add_argument("--reports", default=None, metavar="PATH",
+                        help="Also write a report for every applicant into this directory or .zip archive")
+    parser.add_argument("--report-format", choices=["html", "pdf"], default="html")
+    parser.add_argument("--report-workers", type=int, default=None,
+                        help="Processes rendering reports (default: REPORT_WORKERS or CPU count)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print progress per chunk")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.model):
+        parser.error(f"model file not found: {args.model}")
+
+    stats = score_file(args.input, args.output, args.model, args.chunk_size, args.verbose,
+                       explain_rules=args.explain == "rules", top_factors=args.top_factors, backend=args.backend,
+                       reports_path=args.reports, report_format=args.report_format,
+                       report_workers=args.report_workers)
+    print(f"Scored {stats['rows']:,} rows in {stats['seconds']:.2f}s "
+          f"({stats['rows_per_second']:,.0f} rows/s) -> {args.output}")
+    if "reports" in stats:
+        reports = stats["reports"]
+        print(f"Wrote {reports['documents']:,} reports ({reports['megabytes']:.1f} MB, "
+              f"{reports['documents_per_second']:,.0f} documents/s) -> {args.reports}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Per-row cost of feature attribution for the shipped models.
+
+Checks that the contributions add up to the model output, then times
+``attribute_frame`` (prediction given) for growing batches.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_attribution
+"""
+import os
+import timeit
+
+import joblib
+import numpy as np
+
+from attribution import get_attributor
+from encoder import get_encoder
+from scoring import (
+    attribute_frame, is_logistic, logistic_features, predict_with_proba, prepare_features, raw_features,
+    synthetic_applicants,
+)
+
+model_files = [
+    "C2M2_Credit_score_with_Random_Forest_Model.pkl",
+    "C2M1_Credit_score_with_Logistic_Regression_Model.pkl",
+    "C1M1_No_credit_score_with_Logistic_Regression_Model.pkl",
+]
+
+
+def main():
+    print(f"{'model':<55} {'batch':>8}  {'ms per row':>10}")
+    for model_file in model_files:
+        if not os.path.exists(model_file):
+            continue
+        model = joblib.load(model_file)
+        df = synthetic_applicants(10_000, labels=False)[raw_features(model_file)]
+        X = prepare_features(df, model_file)
+        encoder = get_encoder(logistic_features(model_file)) if is_logistic(model_file) else None
+        base, contributions = get_attributor(model, encoder, raw_features(model_file)).explain(X)
+        output = model.decision_function(X) if is_logistic(model_file) else model.predict_proba(X)
+        assert np.allclose(base + contributions.sum(axis=1), output, rtol=1e-9, atol=1e-6)
+
+        for rows in (1, 100, 10_000):
+            batch = df.iloc[:rows]
+            prediction, _ = predict_with_proba(model, prepare_features(batch, model_file))
+            number = max(1, 200 // rows)
+            best = min(timeit.repeat(lambda: attribute_frame(model, model_file, batch, prediction),
+                                     repeat=3, number=number))
+            print(f"{model_file:<55} {rows:>8,}  {best / number / rows * 1000:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
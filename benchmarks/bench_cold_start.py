@@ -0,0 +1,103 @@
+"""
+Cold start and resident memory of N worker processes loading the same model.
+
+Compares three ways of loading the Random Forest in every worker:
+
+* ``joblib``: ``joblib.load`` of the ``.pkl`` (what the app did before);
+* ``npz``: ``FlatForest.load`` of the exported ``.npz``, read into memory;
+* ``npz-mmap``: ``FlatForest.load(mmap=True)``, arrays mapped from the file.
+
+Each worker is a fresh interpreter that imports its loader, times the load
+plus the first prediction, and waits until all workers are up so that the
+memory is measured while every copy is alive. RSS counts shared pages in
+every process; PSS splits them between the processes sharing them, so the
+PSS total is the real memory cost of the whole group.
+
+``joblib.load(mmap_mode="r")`` is not listed: sklearn's ``Tree`` copies its
+node arrays when it is unpickled, so the mapped pages are never shared.
+
+Usage (from the repository root, Linux only):
+    python -m benchmarks.bench_cold_start [--processes 1 4 16]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from forest_engine import export_forest
+
+model_file = "C2M2_Credit_score_with_Random_Forest_Model.pkl"
+
+_worker = """
+import sys, time, warnings
+warnings.simplefilter("ignore")
+start = time.perf_counter()
+method, path = sys.argv[1], sys.argv[2]
+import numpy as np
+if method == "joblib":
+    import joblib
+    model = joblib.load(path)
+else:
+    from forest_engine import FlatForest
+    model = FlatForest.load(path, mmap=method == "npz-mmap")
+model.predict_proba(np.zeros((1, model.n_features_in_)))
+load_ms = (time.perf_counter() - start) * 1000
+print("ready", flush=True)
+sys.stdin.readline()
+memory = {}
+with open("/proc/self/smaps_rollup") as f:
+    for line in f:
+        key, _, value = line.partition(":")
+        if key in ("Rss", "Pss"):
+            memory[key] = int(value.split()[0]) / 1024
+print(f"{load_ms:.1f} {memory['Rss']:.1f} {memory['Pss']:.1f}", flush=True)
+"""
+
+
+def run_group(method: str, path: str, processes: int) -> dict:
+    """Starts ``processes`` workers at once and returns their timings and memory."""
+    workers = [
+        subprocess.Popen([sys.executable, "-c", _worker, method, path], stdin=subprocess.PIPE,
+                         stdout=subprocess.PIPE, text=True, cwd=os.getcwd())
+        for _ in range(processes)
+    ]
+    # รอให้ทุก process โหลดเสร็จก่อน จึงวัดหน่วยความจำพร้อมกัน
+    for worker in workers:
+        if worker.stdout.readline().strip() != "ready":
+            raise RuntimeError(f"{method} worker failed to start")
+    results = []
+    for worker in workers:
+        worker.stdin.write("\n")
+        worker.stdin.flush()
+    for worker in workers:
+        results.append([float(v) for v in worker.stdout.readline().split()])
+        worker.wait()
+    load_ms, rss, pss = zip(*results)
+    return {
+        "load_ms": statistics.median(load_ms),
+        "rss_mb": statistics.median(rss),
+        "pss_total_mb": sum(pss),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        npz_path = export_forest(model_file, os.path.join(tmp, "forest.npz"))
+        print(f"{model_file}: pkl {os.path.getsize(model_file) / 2**20:.1f} MB, "
+              f"npz {os.path.getsize(npz_path) / 2**20:.1f} MB\n")
+        print(f"{'method':<10} {'procs':>5}  {'load+predict ms':>15}  {'RSS/proc MB':>11}  {'PSS total MB':>12}")
+        for processes in args.processes:
+            for method, path in (("joblib", model_file), ("npz", npz_path), ("npz-mmap", npz_path)):
+                result = run_group(method, path, processes)
+                print(f"{method:<10} {processes:>5}  {result['load_ms']:>15.1f}  "
+                      f"{result['rss_mb']:>11.1f}  {result['pss_total_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Per-row cost of ``FeatureEncoder`` against ``preprocess_data``.
+
+The first table times the encoder on its own. The second times what the app
+and the service actually run for one Logistic Regression applicant, from the
+``build_row`` dict to class and probabilities:
+
+* ``preprocess_data``: the original path, ``preprocess_data`` on a one-row
+  frame followed by sklearn ``predict`` and ``predict_proba``;
+* ``predict(frame)``: ``ScoringPipeline.predict`` on a one-row frame, the
+  batch path (pandas validation, ``FeatureEncoder.transform``);
+* ``predict_row``: ``ScoringPipeline.predict_row``, which ``score_row`` uses.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_encoder
+"""
+import timeit
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from encoder import get_encoder
+from scoring import (
+    encode_categoricals, example_applicant, get_pipeline, logistic_features, preprocess_data,
+    raw_features_credit_score, synthetic_applicants,
+)
+
+model_file = "C2M1_Credit_score_with_Logistic_Regression_Model.pkl"
+
+
+def _per_row_us(func, rows: int, repeat: int = 5, number: int = None) -> float:
+    if number is None:
+        number = max(1, 2000 // rows)
+    best = min(timeit.repeat(func, repeat=repeat, number=number))
+    return best / number / rows * 1e6
+
+
+def main():
+    expected = logistic_features(model_file)
+    encoder = get_encoder(expected)
+    print(f"{'batch':>8}  {'preprocess_data':>16}  {'FeatureEncoder':>15}  {'speed-up':>8}   (µs per row)")
+    for rows in (1, 100, 10_000, 100_000):
+        batch = encode_categoricals(synthetic_applicants(rows, labels=False)[raw_features_credit_score])
+        assert np.array_equal(encoder.transform(batch), preprocess_data(batch, expected).to_numpy(float))
+
+        if rows == 1:
+            row = batch.iloc[0].to_dict()
+            buffer = np.zeros((1, encoder.n_features))
+            baseline = _per_row_us(lambda: preprocess_data(batch, expected), rows)
+            compiled = _per_row_us(lambda: encoder.transform_row(row, out=buffer), rows, number=20_000)
+        else:
+            buffer = np.zeros((rows, encoder.n_features))
+            baseline = _per_row_us(lambda: preprocess_data(batch, expected), rows, number=3)
+            compiled = _per_row_us(lambda: encoder.transform(batch, out=buffer), rows, number=3)
+        print(f"{rows:>8,}  {baseline:>16.3f}  {compiled:>15.3f}  {baseline / compiled:>7.1f}x")
+
+    # LogisticRegression ถูก fit โดยไม่มีชื่อคอลัมน์ จึงเตือนทุกครั้งที่ได้ DataFrame จาก preprocess_data
+    warnings.simplefilter("ignore", UserWarning)
+    pipeline = get_pipeline(model_file)
+    row = pipeline.build_row(example_applicant)
+    frame = pd.DataFrame([row])
+    expected_classes = pipeline.model.predict(preprocess_data(frame, expected))
+    assert np.array_equal(pipeline.predict_row(row).prediction, expected_classes)
+
+    def original():
+        X = preprocess_data(frame, expected)
+        return pipeline.model.predict(X), pipeline.model.predict_proba(X)
+
+    paths = {
+        "preprocess_data": original,
+        "predict(frame)": lambda: pipeline.predict(frame),
+        "predict_row": lambda: pipeline.predict_row(row),
+    }
+    print(f"\none applicant, build_row dict -> class and probabilities ({model_file.split('_')[0]}):")
+    baseline = None
+    for name, func in paths.items():
+        us = _per_row_us(func, 1, number=500)
+        baseline = baseline or us
+        print(f"  {name:<16} {us:>10.1f} µs  {baseline / us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
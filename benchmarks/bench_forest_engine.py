@@ -0,0 +1,52 @@
+"""
+``FlatForest`` against the pickled sklearn Random Forest.
+
+Checks that classes and probabilities are identical on synthetic applicants,
+then reports single-row latency (sklearn ``predict`` + ``predict_proba`` as the
+app calls them, against one ``predict_with_proba``) and batch throughput.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_forest_engine
+"""
+import timeit
+
+import joblib
+import numpy as np
+
+from forest_engine import FlatForest
+from scoring import prepare_features, raw_features, synthetic_applicants
+
+model_file = "C2M2_Credit_score_with_Random_Forest_Model.pkl"
+
+
+def _best_seconds(func, number: int, repeat: int = 5) -> float:
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def main():
+    forest = joblib.load(model_file)
+    flat = FlatForest.from_sklearn(forest)
+    X = prepare_features(synthetic_applicants(100_000, labels=False)[raw_features(model_file)], model_file)
+
+    classes, proba = flat.predict_with_proba(X)
+    assert np.array_equal(proba, forest.predict_proba(X)), "probabilities differ from sklearn"
+    assert np.array_equal(classes, forest.predict(X)), "classes differ from sklearn"
+    print(f"{len(X):,} rows: classes and probabilities identical to sklearn")
+
+    row = X.iloc[:1]
+    sklearn_ms = _best_seconds(lambda: (forest.predict(row), forest.predict_proba(row)), number=20) * 1000
+    flat_ms = _best_seconds(lambda: flat.predict_with_proba(row), number=500) * 1000
+    print(f"\nsingle row: sklearn predict+predict_proba {sklearn_ms:.3f} ms, "
+          f"FlatForest {flat_ms:.3f} ms ({sklearn_ms / flat_ms:.0f}x)")
+
+    print(f"\n{'batch':>8}  {'sklearn rows/s':>15}  {'FlatForest rows/s':>18}")
+    for rows in (100, 1_000, 10_000, 100_000):
+        batch = X.iloc[:rows]
+        number = max(1, 10_000 // rows)
+        sklearn_s = _best_seconds(lambda: forest.predict_proba(batch), number=number, repeat=3)
+        flat_s = _best_seconds(lambda: flat.predict_proba(batch), number=number, repeat=3)
+        print(f"{rows:>8,}  {rows / sklearn_s:>15,.0f}  {rows / flat_s:>18,.0f}")
+
+
+if __name__ == "__main__":
+    main()
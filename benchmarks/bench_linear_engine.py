@@ -0,0 +1,82 @@
+"""
+``LinearModel`` against the pickled sklearn Logistic Regression models.
+
+For each model, encodes a million synthetic applicants with
+``FeatureEncoder``, checks that ``LinearModel`` (float64 and float32) gives
+the classes of ``predict`` and the probabilities of ``predict_proba``, and
+then reports:
+
+* single row: sklearn ``predict`` + ``predict_proba`` as the app used to call
+  them, ``scoring.predict_with_proba`` on the sklearn model (one
+  ``decision_function``), and ``LinearModel.predict_with_proba``;
+* throughput: rows per second of scoring the whole encoded matrix.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_linear_engine [--rows 1000000]
+"""
+import argparse
+import os
+import timeit
+
+import joblib
+import numpy as np
+
+from linear_engine import LinearModel
+from scoring import predict_with_proba, prepare_features, raw_features, synthetic_applicants
+
+model_files = [
+    "C2M1_Credit_score_with_Logistic_Regression_Model.pkl",
+    "C1M1_No_credit_score_with_Logistic_Regression_Model.pkl",
+]
+
+
+def _best_seconds(func, number: int, repeat: int = 5) -> float:
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = synthetic_applicants(args.rows, labels=False)
+    for model_file in [f for f in model_files if os.path.exists(f)]:
+        model = joblib.load(model_file)
+        X = prepare_features(df[raw_features(model_file)], model_file)
+        engines = {"float64": LinearModel.from_sklearn(model),
+                   "float32": LinearModel.from_sklearn(model, dtype=np.float32)}
+
+        expected_classes, expected = model.predict(X), model.predict_proba(X)
+        print(f"\n{model_file}: {X.shape[0]:,} x {X.shape[1]} encoded")
+        for name, engine in engines.items():
+            classes, proba = engine.predict_with_proba(X)
+            print(f"  {name}: max |Δp| {np.abs(proba - expected).max():.1e}, "
+                  f"classes equal {np.mean(classes == expected_classes):.4%}")
+        assert np.array_equal(engines["float64"].predict(X), expected_classes), "classes differ from sklearn"
+        assert np.allclose(engines["float64"].predict_proba(X), expected, rtol=0, atol=1e-12), \
+            "probabilities differ from sklearn"
+
+        row = X[:1]
+        single = {
+            "sklearn predict+predict_proba": lambda: (model.predict(row), model.predict_proba(row)),
+            "sklearn decision_function": lambda: predict_with_proba(model, row),
+            "LinearModel float64": lambda: engines["float64"].predict_with_proba(row),
+        }
+        print("  single row:")
+        for name, func in single.items():
+            print(f"    {name:<30} {_best_seconds(func, number=2000) * 1e6:>8.1f} µs")
+
+        bulk = {
+            "sklearn predict_proba": lambda: model.predict_proba(X),
+            "sklearn decision_function": lambda: predict_with_proba(model, X),
+            "LinearModel float64": lambda: engines["float64"].predict_with_proba(X),
+            "LinearModel float32": lambda: engines["float32"].predict_with_proba(X),
+        }
+        print(f"  {args.rows:,} rows:")
+        for name, func in bulk.items():
+            seconds = _best_seconds(func, number=1, repeat=3)
+            print(f"    {name:<30} {seconds * 1000:>8.0f} ms  {args.rows / seconds:>14,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+scikit-learn against onnxruntime for every model in ``model_options``.
+
+Exports each model to ONNX in a temporary directory (``onnx_engine``), checks
+that the probabilities match sklearn, and then reports:
+
+* startup: a fresh interpreter that imports ``scoring``, loads the model
+  through the registry and scores one row, per backend. The ``sklearn``
+  column of the onnx row shows whether scikit-learn was imported at all;
+* latency: median time of one ``ScoringPipeline.predict`` of a single row,
+  the app and service path;
+* throughput: rows per second of ``predict`` on larger batches.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_onnx [--batch-sizes 1 100 10000] [--repeat 200]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from onnx_engine import export_onnx, max_difference
+from scoring import example_applicant, get_pipeline, model_options, synthetic_applicants
+
+_startup = """
+import sys, time, warnings
+warnings.simplefilter("ignore")
+start = time.perf_counter()
+import pandas as pd
+from scoring import example_applicant, get_pipeline
+pipeline = get_pipeline(sys.argv[1], sys.argv[2])
+pipeline.predict(pd.DataFrame([pipeline.build_row(example_applicant)]))
+print(f"{(time.perf_counter() - start) * 1000:.1f} {'sklearn' in sys.modules}")
+"""
+
+
+def startup(model_file: str, backend: str, runs: int = 3):
+    """Median milliseconds from interpreter start to the first prediction, and whether sklearn was imported."""
+    results = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _startup, model_file, backend], capture_output=True,
+                             text=True, check=True, cwd=os.getcwd()).stdout.split()
+        results.append((float(out[0]), out[1] == "True"))
+    return statistics.median(ms for ms, _ in results), results[0][1]
+
+
+def latency_ms(pipeline, df: pd.DataFrame, repeat: int) -> float:
+    pipeline.predict(df)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pipeline.predict(df)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--repeat", type=int, default=200, help="Timed calls for single-row latency")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for model_file in [f for f in model_options + ["C2M1_Credit_score_with_Logistic_Regression_Model.pkl",
+                                                       "C1M1_No_credit_score_with_Logistic_Regression_Model.pkl"]
+                           if os.path.exists(f)]:
+            # export ลงโฟลเดอร์ชั่วคราวพร้อม .pkl และ .json เพื่อให้ backend "onnx" หาไฟล์เจอ
+            for suffix in (".pkl", ".json"):
+                shutil.copy(os.path.splitext(model_file)[0] + suffix, tmp)
+            tmp_model = os.path.join(tmp, model_file)
+            onnx_file = export_onnx(tmp_model)
+            check = max_difference(tmp_model, onnx_file)
+            print(f"\n{model_file}: max |Δp| {check['max_abs_diff']:.2e}, "
+                  f"classes equal {check['class_agreement']:.2%}")
+            print(f"{'backend':<8} {'startup ms':>10} {'sklearn':>8} {'1 row ms':>9}  "
+                  + "  ".join(f"{f'{n:,} rows/s':>14}" for n in args.batch_sizes))
+
+            for backend in ("sklearn", "onnx"):
+                start_ms, imported_sklearn = startup(tmp_model, backend)
+                pipeline = get_pipeline(tmp_model, backend)
+                single = pd.DataFrame([pipeline.build_row(example_applicant)])
+                throughput = []
+                for rows in args.batch_sizes:
+                    df = synthetic_applicants(rows, labels=False)[pipeline.columns]
+                    throughput.append(rows / latency_ms(pipeline, df, max(3, args.repeat // rows)) * 1000)
+                print(f"{backend:<8} {start_ms:>10.0f} {str(imported_sklearn):>8} "
+                      f"{latency_ms(pipeline, single, args.repeat):>9.3f}  "
+                      + "  ".join(f"{value:>14,.0f}" for value in throughput))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Throughput of ``prefork.py`` as the number of worker processes grows.
+
+Starts the pre-fork server with 1, 2, 4, ... workers (up to the CPU count by
+default), drives ``/score`` with ``loadtest.run_load`` and prints requests per
+second against the single-worker run. It also kills one worker during each
+run to check that the parent replaces it and the service keeps answering.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_prefork [--workers 1 2 4 8] [--requests 2000]
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from loadtest import _get_json, run_load, wait_for_server
+
+
+def _default_workers():
+    cpus = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cpus:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpus:
+        counts.append(cpus)
+    return counts
+
+
+def _worker_pids(base_url: str, probes: int = 50) -> set:
+    return {_get_json(f"{base_url}/stats")["pid"] for _ in range(probes)}
+
+
+def run(workers: int, port: int, requests: int, batch_size: int) -> dict:
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen([sys.executable, "prefork.py", "--workers", str(workers), "--port", str(port)],
+                              stdout=subprocess.DEVNULL)
+    try:
+        wait_for_server(base_url)
+        concurrency = 4 * workers
+        run_load(base_url, concurrency, 100, batch_size, seed=1)
+        report = run_load(base_url, concurrency, requests, batch_size)
+
+        # ฆ่า worker หนึ่งตัว แล้วตรวจว่า service ยังตอบได้และมี worker ครบ
+        pids = _worker_pids(base_url)
+        os.kill(next(iter(pids)), signal.SIGKILL)
+        time.sleep(0.5)
+        recovered = run_load(base_url, concurrency, 50, batch_size, seed=2)["errors"] == 0
+        report.update(workers_seen=len(pids), recovered=recovered)
+        return report
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=_default_workers())
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=0, help="Rows per /score/batch request (0 = /score)")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"CPUs: {os.cpu_count()}\n")
+    print(f"{'workers':>7}  {'req/s':>8}  {'rows/s':>9}  {'speedup':>7}  {'p50 ms':>7}  {'p99 ms':>7}  "
+          f"{'seen':>4}  {'restart ok':>10}")
+    baseline = None
+    for workers in args.workers:
+        report = run(workers, args.port, args.requests, args.batch_size)
+        baseline = baseline or report["requests_per_second"]
+        print(f"{workers:>7}  {report['requests_per_second']:>8,.1f}  {report['rows_per_second']:>9,.0f}  "
+              f"{report['requests_per_second'] / baseline:>6.2f}x  {report.get('p50_ms', 0):>7.2f}  "
+              f"{report.get('p99_ms', 0):>7.2f}  {report['workers_seen']:>4}  {str(report['recovered']):>10}")
+
+
+if __name__ == "__main__":
+    main()
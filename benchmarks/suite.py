@@ -0,0 +1,312 @@
+"""
+Benchmark suite for the hot paths of the scoring flow.
+
+Every benchmark is a setup function that returns the call to time, in the
+style of asv: setup runs once and is not measured. The suite covers
+
+* ``load.*``: ``joblib.load`` of each shipped ``.pkl``;
+* ``preprocess.*``: ``encode_categoricals`` + ``preprocess_data`` at batch
+  sizes 1 to 100k;
+* ``predict.*``: ``predict`` / ``predict_proba`` of the Random Forest and
+  logistic models;
+* ``sensitivity.*``: a 1,000-point what-if grid (``ScoringPipeline.sensitivity``)
+  over ``Loan_Amount`` for each model;
+* ``counterfactual.*``: the batched path-to-approval search for a declined
+  applicant;
+* ``compare``: one applicant against every available comparison model
+  (``compare_models``, one thread per model);
+* ``grade``: ``get_credit_grade``;
+* ``report``: ``render_report`` of 1,000 scored applicants (one process);
+* ``prompt``: ``generate_credit_reason`` with ``call_gpt`` stubbed out;
+* ``app.*``: a headless Streamlit rerun of ``app.py`` (``AppTest``): a plain
+  rerun, a submitted form, and a sidebar change while a report is shown.
+  ``AppTest`` always reruns the whole script, including for widgets inside
+  ``st.fragment``, so these are full-run costs.
+
+Results are written as JSON. Given a baseline (a previous results file), the
+suite prints the ratio of every best (minimum) time to the baseline and exits
+with status 1 when one is slower than ``--threshold`` times the baseline. The
+minimum is compared rather than the median because it is the least affected
+by other load on the machine.
+
+Usage (from the repository root):
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --filter predict --quick
+    python -m benchmarks.suite --save-baseline      # refresh benchmarks/baseline.json
+
+The stored baseline is only meaningful on the machine it was recorded on;
+record it again on the hardware that runs the comparison.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from typing import Callable, Dict, List, Optional, Tuple
+from unittest import mock
+
+default_baseline = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+model_files = [
+    "C2M2_Credit_score_with_Random_Forest_Model.pkl",
+    "C2M1_Credit_score_with_Logistic_Regression_Model.pkl",
+    "C1M1_No_credit_score_with_Logistic_Regression_Model.pkl",
+]
+batch_sizes = [1, 100, 10_000, 100_000]
+quick_batch_sizes = [1, 100, 10_000]
+
+# name -> (setup, rows per call); setup คืนฟังก์ชันที่จะจับเวลา
+Setup = Callable[[], Callable[[], object]]
+_benchmarks: Dict[str, Tuple[Setup, int]] = {}
+
+
+def benchmark(name: str, rows: int = 1):
+    """Registers ``setup`` under ``name``; ``rows`` is used for the rows/s column."""
+    def register(setup: Setup) -> Setup:
+        _benchmarks[name] = (setup, rows)
+        return setup
+    return register
+
+
+def _shipped_models() -> List[str]:
+    return [f for f in model_files if os.path.exists(f)]
+
+
+def _short(model_file: str) -> str:
+    return model_file.split("_", 1)[0]
+
+
+def register_benchmarks(quick: bool = False):
+    """Registers every benchmark; ``quick`` drops the 100k-row batches."""
+    import joblib
+
+    from scoring import (
+        encode_categoricals, example_applicant, get_credit_grade, get_pipeline, is_logistic, logistic_features,
+        prepare_features, preprocess_data, raw_features, sensitivity_axis, synthetic_applicants,
+    )
+
+    sizes = quick_batch_sizes if quick else batch_sizes
+    for model_file in _shipped_models():
+        name = _short(model_file)
+
+        @benchmark(f"load.{name}")
+        def _load(model_file=model_file):
+            return lambda: joblib.load(model_file)
+
+        if is_logistic(model_file):
+            for rows in sizes:
+                @benchmark(f"preprocess.{name}.{rows}", rows=rows)
+                def _preprocess(model_file=model_file, rows=rows):
+                    df = synthetic_applicants(rows, labels=False)[raw_features(model_file)]
+                    expected = logistic_features(model_file)
+                    return lambda: preprocess_data(encode_categoricals(df), expected)
+
+        for rows in sizes:
+            for method in ("predict", "predict_proba"):
+                @benchmark(f"{method}.{name}.{rows}", rows=rows)
+                def _predict(model_file=model_file, rows=rows, method=method):
+                    model = joblib.load(model_file)
+                    X = prepare_features(synthetic_applicants(rows, labels=False)[raw_features(model_file)],
+                                         model_file)
+                    return lambda: getattr(model, method)(X)
+
+        @benchmark(f"sensitivity.{name}.1000", rows=1000)
+        def _sensitivity(model_file=model_file):
+            pipeline = get_pipeline(model_file)
+            row = pipeline.build_row(example_applicant)
+            axes = {"Loan_Amount": sensitivity_axis("Loan_Amount", 1000)}
+            return lambda: pipeline.sensitivity(row, axes)
+
+        @benchmark(f"counterfactual.{name}")
+        def _counterfactual(model_file=model_file):
+            from counterfactual import CounterfactualSearch
+
+            pipeline = get_pipeline(model_file)
+            search = CounterfactualSearch(pipeline)
+            row = pipeline.build_row({**example_applicant, "simulated_credit_score": 430})
+            return lambda: search.search(row)
+
+    @benchmark("compare")
+    def _compare():
+        from scoring import available_comparison_models, compare_models, preload_models
+
+        preload_models(available_comparison_models())
+        return lambda: compare_models(example_applicant)
+
+    @benchmark("grade")
+    def _grade():
+        return lambda: get_credit_grade(612)
+
+    @benchmark("report", rows=1000)
+    def _report():
+        from report_renderer import render_report
+        from scoring import rule_reasons, synthetic_applicants
+
+        df = synthetic_applicants(1000)
+        scored = get_pipeline(model_files[0]).score_frame(df)
+        scored["reasons"] = rule_reasons(df, scored["prediction"])
+        records = df.join(scored).to_dict("records")
+        return lambda: [render_report(record) for record in records]
+
+    @benchmark("prompt")
+    def _prompt():
+        from explanations import credit_reason_fields, generate_credit_reason
+        data = get_pipeline(model_files[0]).build_row(example_applicant)
+        fields = {field: data.get(field) for field in credit_reason_fields}
+        fields["simulated_credit_score"] = example_applicant["simulated_credit_score"]
+
+        def run():
+            with mock.patch("explanations.call_gpt", return_value="stub"), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                return generate_credit_reason(**fields, Loan_Status_3Class="อนุมัติ")
+        return run
+
+    @benchmark("app.rerun")
+    def _app_rerun():
+        at = _app_test()
+        return lambda: at.run()
+
+    @benchmark("app.submit")
+    def _app_submit():
+        at = _app_test()
+        # คำอธิบายจาก rules เท่านั้น ไม่เรียก GPT
+        at.sidebar.selectbox[1].set_value("rules").run()
+
+        def run():
+            next(b for b in at.button if b.label == "ประเมินการขอสินเชื่อ").click().run()
+
+        run()
+        if at.exception or at.error:
+            raise RuntimeError("submitting the form in app.py failed during setup")
+        return run
+
+    @benchmark("app.sidebar")
+    def _app_sidebar():
+        at = _app_test()
+        at.sidebar.selectbox[1].set_value("rules").run()
+        next(b for b in at.button if b.label == "ประเมินการขอสินเชื่อ").click().run()
+
+        # เปลี่ยนค่าใน sidebar ขณะที่มีรายงานแสดงอยู่ (รายงานวาดจาก session state)
+        def run():
+            explanation = at.sidebar.selectbox[1]
+            explanation.set_value("rules-then-llm" if explanation.value == "rules" else "rules").run()
+        return run
+
+
+def _app_test():
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.abspath("app.py"), default_timeout=120)
+    at.secrets["OPENAI_API_KEY"] = "sk-benchmark"
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"app.py raised during setup: {at.exception[0].value}")
+    return at
+
+
+def time_call(func: Callable[[], object], repeat: int = 5, min_seconds: float = 0.2) -> dict:
+    """Times ``func`` like ``timeit``: calls per round are chosen so a round takes ``min_seconds``."""
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_seconds or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_seconds / 10 else 2
+    times = [elapsed / number] + [t / number for t in timer.repeat(repeat=repeat - 1, number=number)]
+    return {"min_s": min(times), "median_s": statistics.median(times), "number": number, "repeat": repeat}
+
+
+def _environment() -> dict:
+    import numpy
+    import pandas
+    import sklearn
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def run_suite(pattern: Optional[str] = None, quick: bool = False, repeat: int = 5) -> dict:
+    """Runs the benchmarks whose name contains ``pattern`` and returns the results document."""
+    register_benchmarks(quick)
+    results = {}
+    for name, (setup, rows) in _benchmarks.items():
+        if pattern and pattern not in name:
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            func = setup()
+            result = time_call(func, repeat=repeat)
+        result["rows"] = rows
+        result["rows_per_second"] = rows / result["median_s"]
+        results[name] = result
+        print(f"{name:<40} {result['median_s'] * 1000:>12.4f} ms", flush=True)
+    return {"environment": _environment(), "results": results}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """Prints current against baseline best times and returns the names that regressed."""
+    regressions = []
+    print(f"\n{'benchmark':<40} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    for name, result in results["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:<40} {'-':>12} {result['min_s'] * 1000:>12.4f} {'new':>7}")
+            continue
+        ratio = result["min_s"] / base["min_s"]
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  ❌"
+        print(f"{name:<40} {base['min_s'] * 1000:>12.4f} {result['min_s'] * 1000:>12.4f} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scoring flow and compare with a baseline.")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Results file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write the results to {default_baseline}")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Fail when a best time is more than this many times the baseline (default 1.25)")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--quick", action="store_true", help="Skip the 100k-row batches")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.filter, args.quick, args.repeat)
+    for path in filter(None, [args.output, default_baseline if args.save_baseline else None]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults -> {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) above {args.threshold}x: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\n✅ no regression above {args.threshold}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+In-memory LRU cache with TTL expiry and an optional SQLite tier on disk.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+MISSING = object()
+
+
+class SQLiteStore:
+    """
+    Key/value table in a SQLite file; values are stored as JSON.
+
+    Survives restarts and can be shared by several processes on one host.
+    """
+
+    def __init__(self, path: str, table: str = "cache"):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def get(self, key: str) -> Any:
+        """``(value, expires_at)`` of a live entry, else ``MISSING``."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return MISSING
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return MISSING
+        return json.loads(value), expires_at
+
+    def set(self, key: str, value: Any, expires_at: Optional[float] = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at),
+            )
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def purge_expired(self) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+            )
+        return cursor.rowcount
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire ``ttl_seconds`` after being set.
+
+    Args:
+        max_entries (int): Entries kept in memory; the least recently used one
+            is evicted first.
+        ttl_seconds (float, optional): Lifetime of an entry. None keeps
+            entries until they are evicted.
+        store (SQLiteStore, optional): Disk tier. Writes go to both tiers;
+            memory misses fall back to the store and are promoted on a hit.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None,
+                 store: Optional[SQLiteStore] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        self._data: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at is None or expires_at >= now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+
+        if self.store is not None:
+            stored = self.store.get(key)
+            if stored is not MISSING:
+                # เก็บเข้าหน่วยความจำพร้อมเวลาหมดอายุเดิม ไม่เริ่มนับ TTL ใหม่
+                value, expires_at = stored
+                with self._lock:
+                    self.disk_hits += 1
+                    self._put(key, value, expires_at)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def set(self, key: str, value: Any):
+        expires_at = self._expiry(time.time())
+        with self._lock:
+            self._put(key, value, expires_at)
+        if self.store is not None:
+            self.store.set(key, value, expires_at)
+
+    def _expiry(self, now: float) -> Optional[float]:
+        return None if self.ttl_seconds is None else now + self.ttl_seconds
+
+    def _put(self, key: str, value: Any, expires_at: Optional[float]):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+        if self.store is not None:
+            self.store.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._data),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else None,
+            }
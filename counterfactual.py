@@ -0,0 +1,222 @@
+"""
+Counterfactual "path to approval" search.
+
+For an applicant the model does not approve, finds small changes to the
+actionable inputs (loan amount, platform activity metrics ...) that make the
+model predict an approved class. Every change moves a feature only in the
+direction the applicant can act on (e.g. a smaller loan, fewer cancellations)
+and stays inside the form's input ranges (``scoring.feature_ranges``).
+
+The search never scores candidates one at a time. Candidates are generated as
+a matrix of step sizes, each step a fraction of the room a feature has
+between its current value and its bound, and scored in one ``predict`` call
+per round:
+
+1. every single feature on a fine grid, every pair of features on a coarse
+   grid, and random sparse combinations of more features;
+2. the cheapest distinct successes are refined in a second batch by scaling
+   their changes down and by dropping one feature at a time.
+
+Cost is the L1 distance in units of each feature's full input range, so
+moving ``on_time_rate`` by 10 points costs as much as moving
+``Loan_Amount`` by a tenth of its range.
+"""
+import itertools
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from metrics import span
+from scoring import feature_ranges
+
+# feature -> ทิศทางที่ผู้สมัครปรับได้จริง (+1 เพิ่มได้อย่างเดียว, -1 ลดได้อย่างเดียว)
+actionable_features = {
+    "Loan_Amount": -1,
+    "job_completion_rate": 1,
+    "on_time_rate": 1,
+    "avg_response_time_mins": -1,
+    "customer_rating_avg": 1,
+    "job_acceptance_rate": 1,
+    "job_cancellation_count": -1,
+    "weekly_active_days": 1,
+    "work_consistency_index": 1,
+    "inactive_days_last_30": -1,
+    "rejected_jobs_last_30": -1,
+    "simulated_credit_score": 1,
+}
+
+# class ที่ถือว่าได้รับการอนุมัติ (status_map: 1 = มีความเสี่ยงต่ำ (อนุมัติ))
+approved_classes = (1,)
+
+
+@dataclass
+class Counterfactual:
+    """
+    One set of changes that flips the prediction.
+
+    Attributes:
+        changes (dict): Feature -> ``(current, suggested)`` value.
+        cost (float): Sum of the changes in units of each feature's input range.
+        prediction: Class predicted after the changes.
+        probability (float): Probability of that class.
+    """
+    changes: Dict[str, Tuple[float, float]]
+    cost: float
+    prediction: object
+    probability: float
+
+
+class CounterfactualSearch:
+    """
+    Batched counterfactual search for one pipeline.
+
+    Args:
+        pipeline (ScoringPipeline): Model to query.
+        features (Sequence[str], optional): Actionable features to vary;
+            defaults to every ``actionable_features`` column the model uses.
+        targets (Sequence, optional): Classes that count as approved.
+        steps (int): Grid points per feature for single-feature changes.
+        pair_steps (int): Grid points per feature for pairs.
+        samples (int): Random combinations of three or more features.
+        seed (int): Seed of the random combinations.
+    """
+
+    def __init__(self, pipeline, features: Optional[Sequence[str]] = None,
+                 targets: Sequence = approved_classes, steps: int = 40, pair_steps: int = 8,
+                 samples: int = 2000, seed: int = 0):
+        if features is None:
+            features = [f for f in actionable_features if f in pipeline.columns]
+        self.pipeline = pipeline
+        self.features = list(features)
+        self.targets = np.asarray(list(targets))
+        self.steps = steps
+        self.pair_steps = pair_steps
+        self.samples = samples
+        self.seed = seed
+
+    def _bounds(self, row: dict):
+        """Current value, signed room to the bound, range width and integer flag per feature."""
+        ranges = feature_ranges()
+        current = np.array([float(row[f]) for f in self.features])
+        room = np.empty(len(self.features))
+        width = np.empty(len(self.features))
+        integer = np.empty(len(self.features), dtype=bool)
+        for j, feature in enumerate(self.features):
+            low, high = ranges[feature]
+            bound = high if actionable_features.get(feature, 1) > 0 else low
+            # ค่าที่เกินขอบอยู่แล้วจะไม่ถูกปรับ (room = 0)
+            room[j] = bound - current[j] if (bound - current[j]) * actionable_features.get(feature, 1) > 0 else 0.0
+            width[j] = float(high - low)
+            integer[j] = isinstance(low, int)
+        return current, room, width, integer
+
+    def _candidate_steps(self) -> np.ndarray:
+        """Fractions of the available room, one row per candidate, one column per feature."""
+        k = len(self.features)
+        blocks = []
+        grid = np.linspace(0, 1, self.steps + 1)[1:]
+        for j in range(k):
+            block = np.zeros((len(grid), k))
+            block[:, j] = grid
+            blocks.append(block)
+        pair_grid = np.linspace(0, 1, self.pair_steps + 1)[1:]
+        a, b = (g.ravel() for g in np.meshgrid(pair_grid, pair_grid, indexing="ij"))
+        for i, j in itertools.combinations(range(k), 2):
+            block = np.zeros((len(a), k))
+            block[:, i] = a
+            block[:, j] = b
+            blocks.append(block)
+        if self.samples and k > 2:
+            rng = np.random.default_rng(self.seed)
+            # แต่ละแถวปรับ 3 ถึง 5 feature ที่สุ่มเลือก
+            sizes = rng.integers(3, min(5, k) + 1, self.samples)
+            mask = rng.random((self.samples, k)).argsort(axis=1) < sizes[:, None]
+            blocks.append(mask * rng.random((self.samples, k)))
+        return np.vstack(blocks)
+
+    def _score(self, row: dict, values: np.ndarray):
+        """Predicts ``row`` with ``values`` in place of the features, in one call."""
+        grid = pd.DataFrame([row]).iloc[np.zeros(len(values), dtype=np.intp)].reset_index(drop=True)
+        for j, feature in enumerate(self.features):
+            column = values[:, j]
+            grid[feature] = column.astype(np.int64) if pd.api.types.is_integer_dtype(grid[feature]) else column
+        predicted = self.pipeline.predict(grid)
+        return predicted.prediction, predicted.confidence
+
+    def _evaluate(self, row: dict, steps: np.ndarray, current, room, width, integer):
+        values = current + steps * room
+        # ปัดเป็นจำนวนเต็ม / ทศนิยม 2 ตำแหน่ง แล้วบีบให้อยู่ระหว่างค่าปัจจุบันกับขอบ (ไม่ข้ามทิศทางที่ปรับได้)
+        values = np.where(integer, np.round(values), np.round(values, 2))
+        values = np.clip(values, np.minimum(current, current + room), np.maximum(current, current + room))
+        values = np.where(steps > 0, values, current)
+        cost = (np.abs(values - current) / width).sum(axis=1)
+        prediction, confidence = self._score(row, values)
+        success = np.isin(prediction, self.targets) & (cost > 0)
+        return values, cost, prediction, confidence, success
+
+    def search(self, row: dict, max_results: int = 3, refine: int = 20) -> List[Counterfactual]:
+        """
+        Cheapest distinct counterfactuals for one ``data_to_predict`` row.
+
+        Args:
+            row (dict): The applicant.
+            max_results (int): Counterfactuals to return, each changing a
+                different set of features.
+            refine (int): Successful candidates refined in the second round.
+
+        Returns:
+            list[Counterfactual]: Cheapest first; empty when no candidate
+            within the bounds reaches an approved class.
+        """
+        with span("counterfactual"):
+            current, room, width, integer = self._bounds(row)
+            steps = self._candidate_steps()
+            values, cost, prediction, confidence, success = self._evaluate(row, steps, current, room, width, integer)
+            if not success.any():
+                return []
+
+            # รอบที่ 2: ลดขนาดการเปลี่ยนแปลงของผู้ชนะที่ถูกที่สุด และลองตัด feature ออกทีละตัว
+            winners = steps[np.flatnonzero(success)[np.argsort(cost[success], kind="stable")[:refine]]]
+            scale = np.linspace(0, 1, self.steps + 1)[1:]
+            refined = [winners[:, None, :] * scale[None, :, None]]
+            for j in range(len(self.features)):
+                dropped = winners[winners[:, j] > 0].copy()
+                dropped[:, j] = 0
+                refined.append(dropped[:, None, :])
+            refined_steps = np.vstack([block.reshape(-1, len(self.features)) for block in refined])
+            more = self._evaluate(row, refined_steps, current, room, width, integer)
+
+            values = np.vstack([values, more[0]])
+            cost, prediction, confidence, success = (np.concatenate([a, b]) for a, b in zip(
+                (cost, prediction, confidence, success), more[1:]))
+            return self._select(values[success], cost[success], prediction[success], confidence[success],
+                                current, max_results)
+
+    def _select(self, values, cost, prediction, confidence, current, max_results) -> List[Counterfactual]:
+        # เลือกจากถูกไปแพง ข้ามชุดที่มี feature ครอบชุดที่เลือกแล้ว (เพิ่มแค่การเปลี่ยนแปลงที่ไม่จำเป็น)
+        results, chosen = [], []
+        for i in np.argsort(cost, kind="stable"):
+            changed = frozenset(np.flatnonzero(values[i] != current).tolist())
+            if any(previous <= changed for previous in chosen):
+                continue
+            chosen.append(changed)
+            results.append(Counterfactual(
+                changes={self.features[j]: (_native(current[j]), _native(values[i, j])) for j in sorted(changed)},
+                cost=float(cost[i]),
+                prediction=prediction[i].item() if hasattr(prediction[i], "item") else prediction[i],
+                probability=float(confidence[i]),
+            ))
+            if len(results) >= max_results:
+                break
+        return results
+
+
+def _native(value: float):
+    return int(value) if float(value).is_integer() else float(value)
+
+
+def find_counterfactuals(pipeline, row: dict, max_results: int = 3, **options) -> List[Counterfactual]:
+    """``CounterfactualSearch(pipeline, **options).search(row, max_results)``."""
+    return CounterfactualSearch(pipeline, **options).search(row, max_results)
@@ -0,0 +1,130 @@
+"""
+Precompiled One-Hot encoder for the Logistic Regression models.
+
+``preprocess_data`` rebuilds the encoded frame with ``pd.get_dummies`` and a
+handful of column-set operations on every call. ``FeatureEncoder`` resolves
+all of that once from ``expected_features`` and then writes raw inputs
+straight into fixed column positions of a NumPy matrix.
+"""
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# คอลัมน์เดียวกับที่ preprocess_data ทำ One-Hot Encoding
+cat_cols_to_encode = (
+    'Gender', 'Occupation', 'Education', 'Marital_Status', 'Region',
+    'Certificate', 'loan_purpose', 'home_ownership'
+)
+
+
+def _as_number(text: str) -> Optional[float]:
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+class FeatureEncoder:
+    """
+    Maps raw applicant columns to the model's feature matrix.
+
+    Numeric features are copied to their column index. A dummy feature such as
+    ``Occupation_Freelancer`` is set to 1 where the raw ``Occupation`` value is
+    ``"Freelancer"``, which is the column ``pd.get_dummies`` would have
+    produced for that value. Dummy columns that no input can produce stay 0,
+    exactly as ``preprocess_data`` fills them.
+
+    Note that the app feeds integer codes (``occupation_map``), so on those
+    rows the dummy columns never match and the output equals
+    ``preprocess_data`` column for column.
+
+    Args:
+        expected_features (Sequence[str]): Feature names in model order.
+        categorical_columns (Sequence[str]): Raw columns that were One-Hot
+            encoded during training.
+        dtype: dtype of the produced matrix.
+    """
+
+    def __init__(self, expected_features: Sequence[str],
+                 categorical_columns: Sequence[str] = cat_cols_to_encode, dtype=np.float64):
+        self.expected_features = list(expected_features)
+        self.n_features = len(self.expected_features)
+        self.dtype = dtype
+
+        self.numeric: List[Tuple[str, int]] = []
+        # raw column -> [(dummy value as text, dummy value as number or None, output index)]
+        self.dummies: Dict[str, List[Tuple[str, Optional[float], int]]] = {}
+        for idx, feature in enumerate(self.expected_features):
+            prefix = next((c for c in categorical_columns if feature.startswith(c + "_")), None)
+            if prefix is None:
+                self.numeric.append((feature, idx))
+            else:
+                value = feature[len(prefix) + 1:]
+                self.dummies.setdefault(prefix, []).append((value, _as_number(value), idx))
+
+    def transform_row(self, data: dict, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Encodes one applicant (a ``data_to_predict`` dict) into a ``(1, n)`` row.
+
+        Args:
+            data (dict): Raw column -> value.
+            out (np.ndarray, optional): Preallocated ``(1, n)`` buffer to write
+                into; avoids any allocation on the hot path.
+        """
+        if out is None:
+            out = np.zeros((1, self.n_features), dtype=self.dtype)
+        else:
+            out.fill(0)
+        row = out[0]
+        for name, idx in self.numeric:
+            row[idx] = data[name]
+        for col, values in self.dummies.items():
+            raw = data.get(col)
+            for text, number, idx in values:
+                if raw == text or (number is not None and raw == number):
+                    row[idx] = 1
+        return out
+
+    def transform(self, df: Union[pd.DataFrame, Dict[str, np.ndarray]],
+                  out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Encodes a batch of applicants into an ``(n_rows, n_features)`` matrix.
+
+        Args:
+            df: DataFrame, or mapping of column name to 1-D array.
+            out (np.ndarray, optional): Preallocated buffer with at least
+                ``n_rows`` rows; the first ``n_rows`` are filled and returned.
+        """
+        n_rows = len(df) if isinstance(df, pd.DataFrame) else len(next(iter(df.values())))
+        if out is None:
+            out = np.zeros((n_rows, self.n_features), dtype=self.dtype)
+        else:
+            out = out[:n_rows]
+            out.fill(0)
+        for name, idx in self.numeric:
+            out[:, idx] = np.asarray(df[name])
+        for col, values in self.dummies.items():
+            if col not in df:
+                continue
+            raw = np.asarray(df[col])
+            is_numeric = raw.dtype.kind in "biuf"
+            for text, number, idx in values:
+                if is_numeric:
+                    if number is not None:
+                        out[:, idx] = raw == number
+                else:
+                    out[:, idx] = raw == text
+        return out
+
+
+@lru_cache(maxsize=None)
+def _cached_encoder(expected_features: Tuple[str, ...], categorical_columns: Tuple[str, ...]) -> FeatureEncoder:
+    return FeatureEncoder(expected_features, categorical_columns)
+
+
+def get_encoder(expected_features: Sequence[str],
+                categorical_columns: Sequence[str] = cat_cols_to_encode) -> FeatureEncoder:
+    """Returns the encoder for ``expected_features``, compiling it on first use."""
+    return _cached_encoder(tuple(expected_features), tuple(categorical_columns or cat_cols_to_encode))
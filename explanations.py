@@ -0,0 +1,553 @@
+"""
+Credit explanations: the GPT call, its prompt and the rule-based reasons.
+
+``ExplanationService`` sits in front of ``call_gpt`` so the report does not
+have to wait for the LLM: explanations run on a thread pool, identical
+prompts are answered from a content-addressed cache (TTL + LRU, optionally
+persisted to SQLite) and concurrent requests for the same prompt share one
+in-flight call.
+
+``openai`` is imported, and its API key read, on the first GPT call rather
+than at import time (``get_openai``), so the app and the service start
+without it and keep working on the rule-based reasons when no key is set.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+from cache import SQLiteStore, TTLCache
+from metrics import cache_requests, gpt_calls, gpt_errors, observe_stage, span
+from rules import get_rule_set
+
+logger = logging.getLogger(__name__)
+
+GPT_MODEL = "gpt-4"
+GPT_TEMPERATURE = 0.6
+GPT_MAX_TOKENS = 750
+
+INCOMPLETE_DATA_MESSAGE = "⚠️ ข้อมูลไม่ครบถ้วน กรุณาตรวจสอบให้แน่ใจว่ากรอกข้อมูลทุกช่อง"
+
+# ฟิลด์ที่ใช้สร้าง prompt (ตามชื่อ column ใน data_to_predict)
+credit_reason_fields = [
+    "Monthly_Income", "Loan_Amount", "loan_purpose", "home_ownership", "dependents",
+    "job_completion_rate", "on_time_rate", "avg_response_time_mins", "customer_rating_avg",
+    "job_acceptance_rate", "job_cancellation_count", "weekly_active_days",
+    "membership_duration_months", "simulated_credit_score", "work_consistency_index",
+    "inactive_days_last_30", "rejected_jobs_last_30",
+]
+
+_openai = None
+_openai_lock = threading.Lock()
+_openai_api_key: Optional[str] = None
+
+
+def configure_openai(api_key: Optional[str]):
+    """
+    Sets the API key used by the next GPT call without importing ``openai``.
+
+    Without a configured key ``openai`` reads ``OPENAI_API_KEY`` from the
+    environment itself.
+    """
+    global _openai_api_key
+    with _openai_lock:
+        _openai_api_key = api_key
+        if _openai is not None and api_key:
+            _openai.api_key = api_key
+
+
+def get_openai():
+    """Imports ``openai`` on first use and applies the configured API key."""
+    global _openai
+    with _openai_lock:
+        if _openai is None:
+            with span("openai_import"):
+                import openai
+            if _openai_api_key:
+                openai.api_key = _openai_api_key
+            _openai = openai
+        return _openai
+
+
+def call_gpt(prompt: str) -> Optional[str]:
+    """
+    เรียกใช้งาน GPT-3.5 ผ่าน OpenAI API โดยส่ง prompt เข้าไป
+    และจัดการข้อผิดพลาดต่าง ๆ อย่างเหมาะสม
+    """
+    gpt_calls.inc(mode="complete")
+    openai = get_openai()
+    try:
+        with span("gpt"):
+            response = openai.ChatCompletion.create(
+                model=GPT_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=GPT_TEMPERATURE,
+                max_tokens=GPT_MAX_TOKENS,
+            )
+        #return response.choices[0].message.content
+        return response.choices[0].message.content.strip()
+
+    except openai.error.AuthenticationError as e:
+        gpt_errors.inc(type=type(e).__name__)
+        logger.error("Authentication Error: ตรวจสอบ API Key ของคุณอีกครั้ง: %s", e)
+    except openai.error.RateLimitError as e:
+        gpt_errors.inc(type=type(e).__name__)
+        logger.error("Rate Limit Error: คุณใช้งานเกิน quota แล้ว กรุณาตรวจสอบแผนของคุณ: %s", e)
+    except openai.error.OpenAIError as e:
+        gpt_errors.inc(type=type(e).__name__)
+        logger.error("OpenAI API Error: %s", e)
+    except Exception as e:
+        gpt_errors.inc(type=type(e).__name__)
+        logger.exception("เกิดข้อผิดพลาดอื่นระหว่างเรียก GPT")
+
+    return None  # หากเกิดข้อผิดพลาด จะคืนค่า None
+
+
+def stream_gpt(prompt: str) -> Iterator[str]:
+    """
+    Streams the GPT completion for ``prompt`` token by token.
+
+    Unlike ``call_gpt`` errors are raised, so the caller can fall back.
+    """
+    response = get_openai().ChatCompletion.create(
+        model=GPT_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=GPT_TEMPERATURE,
+        max_tokens=GPT_MAX_TOKENS,
+        stream=True,
+    )
+    try:
+        for chunk in response:
+            delta = chunk["choices"][0]["delta"].get("content")
+            if delta:
+                yield delta
+    finally:
+        # ปิด stream ต้นทางเมื่อผู้เรียกเลิกอ่านกลางทาง
+        close = getattr(response, "close", None)
+        if close is not None:
+            close()
+
+
+def build_credit_prompt(
+    Monthly_Income,
+    Loan_Amount,
+    loan_purpose,
+    home_ownership,
+    dependents,
+    job_completion_rate,
+    on_time_rate,
+    avg_response_time_mins,
+    customer_rating_avg,
+    job_acceptance_rate,
+    job_cancellation_count,
+    weekly_active_days,
+    membership_duration_months,
+    simulated_credit_score,
+    work_consistency_index,
+    inactive_days_last_30,
+    rejected_jobs_last_30,
+    Loan_Status_3Class=None,
+    top_factors=None
+) -> Optional[str]:
+    """
+    สร้าง prompt สำหรับให้ GPT วิเคราะห์เหตุผลประกอบการให้คะแนนเครดิต
+
+    Returns:
+        str | None: prompt หรือ None ถ้าข้อมูลไม่ครบ
+    """
+
+    # ตรวจสอบ input คร่าว ๆ
+    required_fields = [Monthly_Income, Loan_Amount, loan_purpose, home_ownership,
+                       dependents, job_completion_rate, on_time_rate, avg_response_time_mins,
+                       customer_rating_avg, job_acceptance_rate, job_cancellation_count,
+                       weekly_active_days, membership_duration_months,
+                       simulated_credit_score, work_consistency_index,
+                       inactive_days_last_30, rejected_jobs_last_30]
+
+    if any(x is None for x in required_fields):
+        return None
+
+    # --- สร้าง Prompt ---
+    prompt = f"""
+คุณคือผู้เชียวชาญอวุโสทางการเงิน นี่คือ
+ข้อมูลลูกค้าเพื่อประกอบการวิเคราะห์คะแนนเครดิต:
+
+- รายได้ต่อเดือน: {Monthly_Income:,} บาท
+- ยอดขอสินเชื่อ: {Loan_Amount:,} บาท
+- วัตถุประสงค์การกู้: {loan_purpose}
+- การถือครองที่อยู่อาศัย: {home_ownership}
+- จำนวนผู้พึ่งพิง: {dependents} คน
+
+- อัตราการทำงานสำเร็จ: {job_completion_rate:.1f}%
+- อัตราการส่งงานตรงเวลา: {on_time_rate:.1f}%
+- เวลาตอบกลับเฉลี่ย: {avg_response_time_mins:.1f} นาที
+- คะแนนจากลูกค้าเฉลี่ย: {customer_rating_avg:.2f}
+- อัตราการตอบรับงาน: {job_acceptance_rate:.1f}%
+- จำนวนการยกเลิกงานทั้งหมด: {job_cancellation_count} ครั้ง
+- ความถี่ในการทำงานต่อสัปดาห์: {weekly_active_days} วัน
+- ความสม่ำเสมอในการทำงาน: {work_consistency_index:.2f}
+
+- ระยะเวลาการเป็นสมาชิก: {membership_duration_months} เดือน
+- จำนวนวันที่ไม่ได้ทำงานใน 30 วันที่ผ่านมา: {inactive_days_last_30} วัน
+- จำนวนงานที่ปฏิเสธใน 30 วัน: {rejected_jobs_last_30} งาน
+- คะแนนเครดิตที่ประเมินได้ (จำลอง): {simulated_credit_score}
+
+กรุณาวิเคราะห์และอธิบายเหตุผลประกอบการประเมินคะแนนเครดิตของลูกค้ารายนี้
+สรุปให้สั้น กระชับ ไม่เกิน 5 บรรทัด:
+- จุดแข็ง (เชิงบวก)
+- ข้อควรระวัง (เชิงลบ)
+- ปัจจัยสำคัญที่มีผลต่อคะแนน
+- แนะนำ (กรณีไม่อนุมัติ)
+
+หลีกเลี่ยงการบอกว่าควร "อนุมัติ" หรือ "ปฏิเสธ"
+ใช้ภาษากลางที่อ่านง่าย ไม่ใช้ภาษาทางเทคนิค
+
+"""
+
+    if Loan_Status_3Class:
+        prompt += f"\n\n(ข้อมูลอ้างอิง: สถานะสินเชื่อปัจจุบันคือ '{Loan_Status_3Class}')"
+    if top_factors:
+        # ปัจจัยที่โมเดลให้น้ำหนักจริง (จาก attribution) เพื่อให้คำอธิบายสอดคล้องกับโมเดล
+        prompt += f"\n(ปัจจัยที่มีผลต่อผลการประเมินของโมเดลมากที่สุด: {top_factors})"
+
+    return prompt
+
+
+def generate_credit_reason(
+    Monthly_Income,
+    Loan_Amount,
+    loan_purpose,
+    home_ownership,
+    dependents,
+    job_completion_rate,
+    on_time_rate,
+    avg_response_time_mins,
+    customer_rating_avg,
+    job_acceptance_rate,
+    job_cancellation_count,
+    weekly_active_days,
+    membership_duration_months,
+    simulated_credit_score,
+    work_consistency_index,
+    inactive_days_last_30,
+    rejected_jobs_last_30,
+    Loan_Status_3Class=None,
+    top_factors=None
+):
+    """
+    วิเคราะห์เหตุผลประกอบการให้คะแนนเครดิตด้วย GPT โดยใช้ฟีเจอร์ที่ระบุ
+
+    Parameters: ข้อมูลคุณสมบัติของลูกค้า (ตามชื่อ column)
+    Returns:
+        str: คำอธิบายจาก GPT
+    """
+    prompt = build_credit_prompt(**locals())
+    if prompt is None:
+        return INCOMPLETE_DATA_MESSAGE
+
+    try:
+        result = call_gpt(prompt)
+        # result = call_openthaigpt(prompt)
+        if result is not None:
+            logger.debug("คำอธิบายจาก GPT: %s", result)
+        else:
+            logger.warning("ไม่สามารถเรียก GPT ได้")
+        return result
+
+    except Exception as e:
+        logger.exception("เกิดข้อผิดพลาดระหว่างขอคำอธิบายจาก GPT")
+        return f"ไม่สามารถตอบได้ในขณะนี้: {e}"
+
+
+def get_credit_reasons(score, data):
+    """
+    Generates plausible and consistent reasons based on the score and input data.
+
+    The thresholds are declared in ``rules.default_rules`` (or the file in
+    ``CREDIT_RULES_PATH``); see ``rules.RuleSet`` for batch evaluation.
+    """
+    return get_rule_set().explain_one(score, data)
+
+
+class StreamStall(TimeoutError):
+    """No token arrived within ``ExplanationStream.stall_timeout`` seconds."""
+
+
+class StreamDeadline(TimeoutError):
+    """The stream was still running when ``ExplanationStream.deadline`` passed."""
+
+
+class ExplanationStream:
+    """
+    Incremental explanation that falls back to rule-based reasons on a stall.
+
+    Tokens are pulled from ``token_source`` on a background thread as soon as
+    the stream is created, so they accumulate while the rest of the report
+    renders. Iterating yields the text received so far after every token. If
+    no token arrives within ``stall_timeout`` seconds (or the call fails, or
+    ``deadline`` passes) the stream stops and yields ``fallback_text``
+    instead; the background thread then stops pulling tokens and closes
+    the source iterator.
+
+    Attributes:
+        text (str): Final text once iteration finished.
+        time_to_first_token (float | None): Seconds until the first token.
+        total_time (float | None): Seconds until the stream finished.
+        fell_back (bool): True when ``fallback_text`` was used.
+        error (Exception | None): Why it fell back: ``StreamStall``,
+            ``StreamDeadline`` or the error raised by the source.
+    """
+
+    _DONE = object()
+
+    def __init__(self, token_source: Callable[[], Iterator[str]], fallback_text: str,
+                 stall_timeout: float = 8.0, deadline: float = 60.0,
+                 on_complete: Optional[Callable[[str], None]] = None):
+        self.fallback_text = fallback_text
+        self.stall_timeout = stall_timeout
+        self.deadline = deadline
+        self.on_complete = on_complete
+        self.text = ""
+        self.time_to_first_token = None
+        self.total_time = None
+        self.fell_back = False
+        self.error = None
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._pump, args=(token_source,), daemon=True)
+        self._thread.start()
+
+    def _pump(self, token_source):
+        tokens = None
+        try:
+            tokens = token_source()
+            for token in tokens:
+                if self._stop.is_set():
+                    break
+                self._queue.put(token)
+        except Exception as e:
+            self._queue.put(e)
+        finally:
+            close = getattr(tokens, "close", None)
+            if close is not None:
+                close()
+        self._queue.put(self._DONE)
+
+    def __iter__(self) -> Iterator[str]:
+        parts: List[str] = []
+        completed = False
+        try:
+            while True:
+                remaining = self.deadline - (time.perf_counter() - self._start)
+                try:
+                    item = self._queue.get(timeout=max(0.0, min(self.stall_timeout, remaining)))
+                except queue.Empty:
+                    if remaining < self.stall_timeout:
+                        self.error = StreamDeadline(f"GPT stream ไม่จบภายใน {self.deadline:g} วินาที")
+                    else:
+                        self.error = StreamStall(f"GPT stream หยุดนิ่งเกิน {self.stall_timeout:g} วินาที")
+                    gpt_errors.inc(type=type(self.error).__name__)
+                    logger.warning("%s ใช้เหตุผลจากกฎแทน", self.error)
+                    break
+                if item is self._DONE:
+                    completed = True
+                    break
+                if isinstance(item, Exception):
+                    gpt_errors.inc(type=type(item).__name__)
+                    logger.error("GPT stream error: %r", item)
+                    self.error = item
+                    break
+                if self.time_to_first_token is None:
+                    self.time_to_first_token = time.perf_counter() - self._start
+                    observe_stage("gpt_first_token", self.time_to_first_token)
+                parts.append(item)
+                yield "".join(parts)
+        finally:
+            # เลิกอ่านก่อนจบ (fallback หรือผู้เรียกทิ้ง iterator): ให้ thread หยุดดึง token
+            if not completed:
+                self._stop.set()
+
+        self.total_time = time.perf_counter() - self._start
+        observe_stage("gpt_stream", self.total_time)
+        if completed and parts:
+            self.text = "".join(parts).strip()
+            if self.on_complete is not None:
+                self.on_complete(self.text)
+        else:
+            self.fell_back = True
+            self.text = self.fallback_text
+        yield self.text
+
+
+class ExplanationService:
+    """
+    Runs GPT explanations in the background with caching and de-duplication.
+
+    Args:
+        completion_fn (callable, optional): ``prompt -> str | None``. Defaults
+            to ``call_gpt``; pass a stand-in to run without the OpenAI API.
+        stream_fn (callable, optional): ``prompt -> iterator of tokens`` used
+            by ``stream``. Defaults to ``stream_gpt``.
+        stall_timeout (float): Seconds without a token before ``stream``
+            falls back to the rule-based reasons.
+        deadline (float): Seconds a ``stream`` may run in total before it
+            falls back.
+        max_entries (int): Explanations kept in memory.
+        ttl_seconds (float, optional): How long an explanation stays valid.
+        cache_path (str, optional): SQLite file that persists explanations
+            across restarts. Memory only when None.
+        max_workers (int): Concurrent LLM calls.
+    """
+
+    def __init__(self, completion_fn: Optional[Callable[[str], Optional[str]]] = None,
+                 max_entries: int = 1024, ttl_seconds: Optional[float] = 24 * 3600,
+                 cache_path: Optional[str] = None, max_workers: int = 4,
+                 stream_fn: Optional[Callable[[str], Iterator[str]]] = None,
+                 stall_timeout: float = 8.0, deadline: float = 60.0):
+        self.completion_fn = completion_fn
+        self.stream_fn = stream_fn
+        self.stall_timeout = stall_timeout
+        self.deadline = deadline
+        store = SQLiteStore(cache_path, table="explanations") if cache_path else None
+        self.cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds, store=store)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="explain")
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.llm_calls = 0
+        self.deduplicated = 0
+
+    @staticmethod
+    def cache_key(prompt: str) -> str:
+        """Content address of a prompt together with the generation settings."""
+        normalized = "\n".join(line.strip() for line in prompt.strip().splitlines())
+        payload = f"{GPT_MODEL}|{GPT_TEMPERATURE}|{GPT_MAX_TOKENS}|{normalized}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def submit_prompt(self, prompt: str) -> Future:
+        """
+        Returns a Future for the explanation of ``prompt``.
+
+        The Future is already resolved on a cache hit. If the same prompt is
+        being explained already, the caller joins that call instead of
+        starting another one.
+        """
+        key = self.cache_key(prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            cache_requests.inc(cache="explanation", result="hit")
+            future = Future()
+            future.set_result(cached)
+            return future
+
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.deduplicated += 1
+                cache_requests.inc(cache="explanation", result="deduplicated")
+                return future
+            cache_requests.inc(cache="explanation", result="miss")
+            future = self._executor.submit(self._complete, key, prompt)
+            self._inflight[key] = future
+        future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def _complete(self, key: str, prompt: str) -> Optional[str]:
+        with self._lock:
+            self.llm_calls += 1
+        result = (self.completion_fn or call_gpt)(prompt)
+        # ไม่ cache กรณีเรียก GPT ไม่สำเร็จ เพื่อให้ลองใหม่ได้ในครั้งถัดไป
+        if result is not None:
+            self.cache.set(key, result)
+        return result
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def submit(self, **fields) -> Future:
+        """Like ``generate_credit_reason`` but returns a Future immediately."""
+        prompt = build_credit_prompt(**fields)
+        if prompt is None:
+            future = Future()
+            future.set_result(INCOMPLETE_DATA_MESSAGE)
+            return future
+        return self.submit_prompt(prompt)
+
+    def stream(self, fallback_text: str, stall_timeout: Optional[float] = None, deadline: Optional[float] = None,
+               **fields) -> ExplanationStream:
+        """
+        Starts a streaming explanation for the applicant ``fields``.
+
+        A cached explanation is replayed at once. Otherwise tokens are streamed
+        from ``stream_fn`` (``stream_gpt`` by default) and the finished text is
+        cached. ``fallback_text`` is shown if the stream stalls for longer
+        than ``stall_timeout`` seconds or is still running after ``deadline``
+        seconds (both default to the service's settings).
+        """
+        if stall_timeout is None:
+            stall_timeout = self.stall_timeout
+        if deadline is None:
+            deadline = self.deadline
+        prompt = build_credit_prompt(**fields)
+        if prompt is None:
+            return ExplanationStream(lambda: iter([INCOMPLETE_DATA_MESSAGE]), fallback_text, stall_timeout, deadline)
+
+        key = self.cache_key(prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            cache_requests.inc(cache="explanation", result="hit")
+            return ExplanationStream(lambda: iter([cached]), fallback_text, stall_timeout, deadline)
+        cache_requests.inc(cache="explanation", result="miss")
+
+        def token_source():
+            with self._lock:
+                self.llm_calls += 1
+            gpt_calls.inc(mode="stream")
+            return (self.stream_fn or stream_gpt)(prompt)
+
+        return ExplanationStream(token_source, fallback_text, stall_timeout, deadline,
+                                 on_complete=lambda text: self.cache.set(key, text))
+
+    async def explain_async(self, **fields) -> Optional[str]:
+        """Awaitable version of ``submit`` for asyncio callers."""
+        return await asyncio.wrap_future(self.submit(**fields))
+
+    def stats(self) -> dict:
+        with self._lock:
+            inflight = len(self._inflight)
+        return {**self.cache.stats(), "llm_calls": self.llm_calls,
+                "deduplicated": self.deduplicated, "inflight": inflight}
+
+
+_default_service: Optional[ExplanationService] = None
+_default_service_lock = threading.Lock()
+
+
+def get_explanation_service() -> ExplanationService:
+    """
+    Returns the process-wide explanation service.
+
+    Configured once from ``EXPLANATION_CACHE_SIZE`` (default 1024),
+    ``EXPLANATION_CACHE_TTL`` in seconds (default 86400),
+    ``EXPLANATION_CACHE_PATH`` (SQLite file, unset = memory only),
+    ``EXPLANATION_WORKERS`` (default 4), ``EXPLANATION_STALL_TIMEOUT`` in
+    seconds (default 8) and ``EXPLANATION_DEADLINE`` in seconds (default 60).
+    """
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            _default_service = ExplanationService(
+                max_entries=int(os.environ.get("EXPLANATION_CACHE_SIZE", "1024")),
+                ttl_seconds=float(os.environ.get("EXPLANATION_CACHE_TTL", str(24 * 3600))),
+                cache_path=os.environ.get("EXPLANATION_CACHE_PATH") or None,
+                max_workers=int(os.environ.get("EXPLANATION_WORKERS", "4")),
+                stall_timeout=float(os.environ.get("EXPLANATION_STALL_TIMEOUT", "8")),
+                deadline=float(os.environ.get("EXPLANATION_DEADLINE", "60")),
+            )
+        return _default_service
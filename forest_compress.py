@@ -0,0 +1,420 @@
+"""
+Compression of the Random Forest models with a bounded loss of fidelity.
+
+Scoring cost and memory of a forest grow with its tree count and depth. This
+tool builds smaller forests that reproduce the original's probabilities:
+
+* ``subset``: the ``trees`` estimators whose average is closest to the full
+  forest, picked greedily on a selection set;
+* ``depth``: every tree cut at ``max_depth``. Each node already stores the
+  class fractions of the samples that reach it, so a cut node becomes a leaf
+  with exactly the value the deeper subtree averages to;
+* ``subset`` and ``depth`` together (``prune``);
+* ``distill``: a new ``RandomForestClassifier`` with fewer, shallower trees
+  fitted to the original's probabilities (each row repeated once per class,
+  weighted by the teacher's probability of that class).
+
+Every candidate is compared with the original on rows that were not used to
+build it: the share of equal classes, the mean / 99th percentile / largest
+absolute probability difference and, with a labelled ``--data`` file, the
+accuracy of both. ``--method auto`` tries a grid of candidates and keeps the
+one with the fewest trees (then nodes) that stays inside ``--min-agreement``
+and ``--max-mean-drift``.
+
+The result is a plain ``RandomForestClassifier`` saved with joblib as
+``<model>_compressed.pkl`` together with a copy of the descriptor, so the app,
+the batch job, the service, ``forest_engine.py`` and ``onnx_engine.py`` all
+take it like the original (add it to ``model_options`` to offer it in the
+app). A gradient-boosted student is not offered: the app explains every
+prediction with per-tree path attributions (``attribution.TreeAttributor``),
+which only forests support.
+
+Usage:
+    python forest_compress.py C2M2_Credit_score_with_Random_Forest_Model.pkl
+    python forest_compress.py C2M2_...pkl --method prune --trees 20 --max-depth 8
+    python forest_compress.py C2M2_...pkl --data held_out.csv --label-column Loan_Status
+
+Without ``--data`` the rows are ``synthetic_applicants``: uniform over the
+form's input ranges, which weights unusual applicants more than real traffic
+does, so the drift reported is a conservative estimate.
+"""
+import argparse
+import copy
+import json
+import os
+import pickle
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+methods = ("auto", "subset", "depth", "prune", "distill")
+
+# ขอบเขตที่ยอมรับได้ตั้งต้น: class ตรงกันอย่างน้อย 99% และ |Δp| เฉลี่ยไม่เกิน 0.05
+default_min_agreement = 0.99
+default_max_mean_drift = 0.05
+
+# ตัวเลือกที่ --method auto ลอง
+auto_trees = (5, 10, 15, 20, 30, 50)
+auto_depths = (None, 8, 6)
+auto_students = ((5, 8), (10, 8), (20, 10))
+
+# แถวสำหรับเลือกต้นไม้ / ฝึก student และแถวสำหรับวัดผล ใช้ seed ต่างกันเพื่อไม่ให้ซ้อนกัน
+_selection_seed = 1
+_evaluation_seed = 2
+
+
+@dataclass
+class Candidate:
+    """
+    One compressed forest and how far it is from the original.
+
+    Attributes:
+        method (str): How it was built.
+        params (dict): ``trees`` / ``max_depth`` it was built with.
+        model: The fitted ``RandomForestClassifier``.
+        report (dict): ``evaluate`` results.
+    """
+    method: str
+    params: Dict[str, Optional[int]]
+    model: object
+    report: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def label(self) -> str:
+        return f"{self.method}({', '.join(f'{k}={v}' for k, v in self.params.items() if v is not None)})"
+
+    def within(self, min_agreement: float, max_mean_drift: float) -> bool:
+        return (self.report["class_agreement"] >= min_agreement
+                and self.report["mean_abs_diff"] <= max_mean_drift)
+
+
+def _tree_probabilities(forest, X: np.ndarray) -> np.ndarray:
+    """``(n_trees, n_rows, n_classes)`` probabilities of every estimator."""
+    return np.stack([estimator.predict_proba(X) for estimator in forest.estimators_])
+
+
+def select_trees(forest, X, trees: int) -> List[int]:
+    """
+    Greedy forward selection of the estimators that best reproduce ``forest``.
+
+    Each step adds the tree that makes the running average closest (mean
+    absolute difference) to the full forest's probabilities on ``X``.
+
+    Returns:
+        list[int]: Indices into ``forest.estimators_``, in selection order.
+    """
+    per_tree = _tree_probabilities(forest, np.asarray(X, dtype=np.float32))
+    target = per_tree.mean(axis=0)
+    chosen = []
+    total = np.zeros_like(target)
+    available = np.ones(len(per_tree), dtype=bool)
+    for size in range(1, min(trees, len(per_tree)) + 1):
+        # ค่าเฉลี่ยใหม่ของทุกต้นที่ยังไม่ถูกเลือก คำนวณพร้อมกันทีเดียว
+        error = np.abs((total[None] + per_tree) / size - target[None]).mean(axis=(1, 2))
+        error[~available] = np.inf
+        best = int(error.argmin())
+        chosen.append(best)
+        available[best] = False
+        total += per_tree[best]
+    return chosen
+
+
+def subset_forest(forest, indices: Sequence[int]):
+    """A copy of ``forest`` with only the estimators at ``indices``."""
+    compressed = copy.deepcopy(forest)
+    compressed.estimators_ = [compressed.estimators_[i] for i in indices]
+    compressed.n_estimators = len(compressed.estimators_)
+    return compressed
+
+
+def truncate_tree(tree, max_depth: int):
+    """
+    Returns a copy of an sklearn ``Tree`` cut at ``max_depth``.
+
+    Nodes at ``max_depth`` become leaves, everything below them is dropped and
+    the remaining nodes are renumbered. Node values are class fractions in
+    sklearn >= 1.4, so a new leaf predicts the fractions of every training
+    sample that reached it.
+    """
+    from sklearn.tree._tree import Tree
+
+    state = tree.__getstate__()
+    if state["max_depth"] <= max_depth:
+        return tree
+    nodes, values = state["nodes"], state["values"]
+    left, right = nodes["left_child"], nodes["right_child"]
+
+    # เดินแบบ depth-first ตามลำดับเดียวกับ sklearn (ซ้ายก่อน) แล้วตัดที่ความลึก max_depth
+    kept, depths = [], []
+    stack = [(0, 0)]
+    while stack:
+        node, depth = stack.pop()
+        kept.append(node)
+        depths.append(depth)
+        if left[node] != -1 and depth < max_depth:
+            stack.append((right[node], depth + 1))
+            stack.append((left[node], depth + 1))
+    kept = np.array(kept, dtype=np.intp)
+    new_id = np.full(len(nodes), -1, dtype=np.int64)
+    new_id[kept] = np.arange(len(kept))
+
+    new_nodes = nodes[kept].copy()
+    cut = np.array(depths) >= max_depth
+    is_leaf = (new_nodes["left_child"] == -1) | cut
+    new_nodes["left_child"] = np.where(is_leaf, -1, new_id[np.where(is_leaf, 0, new_nodes["left_child"])])
+    new_nodes["right_child"] = np.where(is_leaf, -1, new_id[np.where(is_leaf, 0, new_nodes["right_child"])])
+    new_nodes["feature"][is_leaf] = -2
+    new_nodes["threshold"][is_leaf] = -2.0
+
+    truncated = Tree(tree.n_features, np.asarray(tree.n_classes, dtype=np.intp), tree.n_outputs)
+    truncated.__setstate__({
+        "max_depth": int(min(state["max_depth"], max_depth)),
+        "node_count": len(kept),
+        "nodes": new_nodes,
+        "values": np.ascontiguousarray(values[kept]),
+    })
+    return truncated
+
+
+def cap_depth(forest, max_depth: int):
+    """A copy of ``forest`` with every tree cut at ``max_depth``."""
+    compressed = copy.deepcopy(forest)
+    for estimator in compressed.estimators_:
+        estimator.tree_ = truncate_tree(estimator.tree_, max_depth)
+        estimator.max_depth = max_depth
+    compressed.max_depth = max_depth
+    return compressed
+
+
+def distill(forest, X: pd.DataFrame, trees: int, max_depth: Optional[int], seed: int = 0):
+    """
+    Fits a smaller ``RandomForestClassifier`` to the probabilities of ``forest``.
+
+    Every row of ``X`` is repeated once per class with the teacher's
+    probability of that class as its sample weight, so the student's leaves
+    estimate the teacher's class fractions rather than only its arg-max.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+
+    proba = forest.predict_proba(X)
+    classes = np.asarray(forest.classes_)
+    repeated = X.iloc[np.repeat(np.arange(len(X)), len(classes))].reset_index(drop=True)
+    labels = np.tile(classes, len(X))
+    weights = proba.ravel()
+    keep = weights > 0
+    # student สุ่ม feature ครึ่งหนึ่งต่อ split: ต้นไม้น้อยจึงต้องแม่นกว่าต้นของ forest เดิม (sqrt)
+    student = RandomForestClassifier(n_estimators=trees, max_depth=max_depth, max_features=0.5,
+                                     min_samples_leaf=5, random_state=seed)
+    student.fit(repeated[keep], labels[keep], sample_weight=weights[keep])
+    return student
+
+
+def forest_size(model) -> Dict[str, float]:
+    """Tree count, node count, deepest tree, pickled size and in-memory size."""
+    from model_registry import estimate_memory
+
+    return {
+        "trees": len(model.estimators_),
+        "nodes": int(sum(estimator.tree_.node_count for estimator in model.estimators_)),
+        "depth": int(max(estimator.tree_.max_depth for estimator in model.estimators_)),
+        "pickle_kb": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1024,
+        "memory_kb": estimate_memory(model) / 1024,
+    }
+
+
+def latency_ms(model, X, repeat: int = 200) -> float:
+    """Median milliseconds of one ``predict_proba`` call."""
+    model.predict_proba(X)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.predict_proba(X)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def evaluate(original, candidate, X: pd.DataFrame, y: Optional[np.ndarray] = None) -> Dict[str, float]:
+    """
+    Fidelity of ``candidate`` to ``original`` on ``X``.
+
+    Returns:
+        dict: ``class_agreement``, ``mean_abs_diff``, ``p99_abs_diff`` and
+        ``max_abs_diff`` of the probabilities; ``accuracy`` and
+        ``original_accuracy`` when labels ``y`` are given.
+    """
+    from scoring import predict_with_proba
+
+    expected_class, expected = predict_with_proba(original, X)
+    predicted_class, proba = predict_with_proba(candidate, X)
+    diff = np.abs(proba - expected)
+    report = {
+        "class_agreement": float((predicted_class == expected_class).mean()),
+        "mean_abs_diff": float(diff.mean()),
+        "p99_abs_diff": float(np.quantile(diff.max(axis=1), 0.99)),
+        "max_abs_diff": float(diff.max()),
+    }
+    if y is not None:
+        report["accuracy"] = float((predicted_class == y).mean())
+        report["original_accuracy"] = float((expected_class == y).mean())
+    return report
+
+
+def build_candidates(forest, method: str, X_select: pd.DataFrame, trees: Optional[int] = None,
+                     max_depth: Optional[int] = None, seed: int = 0) -> List[Candidate]:
+    """
+    Builds the compressed forests ``method`` asks for.
+
+    Fixed ``trees`` / ``max_depth`` build one candidate; ``"auto"`` builds the
+    ``auto_trees`` x ``auto_depths`` subsets and the ``auto_students``.
+    """
+    if method == "auto":
+        order = select_trees(forest, X_select, max(auto_trees))
+        candidates = []
+        for depth in auto_depths:
+            for k in auto_trees:
+                pruned = subset_forest(forest, order[:k])
+                if depth is not None:
+                    pruned = cap_depth(pruned, depth)
+                candidates.append(Candidate("prune", {"trees": k, "max_depth": depth}, pruned))
+        for k, depth in auto_students:
+            candidates.append(Candidate("distill", {"trees": k, "max_depth": depth},
+                                        distill(forest, X_select, k, depth, seed)))
+        return candidates
+
+    if method in ("subset", "prune", "distill") and not trees:
+        raise ValueError(f"--method {method} needs --trees")
+    if method in ("depth", "prune") and not max_depth:
+        raise ValueError(f"--method {method} needs --max-depth")
+    if method == "distill":
+        return [Candidate(method, {"trees": trees, "max_depth": max_depth},
+                          distill(forest, X_select, trees, max_depth, seed))]
+    model = forest
+    if method in ("subset", "prune"):
+        model = subset_forest(model, select_trees(forest, X_select, trees))
+    if method in ("depth", "prune"):
+        model = cap_depth(model, max_depth)
+    return [Candidate(method, {"trees": trees if method != "depth" else None,
+                               "max_depth": max_depth if method != "subset" else None}, model)]
+
+
+def load_rows(model_file: str, rows: int, seed: int, data: Optional[str] = None,
+              label_column: Optional[str] = None):
+    """
+    Model input and optional labels for evaluation or selection.
+
+    Returns:
+        tuple: ``(X, y)``; ``y`` is None without ``label_column``.
+    """
+    from scoring import csv_read_options, prepare_features, raw_features, synthetic_applicants
+
+    if data:
+        df = pd.read_csv(data, **csv_read_options)
+        y = df[label_column].to_numpy() if label_column else None
+    else:
+        df = synthetic_applicants(rows, seed=seed, labels=False)
+        y = None
+    return prepare_features(df[raw_features(model_file)], model_file), y
+
+
+def save_compressed(model, model_file: str, output_path: str, label: str) -> str:
+    """Writes ``model`` with joblib and a copy of the descriptor next to it."""
+    import joblib
+
+    from model_descriptor import descriptor_path
+
+    joblib.dump(model, output_path)
+    with open(descriptor_path(model_file), encoding="utf-8") as f:
+        config = json.load(f)
+    config["name"] = f"{config['name']} [{label}]"
+    with open(descriptor_path(output_path), "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    return output_path
+
+
+def compress(model_file: str, method: str = "auto", trees: Optional[int] = None, max_depth: Optional[int] = None,
+             rows: int = 10_000, data: Optional[str] = None, label_column: Optional[str] = None,
+             seed: int = 0) -> List[Candidate]:
+    """
+    Builds and evaluates the compressed forests of ``model_file``.
+
+    Trees are selected and students fitted on synthetic applicants; the
+    evaluation uses ``data`` when given, otherwise a separate synthetic set.
+
+    Returns:
+        list[Candidate]: Every candidate with its ``report``, fewest trees
+        (then nodes) first.
+    """
+    import joblib
+
+    forest = joblib.load(model_file)
+    if not hasattr(forest, "estimators_"):
+        raise TypeError(f"{model_file} is a {type(forest).__name__}, not a Random Forest")
+    X_select, _ = load_rows(model_file, rows, _selection_seed)
+    X_eval, y = load_rows(model_file, rows, _evaluation_seed, data, label_column)
+    candidates = build_candidates(forest, method, X_select, trees, max_depth, seed)
+
+    single = X_eval.iloc[:1]
+    base_ms = latency_ms(forest, single)
+    for candidate in candidates:
+        candidate.report = evaluate(forest, candidate.model, X_eval, y)
+        candidate.report.update(forest_size(candidate.model))
+        candidate.report["speedup"] = base_ms / latency_ms(candidate.model, single)
+    candidates.sort(key=lambda c: (c.report["trees"], c.report["nodes"]))
+    return candidates
+
+
+def _format(label: str, report: dict) -> str:
+    accuracy = (f" acc {report['accuracy']:.2%} (orig {report['original_accuracy']:.2%})"
+                if "accuracy" in report else "")
+    return (f"{label:<30} {report['trees']:>4} trees {report['nodes']:>6,} nodes depth {report['depth']:>2} "
+            f"{report['pickle_kb']:>6.0f} KB  x{report.get('speedup', 1.0):>4.1f}  "
+            f"agree {report['class_agreement']:.2%}  |Δp| mean {report['mean_abs_diff']:.4f} "
+            f"p99 {report['p99_abs_diff']:.3f} max {report['max_abs_diff']:.3f}{accuracy}")
+
+
+def main(argv=None):
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Compress a pickled Random Forest with a bounded fidelity loss.")
+    parser.add_argument("model", help="Pickled RandomForestClassifier (.pkl)")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Destination .pkl (default: <model>_compressed.pkl next to the model)")
+    parser.add_argument("--method", choices=methods, default="auto")
+    parser.add_argument("--trees", type=int, default=None, help="Trees to keep (subset, prune, distill)")
+    parser.add_argument("--max-depth", type=int, default=None, help="Depth cap (depth, prune, distill)")
+    parser.add_argument("--min-agreement", type=float, default=default_min_agreement,
+                        help=f"Least share of classes equal to the original (default {default_min_agreement})")
+    parser.add_argument("--max-mean-drift", type=float, default=default_max_mean_drift,
+                        help=f"Largest mean |Δp| from the original (default {default_max_mean_drift})")
+    parser.add_argument("--rows", type=int, default=10_000, help="Synthetic rows for selection and evaluation")
+    parser.add_argument("--data", default=None, help="Held-out CSV with the data_to_predict columns")
+    parser.add_argument("--label-column", default=None, help="Column of --data with the true class")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of distilled students")
+    args = parser.parse_args(argv)
+
+    candidates = compress(args.model, args.method, args.trees, args.max_depth, args.rows, args.data,
+                          args.label_column, args.seed)
+    print("  " + _format("original", {**forest_size(joblib.load(args.model)), "class_agreement": 1.0,
+                               "mean_abs_diff": 0.0, "p99_abs_diff": 0.0, "max_abs_diff": 0.0}))
+    for candidate in candidates:
+        ok = candidate.within(args.min_agreement, args.max_mean_drift)
+        print(f"{'✅' if ok else '❌'} {_format(candidate.label, candidate.report)}")
+
+    passing = [c for c in candidates if c.within(args.min_agreement, args.max_mean_drift)]
+    if not passing:
+        print(f"No candidate within agreement >= {args.min_agreement:.2%} and mean |Δp| <= {args.max_mean_drift}")
+        sys.exit(1)
+    best = passing[0]
+    output_path = args.output or os.path.splitext(args.model)[0] + "_compressed.pkl"
+    save_compressed(best.model, args.model, output_path, best.label)
+    print(f"{args.model} -> {output_path}: {best.label}, {best.report['pickle_kb']:.0f} KB, "
+          f"x{best.report['speedup']:.1f} faster per row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Flat-array inference engine for the Random Forest models.
+
+``FlatForest`` copies every tree of a fitted ``RandomForestClassifier`` into
+one set of contiguous NumPy arrays (split feature, threshold, children and
+class fractions per node). Scoring walks all trees for all rows at once, one
+tree level per step, and returns classes and probabilities from that single
+traversal. The arithmetic follows sklearn's own (float32 inputs, per-tree
+leaf fractions summed in tree order, then averaged), so the output matches
+``predict_proba`` bit for bit.
+
+Compared with sklearn this removes the per-estimator Python and joblib
+dispatch, which dominates small requests (the app and the service score one
+row at a time). Pure NumPy cannot beat sklearn's compiled traversal on large
+batches, so bulk jobs gain less; see ``benchmarks/bench_forest_engine.py``.
+
+Export a pickled forest next to the ``.pkl`` with:
+    python forest_engine.py C2M2_Credit_score_with_Random_Forest_Model.pkl
+
+The resulting ``.npz`` can be loaded by ``ModelRegistry`` like a ``.pkl``.
+It is an uncompressed archive, so ``FlatForest.load(path, mmap=True)`` maps
+the arrays straight from the file instead of copying them: every process
+that loads the same file shares one copy through the OS page cache, and load
+time does not grow with the model.
+"""
+import argparse
+import os
+import struct
+import zipfile
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+# จำนวนแถวต่อรอบการเดินต้นไม้ ให้ข้อมูลทำงานอยู่ใน cache
+_rows_per_block = 1024
+
+# ชื่อ array ที่บันทึกลงไฟล์ .npz
+_array_names = ("feature", "threshold", "children", "leaf_value", "roots", "classes")
+
+# array ที่เล็กกว่านี้อ่านเข้าหน่วยความจำตรง ๆ ไม่คุ้มที่จะ map
+_min_mmap_bytes = 4096
+
+
+class FlatForest:
+    """
+    All trees of a forest in flat arrays, indexed by a global node id.
+
+    Leaves point to themselves as both children (with a threshold of +inf), so
+    the traversal needs no leaf test and simply runs ``max_depth`` steps.
+
+    Args:
+        feature (np.ndarray): Split feature per node.
+        threshold (np.ndarray): Split threshold per node.
+        children (np.ndarray): ``(n_nodes, 2)`` global ids of the left and
+            right child per node.
+        leaf_value (np.ndarray): ``(n_nodes, n_classes)`` class fractions
+            (set for internal nodes too).
+        roots (np.ndarray): Global id of every tree's root.
+        classes (np.ndarray): Class labels, as in ``model.classes_``.
+        feature_names (Sequence[str], optional): Input column names.
+        max_depth (int, optional): Deepest tree; computed when omitted.
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, children: np.ndarray,
+                 leaf_value: np.ndarray, roots: np.ndarray, classes: np.ndarray,
+                 feature_names: Optional[Sequence[str]] = None, max_depth: Optional[int] = None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.classes_ = classes
+        self.n_classes_ = len(classes)
+        self.n_estimators = len(roots)
+        self.n_features_in_ = int(feature.max()) + 1 if feature_names is None else len(feature_names)
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.max_depth = self._depth() if max_depth is None else max_depth
+
+    @property
+    def children_left(self) -> np.ndarray:
+        return self.children[:, 0]
+
+    @property
+    def children_right(self) -> np.ndarray:
+        return self.children[:, 1]
+
+    @classmethod
+    def from_sklearn(cls, forest) -> "FlatForest":
+        """Flattens a fitted ``RandomForestClassifier`` (single output)."""
+        parts = {name: [] for name in ("feature", "threshold", "children", "leaf_value")}
+        roots = []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left < 0
+            node_ids = np.arange(offset, offset + tree.node_count)
+            parts["feature"].append(np.where(is_leaf, 0, tree.feature))
+            parts["threshold"].append(np.where(is_leaf, np.inf, tree.threshold))
+            parts["children"].append(np.column_stack([
+                np.where(is_leaf, node_ids, tree.children_left + offset),
+                np.where(is_leaf, node_ids, tree.children_right + offset),
+            ]))
+            value = tree.value[:, 0, :forest.n_classes_].astype(np.float64)
+            if not np.allclose(value.sum(axis=1), 1.0):
+                # sklearn รุ่นเก่าเก็บจำนวนตัวอย่าง แล้วค่อย normalize ตอน predict_proba
+                normalizer = value.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                value = value / normalizer
+            parts["leaf_value"].append(value)
+            roots.append(offset)
+            offset += tree.node_count
+
+        return cls(
+            feature=np.concatenate(parts["feature"]).astype(np.intp),
+            threshold=np.concatenate(parts["threshold"]).astype(np.float64),
+            children=np.concatenate(parts["children"]).astype(np.intp),
+            leaf_value=np.concatenate(parts["leaf_value"]),
+            roots=np.asarray(roots, dtype=np.intp),
+            classes=np.asarray(forest.classes_),
+            feature_names=getattr(forest, "feature_names_in_", None),
+            max_depth=max(estimator.tree_.max_depth for estimator in forest.estimators_),
+        )
+
+    def _depth(self) -> int:
+        nodes, depth = self.roots, 0
+        while True:
+            children = self.children_left[nodes]
+            moving = children != nodes
+            if not moving.any():
+                return depth
+            nodes = np.concatenate([children[moving], self.children_right[nodes][moving]])
+            depth += 1
+
+    def _as_matrix(self, X) -> np.ndarray:
+        # DataFrame: เรียงคอลัมน์ตามตอนเทรน (ไม่ import pandas เพื่อให้โหลดเร็ว)
+        if hasattr(X, "columns") and hasattr(self, "feature_names_in_"):
+            names = list(self.feature_names_in_)
+            if list(X.columns) != names:
+                X = X[names]
+        # sklearn เปรียบเทียบ threshold กับ input ที่แปลงเป็น float32
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, expected (n_rows, {self.n_features_in_})")
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity")
+        return X
+
+    def _apply_block(self, X: np.ndarray) -> np.ndarray:
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.n_estimators))
+        for _ in range(self.max_depth):
+            values = np.take_along_axis(X, self.feature[nodes], axis=1)
+            go_right = values > self.threshold[nodes]
+            nodes = self.children[nodes, go_right.view(np.int8)]
+        return nodes
+
+    def apply(self, X) -> np.ndarray:
+        """Returns the global leaf id reached in every tree, ``(n_rows, n_estimators)``."""
+        X = self._as_matrix(X)
+        if X.shape[0] <= _rows_per_block:
+            return self._apply_block(X)
+        return np.concatenate([self._apply_block(X[start:start + _rows_per_block])
+                               for start in range(0, X.shape[0], _rows_per_block)])
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = self._as_matrix(X)
+        proba = np.empty((X.shape[0], self.n_classes_))
+        for start in range(0, X.shape[0], _rows_per_block):
+            leaves = self._apply_block(X[start:start + _rows_per_block])
+            # sum ตามแกนต้นไม้บวกทีละต้นตามลำดับเหมือน sklearn จึงได้ค่าเท่ากันทุกบิต
+            proba[start:start + len(leaves)] = self.leaf_value[leaves].sum(axis=1)
+        proba /= self.n_estimators
+        return proba
+
+    def predict_with_proba(self, X) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns ``(classes, probabilities)`` from one traversal."""
+        proba = self.predict_proba(X)
+        return self.classes_[proba.argmax(axis=1)], proba
+
+    def predict(self, X) -> np.ndarray:
+        return self.predict_with_proba(X)[0]
+
+    def to_arrays(self) -> dict:
+        arrays = {name: getattr(self, name) for name in _array_names if name != "classes"}
+        arrays["classes"] = self.classes_
+        arrays["max_depth"] = np.array(self.max_depth)
+        if hasattr(self, "feature_names_in_"):
+            arrays["feature_names"] = np.asarray(self.feature_names_in_, dtype=str)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "FlatForest":
+        feature_names = arrays["feature_names"].tolist() if "feature_names" in arrays else None
+        return cls(**{name: arrays[name] for name in _array_names},
+                   feature_names=feature_names, max_depth=int(arrays["max_depth"]))
+
+    def save(self, path: str):
+        # ต้องไม่บีบอัด เพื่อให้ map array จากไฟล์ได้
+        np.savez(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False) -> "FlatForest":
+        """
+        Loads a forest saved with ``save``.
+
+        Args:
+            mmap (bool): Map the arrays read-only from the file instead of
+                reading them into private memory.
+        """
+        if mmap:
+            return cls.from_arrays(mmap_npz(path))
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls.from_arrays(arrays)
+
+
+def mmap_npz(path: str) -> Dict[str, np.ndarray]:
+    """
+    Maps every array of an uncompressed ``.npz`` read-only, without copying.
+
+    ``np.load`` cannot memory-map ``.npz`` members, but ``np.savez`` stores
+    them uncompressed, so each member's data sits at a fixed offset in the
+    archive and can be mapped with ``np.memmap`` directly.
+
+    Raises:
+        ValueError: If a member is compressed (``np.savez_compressed``).
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: '{info.filename}' is compressed and cannot be memory-mapped")
+            # local file header: 30 bytes + ชื่อไฟล์ + extra field แล้วจึงเป็นข้อมูล .npy
+            f.seek(info.header_offset)
+            name_length, extra_length = struct.unpack("<HH", f.read(30)[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError(f"{path}: '{info.filename}' holds Python objects and cannot be memory-mapped")
+
+            name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+            order = "F" if fortran_order else "C"
+            n_bytes = int(np.prod(shape)) * dtype.itemsize
+            if n_bytes < _min_mmap_bytes:
+                arrays[name] = np.frombuffer(f.read(n_bytes), dtype=dtype).reshape(shape, order=order)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape, order=order)
+    return arrays
+
+
+def export_forest(model_file: str, output_path: Optional[str] = None) -> str:
+    """
+    Flattens the pickled forest in ``model_file`` and saves it as ``.npz``.
+
+    Returns:
+        str: Path of the written file (``<model>.npz`` by default).
+    """
+    import joblib
+
+    output_path = output_path or os.path.splitext(model_file)[0] + ".npz"
+    FlatForest.from_sklearn(joblib.load(model_file)).save(output_path)
+    return output_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a pickled Random Forest to the flat .npz format.")
+    parser.add_argument("model", help="Pickled RandomForestClassifier (.pkl)")
+    parser.add_argument("-o", "--output", default=None, help="Destination .npz (default: next to the model)")
+    args = parser.parse_args(argv)
+
+    output_path = export_forest(args.model, args.output)
+    forest = FlatForest.load(output_path)
+    print(f"{args.model} -> {output_path}: {forest.n_estimators} trees, {len(forest.feature):,} nodes, "
+          f"depth {forest.max_depth}, {os.path.getsize(output_path) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Pure-NumPy inference engine for the Logistic Regression models.
+
+``LinearModel`` takes ``coef_``, ``intercept_`` and ``classes_`` from a fitted
+``LogisticRegression`` once and scores an encoded matrix (``FeatureEncoder``
+output) with one matrix multiply plus the same link function sklearn uses:
+the logistic function normalized over classes for one-vs-rest models
+(``liblinear``), softmax for multinomial ones. The class is the arg-max of the
+decision function, as in ``LogisticRegression.predict``.
+
+Compared with sklearn this skips input validation on every call. Measured on
+the path a request takes, ``ScoringPipeline.predict_row`` (``transform_row``
+plus the model) scores one applicant in 30-50 µs with ``LinearModel`` and in
+120-200 µs with the sklearn model in its place. The matrix multiply itself is
+negligible; encoding the row through a one-row DataFrame costs about 4 ms and
+would hide either (see ``benchmarks/bench_encoder.py``). Large batches are
+scored in chunks of ``_rows_per_chunk`` rows, so the temporaries stay small
+however many rows come in; only the ``(n_rows, n_classes)`` output grows with
+the batch. ``dtype=np.float32`` halves the memory traffic for bulk jobs; the raw
+income and loan amounts are large, so probabilities then move by up to about
+1e-4 (classes were unchanged on a million synthetic applicants).
+
+``ScoringPipeline`` compiles every linear model into a ``LinearModel`` (in
+float64, matching ``predict_proba`` to rounding); see
+``benchmarks/bench_linear_engine.py`` for the comparison with sklearn.
+"""
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# จำนวนแถวต่อรอบ ให้ array ชั่วคราวเล็กพอจะอยู่ใน cache
+_rows_per_chunk = 65_536
+
+link_functions = ("ovr", "multinomial")
+
+
+def expit(x, out=None) -> np.ndarray:
+    """
+    The logistic function ``1 / (1 + exp(-x))``, as ``scipy.special.expit``.
+
+    Written with ``exp(-|x|)`` so it neither overflows nor loses the small
+    probabilities of very negative scores, which one-vs-rest models normalize
+    over classes. Kept in NumPy because importing scipy costs more at startup
+    than the whole scoring call.
+    """
+    x = np.asarray(x)
+    e = np.exp(-np.abs(x))
+    return np.divide(np.where(x >= 0, 1.0, e), 1.0 + e, out=out)
+
+
+class LinearModel:
+    """
+    Coefficients of a fitted linear classifier, ready for matrix scoring.
+
+    Args:
+        coef (np.ndarray): ``(n_scores, n_features)``, as ``model.coef_``
+            (one row for a binary model).
+        intercept (np.ndarray): ``(n_scores,)``, as ``model.intercept_``.
+        classes (np.ndarray): Class labels, as ``model.classes_``.
+        link (str): ``"ovr"`` or ``"multinomial"`` (ignored for binary models).
+        dtype: Arithmetic and output dtype, ``np.float64`` or ``np.float32``.
+        feature_names (Sequence[str], optional): Input column names.
+    """
+
+    def __init__(self, coef: np.ndarray, intercept: np.ndarray, classes: np.ndarray, link: str = "ovr",
+                 dtype=np.float64, feature_names: Optional[Sequence[str]] = None):
+        if link not in link_functions:
+            raise ValueError(f"Unknown link {link!r}; expected one of {link_functions}")
+        self.dtype = np.dtype(dtype)
+        self.coef_ = np.atleast_2d(np.asarray(coef, dtype=np.float64))
+        self.intercept_ = np.atleast_1d(np.asarray(intercept, dtype=np.float64))
+        self.classes_ = np.asarray(classes)
+        self.link = link
+        self.n_features_in_ = self.coef_.shape[1]
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        # (n_features, n_scores) ต่อเนื่องในหน่วยความจำ สำหรับ X @ weights
+        self.weights = np.ascontiguousarray(self.coef_.T, dtype=self.dtype)
+        self.bias = self.intercept_.astype(self.dtype)
+
+    @classmethod
+    def from_sklearn(cls, model, dtype=np.float64) -> "LinearModel":
+        """Extracts a fitted ``LogisticRegression``."""
+        ovr = getattr(model, "multi_class", "auto") == "ovr" or getattr(model, "solver", None) == "liblinear"
+        return cls(model.coef_, model.intercept_, model.classes_, "ovr" if ovr else "multinomial", dtype,
+                   getattr(model, "feature_names_in_", None))
+
+    def _scores(self, X: np.ndarray) -> np.ndarray:
+        scores = np.asarray(X, dtype=self.dtype) @ self.weights
+        scores += self.bias
+        return scores
+
+    def decision_function(self, X) -> np.ndarray:
+        """``model.decision_function``: ``(n_rows,)`` for binary models, else ``(n_rows, n_classes)``."""
+        X = _as_matrix(X)
+        scores = np.empty((len(X), self.weights.shape[1]), dtype=self.dtype)
+        for start in range(0, len(X), _rows_per_chunk):
+            scores[start:start + _rows_per_chunk] = self._scores(X[start:start + _rows_per_chunk])
+        return scores[:, 0] if scores.shape[1] == 1 else scores
+
+    def predict_with_proba(self, X) -> Tuple[np.ndarray, np.ndarray]:
+        """Classes and probabilities, chunk by chunk."""
+        X = _as_matrix(X)
+        n_classes = len(self.classes_)
+        class_idx = np.empty(len(X), dtype=np.intp)
+        proba = np.empty((len(X), n_classes), dtype=self.dtype)
+        for start in range(0, len(X), _rows_per_chunk):
+            stop = start + _rows_per_chunk
+            scores = self._scores(X[start:stop])
+            if scores.shape[1] == 1:
+                # binary: คะแนนเดียวของ class บวก
+                class_idx[start:stop] = scores[:, 0] > 0
+                positive = expit(scores[:, 0])
+                proba[start:stop, 0] = 1 - positive
+                proba[start:stop, 1] = positive
+                continue
+            class_idx[start:stop] = scores.argmax(axis=1)
+            if self.link == "ovr":
+                expit(scores, out=scores)
+            else:
+                scores -= scores.max(axis=1, keepdims=True)
+                np.exp(scores, out=scores)
+            scores /= scores.sum(axis=1, keepdims=True)
+            proba[start:stop] = scores
+        return self.classes_[class_idx], proba
+
+    def predict(self, X) -> np.ndarray:
+        return self.predict_with_proba(X)[0]
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self.predict_with_proba(X)[1]
+
+
+def _as_matrix(X) -> np.ndarray:
+    """A 2-D array view of ``X`` (a DataFrame or array), converted per chunk later."""
+    if hasattr(X, "to_numpy"):
+        X = X.to_numpy()
+    X = np.asarray(X)
+    return X.reshape(1, -1) if X.ndim == 1 else X
+
+
+def is_linear(model) -> bool:
+    """Whether ``model`` is a fitted sklearn linear classifier ``LinearModel`` can take over."""
+    return hasattr(model, "coef_") and hasattr(model, "decision_function") and not isinstance(model, LinearModel)
@@ -0,0 +1,175 @@
+"""
+Local load-test harness for the scoring service.
+
+Fires requests at ``/score`` (or ``/score/batch`` with ``--batch-size``) from a
+pool of client threads and reports throughput and latency percentiles, so a
+single replica can be sized before deploying more.
+
+Every request carries different applicants (``synthetic_applicants``), so
+``/score`` is measured on result-cache misses, i.e. actual scoring.
+``--distinct N`` cycles through N applicants instead, to measure a given hit
+rate; the report includes the server's cache hits and misses during the run.
+
+Usage:
+    python loadtest.py --start-server --concurrency 16 --requests 2000
+    python loadtest.py --url http://scoring:8000 --batch-size 500 --requests 200
+
+Exits with status 1 when the client-side p50/p99 of single-row requests miss
+the service targets (LATENCY_TARGET_P50_MS / LATENCY_TARGET_P99_MS).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from scoring import synthetic_applicants
+
+
+def _post(url: str, payload: bytes, timeout: float) -> Tuple[float, Optional[str]]:
+    request = urllib.request.Request(url, data=payload, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+        error = None
+    except (urllib.error.URLError, TimeoutError) as e:
+        error = type(e).__name__
+    return (time.perf_counter() - start) * 1000, error
+
+
+def _get_json(url: str, timeout: float = 5.0):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def wait_for_server(base_url: str, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            _get_json(f"{base_url}/health", timeout=1.0)
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError(f"Service at {base_url} did not become healthy within {timeout:.0f}s")
+
+
+def build_payloads(requests: int, batch_size: int = 0, model: Optional[str] = None, distinct: int = 0,
+                   seed: int = 0) -> List[bytes]:
+    """
+    Request bodies made of ``synthetic_applicants``.
+
+    Args:
+        requests (int): Number of bodies.
+        batch_size (int): Applicants per ``/score/batch`` body (0 = one per ``/score`` body).
+        model (str, optional): Model file to ask for.
+        distinct (int): Cycle through this many applicants; 0 gives every row its own.
+        seed (int): Seed of the applicants, so warm-up and measured rows differ.
+    """
+    rows_per_request = max(batch_size, 1)
+    n_rows = requests * rows_per_request
+    applicants = json.loads(synthetic_applicants(min(distinct, n_rows) or n_rows, seed=seed).to_json(orient="records"))
+    payloads = []
+    for i in range(requests):
+        rows = [applicants[(i * rows_per_request + j) % len(applicants)] for j in range(rows_per_request)]
+        body = {"applicants": rows} if batch_size else {"applicant": rows[0]}
+        if model:
+            body["model"] = model
+        payloads.append(json.dumps(body).encode("utf-8"))
+    return payloads
+
+
+def run_load(base_url: str, concurrency: int, requests: int, batch_size: int = 0,
+             model: Optional[str] = None, timeout: float = 30.0, distinct: int = 0, seed: int = 0) -> dict:
+    """
+    Sends ``requests`` requests with ``concurrency`` client threads.
+
+    Returns:
+        dict: Request/row throughput, error count, latency percentiles (ms)
+        and the server's result-cache hits and misses during the run (those
+        of the worker answering ``/stats`` when the service is pre-forked).
+    """
+    url = f"{base_url}/score/batch" if batch_size else f"{base_url}/score"
+    payloads = build_payloads(requests, batch_size, model, distinct, seed)
+
+    cache_before = _get_json(f"{base_url}/stats")["result_cache"]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(lambda payload: _post(url, payload, timeout), payloads))
+    elapsed = time.perf_counter() - start
+    cache_after = _get_json(f"{base_url}/stats")["result_cache"]
+
+    latencies = np.array([latency for latency, error in outcomes if error is None])
+    errors = sum(1 for _, error in outcomes if error is not None)
+    report = {
+        "endpoint": url,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+        "rows_per_second": round(requests * max(batch_size, 1) / elapsed, 1),
+        "cache_hits": cache_after["hits"] - cache_before["hits"],
+        "cache_misses": cache_after["misses"] - cache_before["misses"],
+    }
+    if len(latencies):
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        report.update(p50_ms=round(float(p50), 2), p90_ms=round(float(p90), 2),
+                      p99_ms=round(float(p99), 2), max_ms=round(float(latencies.max()), 2))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the scoring service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="Rows per /score/batch request (0 = single-row /score)")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--distinct", type=int, default=0,
+                        help="Cycle through this many applicants (default: a new one per row, all cache misses)")
+    parser.add_argument("--warmup", type=int, default=50, help="Requests sent before measuring")
+    parser.add_argument("--start-server", action="store_true",
+                        help="Start 'uvicorn service:app' locally for the duration of the test")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.start_server:
+        port = args.url.rsplit(":", 1)[-1].rstrip("/")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "service:app", "--port", port, "--log-level", "warning"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    try:
+        wait_for_server(args.url)
+        if args.warmup:
+            run_load(args.url, args.concurrency, args.warmup, args.batch_size, args.model, seed=1)
+        report = run_load(args.url, args.concurrency, args.requests, args.batch_size, args.model,
+                          distinct=args.distinct)
+        server_stats = _get_json(f"{args.url}/stats")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(json.dumps(report, indent=2))
+    print(f"server-side /score: p50={server_stats['p50_ms']} ms  p99={server_stats['p99_ms']} ms  "
+          f"(targets {server_stats['target_p50_ms']} / {server_stats['target_p99_ms']} ms)")
+
+    if not args.batch_size and "p50_ms" in report:
+        if report["p50_ms"] > server_stats["target_p50_ms"] or report["p99_ms"] > server_stats["target_p99_ms"]:
+            print("❌ latency target missed")
+            sys.exit(1)
+        print("✅ latency target met")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Lightweight metrics and tracing for the scoring flow.
+
+Stages of the submit path are timed with ``span("stage")`` into the
+``credit_stage_seconds`` histogram; counters record GPT errors by type, cache
+hits and misses, and model loads. Everything lives in one in-process
+registry that renders the Prometheus text format (``render_prometheus``):
+
+* the HTTP service exposes it at ``GET /metrics``;
+* the Streamlit app writes it to ``CREDIT_METRICS_FILE`` after every
+  submitted report, for the node exporter's textfile collector.
+
+Under ``prefork.py`` every worker has its own registry and any worker may
+answer a scrape. Each worker therefore labels its series with ``pid`` and
+publishes them to a directory shared by the workers
+(``share_worker_metrics``), so ``GET /metrics`` from any worker returns the
+series of all of them; aggregate with ``sum without (pid)``.
+
+With ``CREDIT_OTEL=1`` every span is also sent as an OpenTelemetry span. The
+exporter is set up from the standard ``OTEL_*`` variables when
+``opentelemetry-sdk`` and the OTLP exporter are installed.
+
+``CREDIT_METRICS=0`` turns all of it off: ``span`` returns a shared no-op
+object and the counters return immediately.
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+enabled = os.environ.get("CREDIT_METRICS", "1") != "0"
+
+# ขอบของ bucket (วินาที) ครอบคลุมตั้งแต่ preprocessing ระดับ ms จนถึงการรอ GPT
+default_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not enabled:
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self, extra: str = ""):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key, extra)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = default_buckets):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [จำนวนต่อ bucket (ไม่สะสม) + ช่องสุดท้ายสำหรับ +Inf, ผลรวม, จำนวน]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        if not enabled:
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            return series[2] if series else 0
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self, extra: str = ""):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                labels = _format_labels(self.labels, key, ",".join(filter(None, (extra, 'le="' + le + '"'))))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key, extra)} {total!r}"
+            yield f"{self.name}_count{_format_labels(self.labels, key, extra)} {count}"
+
+
+class MetricsRegistry:
+    """Named collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self.const_labels: Dict[str, str] = {}
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = default_buckets) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def reset(self):
+        """Clears every recorded value (a forked worker starts from zero)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def samples(self) -> Dict[str, List[str]]:
+        """Sample lines of every metric, with ``const_labels`` on each series."""
+        extra = ",".join(f'{name}="{_escape(value)}"' for name, value in sorted(self.const_labels.items()))
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: list(metric.render(extra)) for metric in metrics}
+
+    def render_prometheus(self, others: Iterable[Dict[str, List[str]]] = ()) -> str:
+        """
+        All metrics in the Prometheus text exposition format (version 0.0.4).
+
+        Args:
+            others: ``samples()`` of other processes, rendered under the same
+                ``HELP``/``TYPE`` header as the series of this process.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        samples = [self.samples()] + list(others)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for process in samples:
+                lines.extend(process.get(metric.name, ()))
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "credit_stage_seconds", "Time spent in each stage of the scoring flow.", ("stage",))
+gpt_errors = registry.counter(
+    "credit_gpt_errors_total", "Failed or stalled GPT calls by error type.", ("type",))
+gpt_calls = registry.counter(
+    "credit_gpt_calls_total", "GPT calls sent to the OpenAI API.", ("mode",))
+cache_requests = registry.counter(
+    "credit_cache_requests_total", "Cache lookups by cache and result (hit, miss, deduplicated).",
+    ("cache", "result"))
+model_loads = registry.counter(
+    "credit_model_loads_total", "Model files read from disk by the model registry.", ("model",))
+prediction_errors = registry.counter(
+    "credit_prediction_errors_total", "Reports that failed with an exception, by error type.", ("type",))
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def _get_tracer():
+    """OpenTelemetry tracer when ``CREDIT_OTEL=1`` and the package is installed, else None."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = False
+                if os.environ.get("CREDIT_OTEL", "0") == "1":
+                    try:
+                        from opentelemetry import trace
+                    except ImportError:
+                        logger.warning("CREDIT_OTEL=1 แต่ไม่ได้ติดตั้ง opentelemetry-api ข้ามการส่ง trace")
+                    else:
+                        _configure_otel_exporter(trace)
+                        _tracer = trace.get_tracer("credit-scoring")
+    return _tracer or None
+
+
+def _configure_otel_exporter(trace):
+    # ถ้ายังไม่มี TracerProvider (เช่นไม่ได้รันผ่าน opentelemetry-instrument) ให้ตั้งค่า OTLP exporter เอง
+    if type(trace.get_tracer_provider()).__name__ not in ("ProxyTracerProvider", "NoOpTracerProvider"):
+        return
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning("ไม่พบ opentelemetry-sdk / OTLP exporter; span จะถูกส่งไปยัง provider ที่ตั้งค่าไว้เท่านั้น")
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": "credit-scoring"}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_noop_span = _NoopSpan()
+
+
+class Span:
+    """Times one stage into ``credit_stage_seconds`` (and an OpenTelemetry span when enabled)."""
+    __slots__ = ("stage", "start", "seconds", "_otel")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.seconds: Optional[float] = None
+        self._otel = None
+
+    def __enter__(self):
+        tracer = _get_tracer()
+        if tracer is not None:
+            self._otel = tracer.start_as_current_span(self.stage)
+            self._otel.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        stage_seconds.observe(self.seconds, stage=self.stage)
+        if self._otel is not None:
+            self._otel.__exit__(exc_type, exc, tb)
+        return False
+
+
+def span(stage: str):
+    """
+    Context manager that times ``stage``.
+
+    Returns a shared no-op object when metrics are disabled, so instrumented
+    code pays one function call and a flag check.
+    """
+    if not enabled:
+        return _noop_span
+    return Span(stage)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Records a stage timed by the caller (for code that cannot be wrapped in ``span``)."""
+    stage_seconds.observe(seconds, stage=stage)
+
+
+_shared_dir: Optional[str] = None
+
+
+def share_worker_metrics(directory: str, interval: float = 5.0):
+    """
+    Publishes this worker's metrics to ``directory`` for its sibling workers.
+
+    Called once in every pre-forked worker: clears the values inherited from
+    the parent, labels every series with the worker's ``pid`` and writes
+    ``<pid>.json`` every ``interval`` seconds on a daemon thread.
+    ``render_prometheus`` then includes the files of the other workers, so a
+    scrape answered by any worker covers all of them (at most ``interval``
+    seconds old for the others). The parent removes the file of a worker
+    that exits.
+    """
+    global _shared_dir
+    registry.reset()
+    registry.const_labels["pid"] = str(os.getpid())
+    _shared_dir = directory
+
+    def publish():
+        while True:
+            _write_samples()
+            time.sleep(interval)
+
+    threading.Thread(target=publish, name="metrics-publisher", daemon=True).start()
+
+
+def _write_samples():
+    path = os.path.join(_shared_dir, f"{os.getpid()}.json")
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(registry.samples(), f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _read_other_samples() -> List[Dict[str, List[str]]]:
+    own = f"{os.getpid()}.json"
+    others = []
+    for path in sorted(glob.glob(os.path.join(_shared_dir, "*.json"))):
+        if os.path.basename(path) == own:
+            continue
+        try:
+            with open(path, encoding="utf-8") as f:
+                others.append(json.load(f))
+        except (OSError, ValueError):
+            # worker ที่เพิ่งออกไป ไฟล์ถูกลบระหว่างอ่าน
+            continue
+    return others
+
+
+def render_prometheus() -> str:
+    if _shared_dir is None:
+        return registry.render_prometheus()
+    return registry.render_prometheus(_read_other_samples())
+
+
+def write_prometheus_file(path: Optional[str] = None):
+    """
+    Writes the metrics to ``path`` (default ``CREDIT_METRICS_FILE``) atomically.
+
+    Does nothing when no path is configured or metrics are disabled.
+    """
+    path = path or os.environ.get("CREDIT_METRICS_FILE")
+    if not path or not enabled:
+        return
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
@@ -0,0 +1,115 @@
+"""
+Model descriptors.
+
+Every model file ships with a small JSON file of the same name
+(``C2M2_..._Model.pkl`` -> ``C2M2_..._Model.json``) that states how to score
+it: the input columns, how they are encoded, whether the model needs
+``simulated_credit_score`` and what its classes mean. The scoring code reads
+this once per model instead of inferring it from the file name.
+"""
+import json
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Tuple
+
+# ชนิดของการแปลงข้อมูลก่อนส่งเข้าโมเดล
+encodings = ("codes", "one_hot")
+
+
+@dataclass(frozen=True)
+class ModelDescriptor:
+    """
+    How to score one model.
+
+    Attributes:
+        name (str): Display name.
+        family (str): ``"random_forest"`` or ``"logistic_regression"``.
+        features (tuple): ``data_to_predict`` columns, in training order.
+        requires_credit_score (bool): Whether ``simulated_credit_score`` is an input.
+        encoding (str): ``"codes"`` feeds the categorical codes as they are;
+            ``"one_hot"`` builds ``encoded_features`` with ``FeatureEncoder``.
+        encoded_features (tuple): Model input columns for ``"one_hot"``.
+        categorical_columns (tuple): Raw columns that were One-Hot encoded.
+        classes (tuple): ``model.classes_``.
+        class_labels (dict): Class -> status shown to users.
+    """
+    name: str
+    family: str
+    features: Tuple[str, ...]
+    requires_credit_score: bool
+    encoding: str = "codes"
+    encoded_features: Tuple[str, ...] = ()
+    categorical_columns: Tuple[str, ...] = ()
+    classes: Tuple = (0, 1, 2)
+    class_labels: Dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        if self.encoding not in encodings:
+            raise ValueError(f"Unknown encoding {self.encoding!r} for {self.name}; expected one of {encodings}")
+        if self.encoding == "one_hot" and not self.encoded_features:
+            raise ValueError(f"{self.name}: one_hot encoding needs 'encoded_features'")
+        if self.requires_credit_score != ("simulated_credit_score" in self.features):
+            raise ValueError(f"{self.name}: 'requires_credit_score' does not match 'features'")
+
+    @classmethod
+    def from_dict(cls, config: dict) -> "ModelDescriptor":
+        config = dict(config)
+        for key in ("features", "encoded_features", "categorical_columns", "classes"):
+            if key in config:
+                config[key] = tuple(config[key])
+        classes = config.get("classes", cls.classes)
+        # JSON เก็บ key เป็นข้อความ จึงแปลงกลับเป็นชนิดเดียวกับ class
+        labels = config.get("class_labels", {})
+        config["class_labels"] = {c: labels.get(str(c), str(c)) for c in classes}
+        return cls(**config)
+
+    @classmethod
+    def from_json(cls, path: str) -> "ModelDescriptor":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    @property
+    def model_inputs(self) -> Tuple[str, ...]:
+        """Columns of the matrix the model is called with."""
+        return self.encoded_features if self.encoding == "one_hot" else self.features
+
+    def validate(self, model):
+        """
+        Checks that ``model`` is the model this descriptor describes.
+
+        Raises:
+            ValueError: If the classes or the input width disagree.
+        """
+        classes = tuple(getattr(model, "classes_", ()))
+        if classes != self.classes:
+            raise ValueError(f"{self.name}: model classes {list(classes)} != descriptor {list(self.classes)}")
+        n_inputs = getattr(model, "n_features_in_", len(self.model_inputs))
+        if n_inputs != len(self.model_inputs):
+            raise ValueError(f"{self.name}: model expects {n_inputs} inputs, descriptor lists {len(self.model_inputs)}")
+        names = getattr(model, "feature_names_in_", None)
+        if names is not None and tuple(names) != self.model_inputs:
+            raise ValueError(f"{self.name}: model feature names differ from the descriptor")
+
+
+def descriptor_path(model_file: str) -> str:
+    """``model.pkl`` / ``model.npz`` -> ``model.json``."""
+    return os.path.splitext(model_file)[0] + ".json"
+
+
+@lru_cache(maxsize=None)
+def _cached_descriptor(path: str) -> ModelDescriptor:
+    return ModelDescriptor.from_json(path)
+
+
+def load_descriptor(model_file: str) -> ModelDescriptor:
+    """
+    Returns the descriptor shipped next to ``model_file``.
+
+    Raises:
+        FileNotFoundError: If the model has no descriptor.
+    """
+    path = descriptor_path(model_file)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No model descriptor for {os.path.basename(model_file)} (expected {path})")
+    return _cached_descriptor(path)
@@ -0,0 +1,287 @@
+"""
+Process-wide registry of loaded models.
+
+Streamlit re-executes app.py on every widget interaction, but imported modules
+stay alive for the lifetime of the server process. Keeping the loaded models
+here means each ``.pkl`` is read and unpickled once per process and shared by
+every session, instead of once per rerun.
+"""
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import joblib
+import numpy as np
+
+from forest_engine import FlatForest
+from metrics import cache_requests, model_loads, observe_stage
+
+
+def deserialize_model(path: str, raw: Optional[bytes], mmap: bool = False):
+    """
+    Loads a model: flat forests from ``.npz``, onnxruntime sessions from
+    ``.onnx`` (see ``onnx_engine``), anything else with joblib.
+
+    Args:
+        path (str): Model file.
+        raw (bytes, optional): File contents already read by the caller.
+        mmap (bool): Map ``.npz`` arrays from ``path`` instead of copying
+            ``raw``, so processes loading the same file share its pages.
+    """
+    if path.endswith(".npz") and mmap:
+        return FlatForest.load(path, mmap=True)
+    if raw is None:
+        with open(path, "rb") as f:
+            raw = f.read()
+    if path.endswith(".npz"):
+        with np.load(io.BytesIO(raw), allow_pickle=False) as arrays:
+            return FlatForest.from_arrays(arrays)
+    if path.endswith(".onnx"):
+        from onnx_engine import OnnxModel
+
+        # โมเดลต้นฉบับ (.pkl/.npz) ที่ใช้คำนวณปัจจัยที่มีผล อยู่ในโฟลเดอร์เดียวกับไฟล์ .onnx
+        return OnnxModel(raw, directory=os.path.dirname(os.path.abspath(path)))
+    return joblib.load(io.BytesIO(raw))
+
+
+@dataclass
+class ModelEntry:
+    """A loaded model together with the file state it was loaded from."""
+    path: str
+    model: object
+    mtime: float
+    file_size: int
+    sha256: str
+    load_seconds: float
+    memory_bytes: int
+    loaded_at: float
+    hits: int = 0
+    reloads: int = 0
+
+
+def estimate_memory(obj) -> int:
+    """
+    Estimates the in-memory size of a fitted estimator in bytes.
+
+    Walks the object graph (attributes, containers and the ``__getstate__`` of
+    extension types such as sklearn's ``Tree``) and sums the size of every
+    NumPy buffer plus the shallow size of the Python objects around them.
+    """
+    # ``__getstate__`` returns fresh objects, so keep them alive to stop their
+    # ids being reused by the next one.
+    seen = {}
+    stack = [obj]
+    total = 0
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen[id(current)] = current
+
+        if isinstance(current, np.ndarray):
+            # array ที่ map จากไฟล์อยู่ใน page cache ที่ทุก process ใช้ร่วมกัน ไม่นับรวม
+            if not isinstance(current, np.memmap):
+                total += current.nbytes
+            if current.dtype == object:
+                stack.extend(current.ravel().tolist())
+            continue
+
+        total += sys.getsizeof(current)
+        if isinstance(current, (str, bytes, int, float, bool, type(None))):
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, "__dict__"):
+            stack.append(vars(current))
+        elif hasattr(current, "__getstate__"):
+            try:
+                state = current.__getstate__()
+            except TypeError:
+                continue
+            if state is not None:
+                stack.append(state)
+    return total
+
+
+class ModelRegistry:
+    """
+    Thread-safe LRU cache of models loaded with joblib.
+
+    Each model is loaded once and kept in memory until it is evicted by the
+    size budget or its file changes on disk. A file is considered changed when
+    its mtime or size differs from the loaded copy *and* its SHA-256 digest is
+    different, so touching a file without changing its content does not force
+    an unpickle.
+
+    Args:
+        max_bytes (int): Memory budget for all cached models. The least
+            recently used models are evicted once the estimated total goes
+            above it. The most recently requested model is always kept.
+        max_models (int): Upper bound on the number of cached models.
+        mmap (bool): Memory-map ``.npz`` flat forests instead of reading
+            them into private memory (see ``forest_engine``).
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, max_models: int = 8, mmap: bool = True):
+        self.max_bytes = max_bytes
+        self.max_models = max_models
+        self.mmap = mmap
+        self._entries: "OrderedDict[str, ModelEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self.evictions = 0
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.abspath(path)
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, path: str):
+        """Returns the model stored at ``path``, loading it if necessary."""
+        return self.get_entry(path).model
+
+    def get_entry(self, path: str) -> ModelEntry:
+        """
+        Returns the cache entry for ``path``, loading or reloading the model if
+        it is not cached or its file has changed.
+
+        Raises:
+            FileNotFoundError: If the model file does not exist.
+        """
+        key = self._key(path)
+        stat = os.stat(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.mtime == stat.st_mtime and entry.file_size == stat.st_size:
+                entry.hits += 1
+                self._entries.move_to_end(key)
+                cache_requests.inc(cache="model", result="hit")
+                return entry
+        cache_requests.inc(cache="model", result="miss")
+
+        # Only one thread loads a given file; the others wait and reuse it.
+        with self._key_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and entry.mtime == stat.st_mtime and entry.file_size == stat.st_size:
+                with self._lock:
+                    entry.hits += 1
+                    self._entries.move_to_end(key)
+                return entry
+            new_entry = self._load(key, stat, previous=entry)
+
+        with self._lock:
+            self._entries[key] = new_entry
+            self._entries.move_to_end(key)
+            self._evict()
+        return new_entry
+
+    def _load(self, key: str, stat: os.stat_result, previous: Optional[ModelEntry]) -> ModelEntry:
+        start = time.perf_counter()
+        mapped = self.mmap and key.endswith(".npz")
+        with open(key, "rb") as f:
+            if mapped:
+                # ไม่อ่านทั้งไฟล์เข้าหน่วยความจำ แค่คำนวณ digest
+                raw = None
+                digest = hashlib.sha256()
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+                sha256 = digest.hexdigest()
+            else:
+                raw = f.read()
+                sha256 = hashlib.sha256(raw).hexdigest()
+
+        # ไฟล์ถูกแตะแต่เนื้อหาไม่เปลี่ยน: ใช้โมเดลเดิมต่อ ไม่ต้องโหลดใหม่
+        if previous is not None and previous.sha256 == sha256:
+            previous.mtime = stat.st_mtime
+            previous.file_size = stat.st_size
+            previous.hits += 1
+            return previous
+
+        model = deserialize_model(key, raw, mmap=mapped)
+        load_seconds = time.perf_counter() - start
+        model_loads.inc(model=os.path.basename(key))
+        observe_stage("model_load", load_seconds)
+
+        return ModelEntry(
+            path=key,
+            model=model,
+            mtime=stat.st_mtime,
+            file_size=stat.st_size,
+            sha256=sha256,
+            load_seconds=load_seconds,
+            memory_bytes=estimate_memory(model),
+            loaded_at=time.time(),
+            reloads=0 if previous is None else previous.reloads + 1,
+        )
+
+    def _evict(self):
+        """Drops least recently used entries until the budget is met. Caller holds the lock."""
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_models or self.total_bytes() > self.max_bytes
+        ):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def total_bytes(self) -> int:
+        return sum(entry.memory_bytes for entry in self._entries.values())
+
+    def invalidate(self, path: Optional[str] = None):
+        """Removes one model, or every model when ``path`` is None, from the cache."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._key(path), None)
+
+    def stats(self) -> List[dict]:
+        """Returns load time, memory use and hit counts for every cached model."""
+        with self._lock:
+            return [
+                {
+                    "model": os.path.basename(entry.path),
+                    "load_ms": round(entry.load_seconds * 1000, 2),
+                    "memory_mb": round(entry.memory_bytes / (1024 * 1024), 3),
+                    "file_mb": round(entry.file_size / (1024 * 1024), 3),
+                    "hits": entry.hits,
+                    "reloads": entry.reloads,
+                    "sha256": entry.sha256[:12],
+                }
+                for entry in self._entries.values()
+            ]
+
+
+_default_registry: Optional[ModelRegistry] = None
+_default_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """
+    Returns the process-wide registry.
+
+    The memory budget is read once from the ``MODEL_CACHE_MAX_MB`` environment
+    variable (default 512) and the entry limit from ``MODEL_CACHE_MAX_MODELS``
+    (default 8). ``MODEL_MMAP=0`` turns off memory-mapping of ``.npz`` models.
+    """
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = ModelRegistry(
+                max_bytes=int(float(os.environ.get("MODEL_CACHE_MAX_MB", "512")) * 1024 * 1024),
+                max_models=int(os.environ.get("MODEL_CACHE_MAX_MODELS", "8")),
+                mmap=os.environ.get("MODEL_MMAP", "1") != "0",
+            )
+        return _default_registry
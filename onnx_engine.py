@@ -0,0 +1,260 @@
+"""
+ONNX export of the shipped models and an onnxruntime inference backend.
+
+``export_onnx`` converts a pickled model with ``skl2onnx`` in double
+precision and saves it next to the ``.pkl`` as ``<model>.onnx``. For the
+``"one_hot"`` Logistic Regression models the One-Hot encoding that
+``FeatureEncoder`` / ``preprocess_data`` do is added to the front of the
+graph, so every exported model takes the same input: the ``data_to_predict``
+columns in descriptor order, categoricals as integer codes.
+
+``OnnxModel`` wraps an ``onnxruntime`` CPU session with the parts of the
+sklearn interface the scoring code uses (``classes_``, ``predict``,
+``predict_proba``, ``predict_with_proba``). ``ModelRegistry`` loads ``.onnx``
+files like a ``.pkl``; ``INFERENCE_BACKEND=onnx`` makes the app, the batch
+job and the service score through them (see ``scoring.backend_model_file``).
+Loading and scoring an ``.onnx`` model never imports scikit-learn. Feature
+attribution still needs the original model, which is loaded on first use
+(the flat ``.npz`` forest when one was exported, else the ``.pkl``).
+
+Export every model in ``model_options`` and check it against sklearn with:
+    python onnx_engine.py
+
+Needs ``onnxruntime`` to score and ``skl2onnx`` / ``onnx`` to export:
+    pip install -r requirements-onnx.txt
+
+Configuration (environment variables):
+    ONNX_THREADS    Intra-op threads per session (default: 1). Requests are
+                    already spread over threads and processes, and a session
+                    without its own thread pool is safe to share with forked
+                    workers (``prefork.py``).
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Optional
+
+import numpy as np
+
+# ชื่อ input ของทุกโมเดลที่ export: คอลัมน์ data_to_predict ตามลำดับใน descriptor
+input_name = "features"
+
+# opset ที่ export; ai.onnx.ml 3 รองรับ TreeEnsemble แบบ double
+target_opset = {"": 17, "ai.onnx.ml": 3}
+
+
+class OnnxModel:
+    """
+    An exported model scored with onnxruntime on CPU.
+
+    Args:
+        model (bytes | str): Serialized ONNX model or path to it.
+        threads (int, optional): Intra-op threads (default ``ONNX_THREADS``).
+        directory (str, optional): Where the source model lives; defaults to
+            the directory of ``model`` (or the working directory for bytes).
+
+    Attributes:
+        classes_ (np.ndarray): Class labels, the column order of the probabilities.
+        n_features_in_ (int): Input width of the original model (encoded
+            columns for ``"one_hot"`` models), for ``ModelDescriptor.validate``.
+        encodes_inputs (bool): The graph does the One-Hot encoding itself, so
+            it takes the raw ``data_to_predict`` columns.
+        source (str): File name of the model this was exported from.
+    """
+
+    def __init__(self, model, threads: Optional[int] = None, directory: Optional[str] = None):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("INFERENCE_BACKEND=onnx needs onnxruntime: pip install -r requirements-onnx.txt") from e
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = int(os.environ.get("ONNX_THREADS", "1")) if threads is None else threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(model, options, providers=["CPUExecutionProvider"])
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.classes_ = np.asarray(json.loads(metadata["classes"]))
+        self.n_features_in_ = int(metadata["n_features_in"])
+        self.encodes_inputs = metadata.get("encoding") == "one_hot"
+        self.source = metadata.get("source")
+        if directory is None:
+            directory = os.path.dirname(os.path.abspath(model)) if isinstance(model, str) else os.getcwd()
+        self.directory = directory
+        self._attribution_model = None
+
+    def predict_with_proba(self, X):
+        """Classes and probabilities from one session run."""
+        label, proba = self.session.run(None, {input_name: np.ascontiguousarray(X, dtype=np.float64)})
+        return label, proba
+
+    def predict(self, X) -> np.ndarray:
+        return self.predict_with_proba(X)[0]
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self.predict_with_proba(X)[1]
+
+    @property
+    def attribution_model(self):
+        """
+        The original model, for feature attribution.
+
+        Loaded through the model registry on first use: the flat ``.npz``
+        forest when one sits next to the source model, else the ``.pkl``.
+        """
+        if self._attribution_model is None:
+            from model_registry import get_registry
+
+            source = os.path.join(self.directory, self.source)
+            flat = os.path.splitext(source)[0] + ".npz"
+            self._attribution_model = get_registry().get(flat if os.path.exists(flat) else source)
+        return self._attribution_model
+
+
+def _encoding_nodes(descriptor, output: str):
+    """
+    Nodes that turn the raw ``descriptor.features`` codes into the encoded matrix.
+
+    Every encoded column gathers its raw column. Numeric features are kept
+    as they are; a dummy column is ``raw == value`` when its value is a
+    number and 0 otherwise (codes never equal a text value), exactly as
+    ``FeatureEncoder.transform`` treats numeric input.
+    """
+    from onnx import TensorProto, helper, numpy_helper
+
+    from encoder import get_encoder
+
+    encoder = get_encoder(descriptor.encoded_features, descriptor.categorical_columns)
+    n = encoder.n_features
+    source = np.zeros(n, dtype=np.int64)
+    keep = np.zeros(n)
+    match = np.full(n, np.nan)
+    is_dummy = np.zeros(n)
+    features = list(descriptor.features)
+    for name, idx in encoder.numeric:
+        source[idx] = features.index(name)
+        keep[idx] = 1
+    for col, values in encoder.dummies.items():
+        for _, number, idx in values:
+            source[idx] = features.index(col)
+            if number is not None:
+                match[idx] = number
+                is_dummy[idx] = 1
+
+    constants = {"enc_source": source, "enc_keep": keep, "enc_match": match, "enc_is_dummy": is_dummy}
+    initializers = [numpy_helper.from_array(value, name) for name, value in constants.items()]
+    nodes = [
+        helper.make_node("Gather", [input_name, "enc_source"], ["enc_raw"], axis=1),
+        helper.make_node("Mul", ["enc_raw", "enc_keep"], ["enc_numeric"]),
+        helper.make_node("Equal", ["enc_raw", "enc_match"], ["enc_equal"]),
+        helper.make_node("Cast", ["enc_equal"], ["enc_equal_double"], to=TensorProto.DOUBLE),
+        helper.make_node("Mul", ["enc_equal_double", "enc_is_dummy"], ["enc_dummies"]),
+        helper.make_node("Add", ["enc_numeric", "enc_dummies"], [output]),
+    ]
+    return nodes, initializers
+
+
+def convert_model(model, descriptor, source: str = ""):
+    """
+    Converts a fitted model to an ONNX ``ModelProto`` that takes raw codes.
+
+    Args:
+        model: Fitted ``RandomForestClassifier`` or ``LogisticRegression``.
+        descriptor (ModelDescriptor): The model's descriptor.
+        source (str): Model file name stored in the metadata.
+    """
+    try:
+        from onnx import TensorProto, helper
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import DoubleTensorType
+    except ImportError as e:
+        raise ImportError("ONNX export needs skl2onnx and onnx: pip install -r requirements-onnx.txt") from e
+
+    n_inputs = len(descriptor.model_inputs)
+    onx = convert_sklearn(model, initial_types=[("model_input", DoubleTensorType([None, n_inputs]))],
+                          options={id(model): {"zipmap": False}}, target_opset=target_opset)
+    graph = onx.graph
+    if descriptor.encoding == "one_hot":
+        nodes, initializers = _encoding_nodes(descriptor, "model_input")
+        for i, node in enumerate(nodes):
+            graph.node.insert(i, node)
+        graph.initializer.extend(initializers)
+    else:
+        # โมเดล "codes" รับคอลัมน์ดิบตรง ๆ จึงเปลี่ยนชื่อ input อย่างเดียว
+        graph.node.insert(0, helper.make_node("Identity", [input_name], ["model_input"]))
+    del graph.input[:]
+    graph.input.append(helper.make_tensor_value_info(input_name, TensorProto.DOUBLE,
+                                                     [None, len(descriptor.features)]))
+
+    metadata = {
+        "classes": json.dumps(np.asarray(model.classes_).tolist()),
+        "n_features_in": str(n_inputs),
+        "encoding": descriptor.encoding,
+        "features": json.dumps(list(descriptor.features)),
+        "source": source,
+    }
+    for key, value in metadata.items():
+        entry = onx.metadata_props.add()
+        entry.key, entry.value = key, value
+    return onx
+
+
+def export_onnx(model_file: str, output_path: Optional[str] = None) -> str:
+    """
+    Converts the pickled model in ``model_file`` and saves it as ``.onnx``.
+
+    Returns:
+        str: Path of the written file (``<model>.onnx`` by default).
+    """
+    import joblib
+
+    from model_descriptor import load_descriptor
+
+    output_path = output_path or os.path.splitext(model_file)[0] + ".onnx"
+    onx = convert_model(joblib.load(model_file), load_descriptor(model_file), os.path.basename(model_file))
+    with open(output_path, "wb") as f:
+        f.write(onx.SerializeToString())
+    return output_path
+
+
+def max_difference(model_file: str, onnx_file: str, rows: int = 10_000) -> dict:
+    """
+    Compares ``onnx_file`` with the sklearn model on synthetic applicants.
+
+    Returns:
+        dict: Largest absolute probability difference and share of equal classes.
+    """
+    import joblib
+
+    from scoring import predict_with_proba, prepare_features, raw_features, synthetic_applicants
+
+    df = synthetic_applicants(rows, labels=False)[raw_features(model_file)]
+    expected_class, expected_proba = predict_with_proba(joblib.load(model_file), prepare_features(df, model_file))
+    label, proba = OnnxModel(onnx_file).predict_with_proba(df.to_numpy(dtype=np.float64))
+    return {"max_abs_diff": float(np.abs(proba - expected_proba).max()),
+            "class_agreement": float((label == expected_class).mean())}
+
+
+def main(argv=None):
+    from scoring import model_options
+
+    parser = argparse.ArgumentParser(description="Export pickled models to ONNX and check them against sklearn.")
+    parser.add_argument("models", nargs="*", help="Pickled models (default: every file in model_options)")
+    parser.add_argument("--tolerance", type=float, default=1e-6,
+                        help="Largest allowed probability difference from sklearn (default 1e-6)")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for model_file in args.models or [f for f in model_options if os.path.exists(f)]:
+        output_path = export_onnx(model_file)
+        check = max_difference(model_file, output_path)
+        ok = check["max_abs_diff"] <= args.tolerance and check["class_agreement"] == 1.0
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {model_file} -> {output_path} ({os.path.getsize(output_path) / 1024:.0f} KB): "
+              f"max |Δp| {check['max_abs_diff']:.2e}, classes equal {check['class_agreement']:.2%}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Pre-fork multi-process server for the scoring service.
+
+``uvicorn service:app`` runs in one process, so scoring uses one core however
+many threads it has. This runner loads and warms every model in
+``model_options`` once in a parent process (model, pipeline, attributor and
+rule set), opens the listening socket, and then forks the workers. Each
+worker runs ``service.app`` on the shared socket:
+
+* the kernel hands every new connection to whichever worker accepts it first,
+  which spreads the load across workers;
+* the workers inherit the loaded models copy-on-write, so N workers do not
+  hold N private copies of the trees, and none of them reads a model file
+  (with ``INFERENCE_BACKEND=flat`` the forests are mapped from their ``.npz``
+  files, so their pages are also shared with replicas on the same host that
+  were not forked from this parent);
+* a worker that dies is replaced by forking the parent again, which still
+  holds the warm models, so a restart does not touch the disk either;
+* every worker labels its metrics with its ``pid`` and shares them through a
+  temporary directory, so ``GET /metrics`` answered by any worker returns
+  the series of all of them (see ``metrics.share_worker_metrics``).
+
+Linux/macOS only (``os.fork``).
+
+Usage:
+    python prefork.py --workers 4 --port 8000
+
+Configuration (environment variables):
+    SERVICE_PROCESSES   Default for --workers (default: CPU count)
+"""
+import argparse
+import gc
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+# หาก worker ตายเร็วกว่านี้หลังเริ่ม ให้รอก่อน fork ใหม่ ป้องกันการ restart วนไม่หยุด
+_min_worker_seconds = 1.0
+_restart_delay_seconds = 1.0
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Opens the listening socket shared by all workers."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class PreforkServer:
+    """
+    Parent process that keeps ``workers`` copies of ``service.app`` running.
+
+    Args:
+        workers (int): Number of worker processes.
+        host (str): Address to listen on.
+        port (int): Port to listen on.
+        log_level (str): uvicorn log level of the workers.
+    """
+
+    def __init__(self, workers: int, host: str = "127.0.0.1", port: int = 8000, log_level: str = "warning"):
+        if not hasattr(os, "fork"):
+            raise RuntimeError("prefork.py needs os.fork; run 'uvicorn service:app' on this platform")
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.log_level = log_level
+        self.restarts = 0
+        self._children: Dict[int, float] = {}
+        self._socket: Optional[socket.socket] = None
+        self._metrics_dir: Optional[str] = None
+        self._stopping = False
+
+    def preload(self):
+        """Loads and warms every model in this (parent) process."""
+        import service
+
+        start = time.perf_counter()
+        service.warm_up_models()
+        # ย้าย object ที่มีอยู่ออกจากการตรวจของ GC เพื่อไม่ให้ worker เขียนทับหน้าหน่วยความจำที่แชร์อยู่
+        gc.collect()
+        gc.freeze()
+        print(f"✅ โหลดโมเดล {service.available_models()} ใน {time.perf_counter() - start:.2f}s (pid {os.getpid()})",
+              flush=True)
+
+    def _run_worker(self):
+        import uvicorn
+
+        import service
+        from metrics import share_worker_metrics
+
+        share_worker_metrics(self._metrics_dir)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        config = uvicorn.Config(service.app, log_level=self.log_level, lifespan="on")
+        uvicorn.Server(config).run(sockets=[self._socket])
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker()
+            except BaseException:
+                import traceback
+
+                traceback.print_exc()
+                code = 1
+            finally:
+                # ไม่ให้ worker กลับไปรันโค้ดของ process แม่ต่อ
+                os._exit(code)
+        self._children[pid] = time.monotonic()
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def serve(self):
+        """Preloads the models, forks the workers and supervises them until SIGTERM/SIGINT."""
+        self.preload()
+        self._socket = bind_socket(self.host, self.port)
+        self._metrics_dir = tempfile.mkdtemp(prefix="credit-metrics-")
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for _ in range(self.workers):
+            self._spawn()
+        print(f"🚀 {self.workers} workers listening on http://{self.host}:{self.port}", flush=True)
+
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            started = self._children.pop(pid, None)
+            if started is None:
+                continue
+            # worker ใหม่ใช้ pid อื่น ค่าของ worker ที่ออกไปแล้วไม่ถูกรายงานต่อ
+            try:
+                os.remove(os.path.join(self._metrics_dir, f"{pid}.json"))
+            except FileNotFoundError:
+                pass
+            if self._stopping:
+                continue
+            print(f"⚠️ worker {pid} exited ({os.waitstatus_to_exitcode(status)}), restarting", flush=True)
+            if time.monotonic() - started < _min_worker_seconds:
+                time.sleep(_restart_delay_seconds)
+            if not self._stopping:
+                self.restarts += 1
+                self._spawn()
+        self._socket.close()
+        shutil.rmtree(self._metrics_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve service.app from pre-forked worker processes.")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SERVICE_PROCESSES", os.cpu_count() or 1)))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO),
+                        format="%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s")
+    try:
+        PreforkServer(args.workers, args.host, args.port, args.log_level).serve()
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Per-applicant report documents for batch runs, without Streamlit.
+
+Builds the app's report (the three result cards, the credit grade table
+with the applicant's grade highlighted, the reasons and the strongest model
+factors) as a standalone HTML file for every scored row, e.g. the output of
+``batch_score.py --explain rules --top-factors 5``.
+
+Everything that does not depend on the applicant is prepared once at import:
+the page template with its stylesheet and one grade table per grade. Each
+document is a single ``str.format_map`` of escaped values into that template.
+
+``ReportWriter`` fans the rows out to a process pool in batches, each worker
+returning finished documents, and streams them into a directory or a
+``.zip`` archive as they arrive, so memory stays bounded by one input chunk.
+It reports documents per second of rendering and writing.
+
+Usage:
+    python report_renderer.py scored.csv reports.zip
+    python report_renderer.py scored.parquet reports/ --workers 4 --id-column applicant_id
+    python batch_score.py applicants.csv scored.csv --explain rules --reports reports.zip
+
+``--format pdf`` converts every document with WeasyPrint, which is not a
+dependency of the app and must be installed separately.
+
+Configuration (environment variables):
+    REPORT_WORKERS  Worker processes (default: CPU count; 1 renders in the
+                    calling process).
+"""
+import argparse
+import html
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from scoring import credit_grade_bands, get_credit_grade, raw_features_credit_score, status_map
+
+report_formats = ("html", "pdf")
+
+# สีของผลการประเมิน เหมือนการ์ดในแอป
+status_colors = {0: "red", 1: "green", 2: "orange"}
+
+# แถวต่อหนึ่งงานของ worker: ใหญ่พอให้ค่าส่งข้อมูลระหว่าง process คุ้ม
+default_rows_per_task = 250
+
+_css = """
+body { font-family: sans-serif; margin: 24px; color: #333; }
+.report-container { border: 2px solid #1E90FF; border-radius: 10px; padding: 20px; background-color: #F0F8FF; }
+.report-header { color: #1E90FF; text-align: center; margin-bottom: 20px; }
+.meta { text-align: center; color: #777; font-size: 0.9em; }
+.cards { display: flex; gap: 16px; margin-bottom: 20px; }
+.card { flex: 1; text-align: center; border: 1px solid #ddd; padding: 15px; border-radius: 10px; background: white; }
+.card p { font-size: 1.2em; color: #555; margin-bottom: 5px; }
+.card h3 { font-size: 2em; margin-top: 0; }
+.columns { display: flex; gap: 24px; }
+.columns > div { flex: 1; }
+table { border-collapse: collapse; width: 100%; background: white; }
+th, td { border: 1px solid #ddd; padding: 4px 8px; text-align: left; }
+tr.highlight td { background-color: #1E90FF; color: white; }
+.note { font-size: 0.9em; }
+"""
+
+_page = """<!DOCTYPE html>
+<html lang="th">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>{css}</style>
+</head>
+<body>
+<div class="report-container">
+<h2 class="report-header">รายงานผลการประเมินความน่าเชื่อถือการขอสินเชื่อส่วนบุคคล</h2>
+<p class="meta">{meta}</p>
+<div class="cards">
+<div class="card"><p>คะแนนเครดิต (เกรด: {grade})</p><h3>{score}</h3></div>
+<div class="card"><p>ผลการประเมินโดย AI</p><h3 style="color: {status_color};">{status}</h3></div>
+<div class="card"><p>ความเชื่อมั่นผลทำนาย</p><h3>{confidence}</h3></div>
+</div>
+<div class="columns">
+<div><h4>ตารางคะแนนเครดิต</h4>{grade_table}</div>
+<div><h4>เหตุผลประกอบคะแนนเครดิต</h4>{reasons}{factors}</div>
+</div>
+<h4>ข้อมูลผู้สมัคร</h4>
+<table>{inputs}</table>
+<hr>
+<p class="note"><b>หมายเหตุ:</b> รายงานนี้เป็นผลการประเมินเบื้องต้นโดยใช้ข้อมูลที่ท่านกรอกและโมเดลปัญญาประดิษฐ์เท่านั้น</p>
+</div>
+</body>
+</html>
+"""
+
+
+def _grade_table(highlight: str) -> str:
+    highlighted = ' class="highlight"'
+    rows = "".join(
+        f'<tr{highlighted if grade == highlight else ""}><td>{grade}</td><td>{low}-{high}</td></tr>'
+        for low, high, grade in sorted(credit_grade_bands, reverse=True)
+    )
+    return f"<table><tr><th>เกรด</th><th>ช่วงคะแนน</th></tr>{rows}</table>"
+
+
+# ตารางเกรดสร้างไว้ล่วงหน้าทุกแบบ (ไฮไลต์เกรดละหนึ่งแบบ และไม่มีไฮไลต์สำหรับ N/A)
+_grade_tables = {grade: _grade_table(grade) for _, _, grade in credit_grade_bands}
+_grade_tables["N/A"] = _grade_table("N/A")
+
+_no_reasons = "<p>ไม่มีเหตุผลจากเกณฑ์คะแนน (ให้คะแนนด้วย <code>--explain rules</code>)</p>"
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and value != value) or value == ""
+
+
+def _items(text: str, separator: str) -> str:
+    return "<ul>" + "".join(f"<li>{html.escape(item.strip())}</li>" for item in text.split(separator)
+                            if item.strip()) + "</ul>"
+
+
+def render_report(record: Dict, model_name: str = "", report_id: str = "",
+                  columns: Sequence[str] = raw_features_credit_score) -> str:
+    """
+    The HTML report of one scored row.
+
+    Args:
+        record (dict): One row of ``ScoringPipeline.score_frame`` output with
+            the applicant's columns; ``reasons`` and ``top_factors`` are used
+            when present.
+        model_name (str): Model shown in the header.
+        report_id (str): Applicant or document id shown in the header.
+        columns (Sequence[str]): Applicant columns listed in the report, in
+            order; missing ones are skipped.
+    """
+    score = record.get("simulated_credit_score")
+    if _is_missing(score):
+        score, grade = "N/A", "N/A"
+    else:
+        grade, _ = get_credit_grade(score)
+    prediction = record.get("prediction")
+    status = record.get("status") or status_map.get(prediction, "N/A")
+    confidence = record.get("confidence")
+
+    reasons = record.get("reasons")
+    factors = record.get("top_factors")
+    fields = {
+        "title": html.escape(f"Credit report {report_id}".strip()),
+        "css": _css,
+        "meta": html.escape(" · ".join(part for part in (report_id, model_name) if part)),
+        "grade": html.escape(grade),
+        "score": html.escape(_format_value(score)),
+        "status_color": status_colors.get(prediction, "black"),
+        "status": html.escape(str(status)),
+        "confidence": "N/A" if _is_missing(confidence) else f"{confidence:.2%}",
+        "grade_table": _grade_tables.get(grade, _grade_tables["N/A"]),
+        "reasons": _no_reasons if _is_missing(reasons) else _items(reasons, " | "),
+        "factors": "" if _is_missing(factors) else "<h4>ปัจจัยที่มีผลต่อผลการประเมินของโมเดล</h4>" + _items(factors, ","),
+        "inputs": "".join(f"<tr><th>{html.escape(col)}</th><td>{html.escape(_format_value(record[col]))}</td></tr>"
+                          for col in columns if col in record),
+    }
+    return _page.format_map(fields)
+
+
+def html_to_pdf(document: str) -> bytes:
+    """Converts one HTML report to PDF with WeasyPrint (optional dependency)."""
+    try:
+        from weasyprint import HTML
+    except ImportError as e:
+        raise ImportError("--format pdf needs WeasyPrint: pip install weasyprint") from e
+    return HTML(string=document).write_pdf()
+
+
+def _render_batch(task) -> List[Tuple[str, bytes]]:
+    """Worker entry point: renders one batch of records to ``(file name, content)``."""
+    records, names, fmt, model_name = task
+    documents = []
+    for record, name in zip(records, names):
+        document = render_report(record, model_name, name)
+        data = html_to_pdf(document) if fmt == "pdf" else document.encode("utf-8")
+        documents.append((f"{name}.{fmt}", data))
+    return documents
+
+
+def _safe_name(value) -> str:
+    return re.sub(r"[^\w.-]+", "_", str(value)).strip("._") or "report"
+
+
+class ReportWriter:
+    """
+    Renders report documents on a process pool and writes them as they arrive.
+
+    Args:
+        path (str): Output directory, or a ``.zip`` archive to create.
+        fmt (str): ``"html"`` or ``"pdf"``.
+        workers (int, optional): Worker processes (default ``REPORT_WORKERS``
+            or the CPU count); 1 renders in this process.
+        rows_per_task (int): Rows sent to a worker at a time.
+        model_name (str): Model shown in every report.
+        id_column (str, optional): Column naming each document; documents
+            are numbered in input order otherwise.
+    """
+
+    def __init__(self, path: str, fmt: str = "html", workers: Optional[int] = None,
+                 rows_per_task: int = default_rows_per_task, model_name: str = "", id_column: Optional[str] = None):
+        if fmt not in report_formats:
+            raise ValueError(f"Unknown report format {fmt!r}; expected one of {report_formats}")
+        if workers is None:
+            workers = int(os.environ.get("REPORT_WORKERS", os.cpu_count() or 1))
+        self.path = path
+        self.fmt = fmt
+        self.rows_per_task = rows_per_task
+        self.model_name = model_name
+        self.id_column = id_column
+        self.documents = 0
+        self.bytes = 0
+        self._executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        if path.lower().endswith(".zip"):
+            self._archive = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        else:
+            self._archive = None
+            os.makedirs(path, exist_ok=True)
+        # เวลาที่ใช้สร้างและเขียนเอกสารเท่านั้น ไม่รวมเวลาอ่านหรือให้คะแนนของผู้เรียก
+        self.seconds = 0.0
+
+    def _names(self, scored: pd.DataFrame) -> List[str]:
+        if self.id_column:
+            return [_safe_name(value) for value in scored[self.id_column]]
+        return [f"report_{i:07d}" for i in range(self.documents + 1, self.documents + len(scored) + 1)]
+
+    def write(self, scored: pd.DataFrame):
+        """Renders one chunk of scored rows and writes every document before returning."""
+        start = time.perf_counter()
+        records = scored.to_dict("records")
+        names = self._names(scored)
+        tasks = [(records[i:i + self.rows_per_task], names[i:i + self.rows_per_task], self.fmt, self.model_name)
+                 for i in range(0, len(records), self.rows_per_task)]
+        batches = self._executor.map(_render_batch, tasks) if self._executor else map(_render_batch, tasks)
+        for batch in batches:
+            for name, data in batch:
+                if self._archive is not None:
+                    self._archive.writestr(name, data)
+                else:
+                    with open(os.path.join(self.path, name), "wb") as f:
+                        f.write(data)
+                self.documents += 1
+                self.bytes += len(data)
+        self.seconds += time.perf_counter() - start
+
+    def stats(self) -> Dict[str, float]:
+        """
+        ``documents``, ``seconds``, ``documents_per_second`` and ``megabytes``
+        written so far; ``seconds`` counts only the time spent in ``write``.
+        """
+        return {
+            "documents": self.documents,
+            "seconds": round(self.seconds, 3),
+            "documents_per_second": round(self.documents / self.seconds, 1) if self.seconds > 0 else float("inf"),
+            "megabytes": round(self.bytes / (1024 * 1024), 2),
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+        if self._archive is not None:
+            self._archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def render_file(input_path: str, output_path: str, fmt: str = "html", workers: Optional[int] = None,
+                rows_per_task: int = default_rows_per_task, model_name: str = "", id_column: Optional[str] = None,
+                chunk_size: int = 50_000, verbose: bool = False) -> Dict[str, float]:
+    """
+    Writes a report for every row of a scored CSV or Parquet file.
+
+    Returns:
+        dict: ``ReportWriter.stats`` for the whole file.
+    """
+    from batch_score import read_chunks
+
+    with ReportWriter(output_path, fmt, workers, rows_per_task, model_name, id_column) as writer:
+        for chunk in read_chunks(input_path, chunk_size):
+            writer.write(chunk)
+            if verbose:
+                print(f"  {writer.documents:,} documents ({writer.stats()['documents_per_second']:,.0f}/s)",
+                      file=sys.stderr)
+    return writer.stats()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a report document for every scored applicant.")
+    parser.add_argument("input", help="Scored CSV or Parquet file (batch_score.py output)")
+    parser.add_argument("output", help="Output directory, or a .zip archive")
+    parser.add_argument("--format", choices=report_formats, default="html")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: REPORT_WORKERS or CPUs)")
+    parser.add_argument("--rows-per-task", type=int, default=default_rows_per_task)
+    parser.add_argument("--id-column", default=None, help="Column with a unique id that names each document")
+    parser.add_argument("--model-name", default="", help="Model shown in every report")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print progress per chunk")
+    args = parser.parse_args(argv)
+
+    stats = render_file(args.input, args.output, args.format, args.workers, args.rows_per_task, args.model_name,
+                        args.id_column, verbose=args.verbose)
+    print(f"Wrote {stats['documents']:,} reports ({stats['megabytes']:.1f} MB) in {stats['seconds']:.2f}s "
+          f"({stats['documents_per_second']:,.0f} documents/s) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Cross-session cache of scored applicants.
+
+Re-submitted forms, demos and re-opened sessions score the same applicant
+again and again. Results are cached under a key made of the model name, the
+SHA-256 of the model file and the canonicalized ``data_to_predict`` row, so
+any session (and, with the SQLite tier, any process or restart) reuses the
+prediction, probabilities, attributions and, once it is known, the GPT
+explanation. Replacing a model file changes its digest and therefore every
+key: results of the old model are never served and age out through LRU/TTL.
+"""
+import hashlib
+import json
+import numbers
+import os
+import threading
+from typing import Any, Optional
+
+from cache import SQLiteStore, TTLCache
+from metrics import cache_requests
+
+
+def _canonical_value(value: Any) -> Any:
+    # 25000, 25000.0 และ np.float64(25000) ต้องได้ key เดียวกัน
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, numbers.Number):
+        return float(value)
+    if hasattr(value, "item"):
+        return _canonical_value(value.item())
+    return value
+
+
+def canonical_row(data_to_predict: dict) -> str:
+    """``data_to_predict`` as JSON with sorted keys and numbers normalized to float."""
+    row = {name: _canonical_value(value) for name, value in data_to_predict.items()}
+    return json.dumps(row, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class ResultCache:
+    """
+    LRU + TTL cache of scoring results with an optional SQLite tier.
+
+    Args:
+        max_entries (int): Results kept in memory.
+        ttl_seconds (float, optional): How long a result stays valid.
+        cache_path (str, optional): SQLite file shared by processes on one
+            host and kept across restarts. Memory only when None.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: Optional[float] = 24 * 3600,
+                 cache_path: Optional[str] = None):
+        store = SQLiteStore(cache_path, table="results") if cache_path else None
+        self.cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds, store=store)
+
+    @staticmethod
+    def key(model_name: str, model_sha256: str, data_to_predict: dict) -> str:
+        payload = f"{model_name}|{model_sha256}|{canonical_row(data_to_predict)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        result = self.cache.get(key)
+        cache_requests.inc(cache="result", result="miss" if result is None else "hit")
+        return result
+
+    def set(self, key: str, result: dict):
+        """Stores ``result``; it must be JSON-serializable for the SQLite tier."""
+        self.cache.set(key, result)
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+_default_cache: Optional[ResultCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """
+    Returns the process-wide result cache.
+
+    Configured once from ``RESULT_CACHE_SIZE`` (default 4096),
+    ``RESULT_CACHE_TTL`` in seconds (default 86400) and ``RESULT_CACHE_PATH``
+    (SQLite file, unset = memory only).
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache(
+                max_entries=int(os.environ.get("RESULT_CACHE_SIZE", "4096")),
+                ttl_seconds=float(os.environ.get("RESULT_CACHE_TTL", str(24 * 3600))),
+                cache_path=os.environ.get("RESULT_CACHE_PATH") or None,
+            )
+        return _default_cache
@@ -0,0 +1,168 @@
+"""
+Rule-based credit reasons.
+
+The thresholds that ``get_credit_reasons`` used to hard-code are declared as
+data here and evaluated with NumPy over whole batches, so bulk scoring runs
+get explanations without a per-row LLM call. A different rule set can be
+loaded from a JSON file with the same shape as ``default_rules``.
+"""
+import json
+import operator
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+# band "high" ใช้กับคะแนน >= score_threshold, band "low" ใช้กับคะแนนต่ำกว่า
+default_rules = {
+    "score_threshold": 680,
+    "max_reasons": 4,
+    "defaults": {
+        "high": "✅ มีประวัติทางการเงินและประสิทธิภาพการทำงานโดยรวมอยู่ในเกณฑ์ดี",
+        "low": "⚠️ ควรพิจารณาปรับปรุงประวัติทางการเงินและประสิทธิภาพการทำงาน",
+    },
+    "rules": [
+        {"name": "long_membership", "band": "high", "feature": "membership_duration_months", "op": ">", "value": 120,
+         "message": "✅ มีประวัติการเป็นสมาชิกที่ยาวนาน"},
+        {"name": "high_completion_rate", "band": "high", "feature": "job_completion_rate", "op": ">", "value": 95.0,
+         "message": "✅ มีอัตราการทำงานสำเร็จในระดับสูง"},
+        {"name": "excellent_rating", "band": "high", "feature": "customer_rating_avg", "op": ">", "value": 4.5,
+         "message": "✅ ได้รับคะแนนเฉลี่ยจากลูกค้าในระดับดีเยี่ยม"},
+        {"name": "consistent_work", "band": "high", "feature": "work_consistency_index", "op": ">", "value": 0.9,
+         "message": "✅ มีความสม่ำเสมอในการทำงานสูง"},
+        # Loan_Amount > Monthly_Income * 5 (เฉพาะกรณีมีรายได้)
+        {"name": "high_loan_to_income", "band": "low", "feature": "Loan_Amount", "op": ">", "value": 5,
+         "scale_by": "Monthly_Income", "message": "⚠️ สัดส่วนยอดหนี้สินเชื่อต่อรายได้ค่อนข้างสูง"},
+        {"name": "little_experience", "band": "low", "feature": "Work_Experience", "op": "<", "value": 2,
+         "message": "⚠️ มีประสบการณ์ทำงานค่อนข้างน้อย"},
+        {"name": "frequent_cancellations", "band": "low", "feature": "job_cancellation_count", "op": ">", "value": 10,
+         "message": "⚠️ มีประวัติการยกเลิกงานที่เกิดขึ้นบ่อยครั้ง"},
+        {"name": "many_inactive_days", "band": "low", "feature": "inactive_days_last_30", "op": ">", "value": 15,
+         "message": "⚠️ มีจำนวนวันที่ไม่ทำงานในช่วง 30 วันที่ผ่านมาค่อนข้างสูง"},
+        {"name": "frequent_rejections", "band": "low", "feature": "rejected_jobs_last_30", "op": ">", "value": 5,
+         "message": "⚠️ มีประวัติการปฏิเสธงานที่เกิดขึ้นบ่อยครั้ง"},
+    ],
+}
+
+_operators = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le, "==": operator.eq}
+
+# โหมดการสร้างเหตุผลที่เลือกได้ต่อคำขอ
+explanation_modes = ["rules-then-llm", "llm", "rules"]
+
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    ``feature op value`` or, with ``scale_by``, ``feature op value * scale_by``
+    (only where ``scale_by`` is positive).
+    """
+    name: str
+    band: str
+    feature: str
+    op: str
+    value: float
+    message: str
+    scale_by: Optional[str] = None
+
+    def mask(self, data: Union[pd.DataFrame, Dict[str, np.ndarray]]) -> np.ndarray:
+        values = np.asarray(data[self.feature], dtype=float)
+        compare = _operators[self.op]
+        if self.scale_by is None:
+            return compare(values, self.value)
+        scale = np.asarray(data[self.scale_by], dtype=float)
+        return compare(values, scale * self.value) & (scale > 0)
+
+
+class RuleSet:
+    """
+    Ordered rules evaluated per score band.
+
+    Args:
+        rules (Sequence[Rule]): Rules in the order their reasons are listed.
+        score_threshold (float): Scores at or above it use the "high" band.
+        defaults (dict): Reason used per band when no rule matches.
+        max_reasons (int): Reasons returned per applicant.
+    """
+
+    def __init__(self, rules: Sequence[Rule], score_threshold: float = 680,
+                 defaults: Optional[Dict[str, str]] = None, max_reasons: int = 4):
+        self.rules = list(rules)
+        self.score_threshold = score_threshold
+        self.defaults = dict(defaults or default_rules["defaults"])
+        self.max_reasons = max_reasons
+        self._messages = np.array([rule.message for rule in self.rules], dtype=object)
+        self._high = np.array([rule.band == "high" for rule in self.rules])
+
+    @classmethod
+    def from_dict(cls, config: dict) -> "RuleSet":
+        return cls(
+            rules=[Rule(**rule) for rule in config["rules"]],
+            score_threshold=config.get("score_threshold", 680),
+            defaults=config.get("defaults"),
+            max_reasons=config.get("max_reasons", 4),
+        )
+
+    @classmethod
+    def from_json(cls, path: str) -> "RuleSet":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def matches(self, scores, data: Union[pd.DataFrame, Dict[str, np.ndarray]]) -> np.ndarray:
+        """
+        Returns a ``(n_rows, n_rules)`` boolean matrix of the rules that fire.
+
+        A rule only fires for rows in its band.
+        """
+        high = np.asarray(scores, dtype=float) >= self.score_threshold
+        fired = np.column_stack([rule.mask(data) for rule in self.rules]) if self.rules else \
+            np.zeros((len(high), 0), dtype=bool)
+        in_band = np.where(high[:, None], self._high[None, :], ~self._high[None, :])
+        return fired & in_band
+
+    def evaluate(self, scores, data: Union[pd.DataFrame, Dict[str, np.ndarray]]) -> List[List[str]]:
+        """Returns the reasons for every row of ``data``."""
+        high = np.asarray(scores, dtype=float) >= self.score_threshold
+        matched = self.matches(scores, data)
+        reasons = []
+        for row_matches, row_high in zip(matched, high):
+            row = self._messages[row_matches][:self.max_reasons].tolist()
+            reasons.append(row or [self.defaults["high" if row_high else "low"]])
+        return reasons
+
+    def explain_one(self, score, data: dict) -> List[str]:
+        """Reasons for a single ``data_to_predict`` dict."""
+        needed = {rule.feature for rule in self.rules} | {rule.scale_by for rule in self.rules if rule.scale_by}
+        return self.evaluate([score], {name: [data[name]] for name in needed})[0]
+
+
+_default_rule_set: Optional[RuleSet] = None
+_default_rule_set_lock = threading.Lock()
+
+
+def get_rule_set() -> RuleSet:
+    """
+    Returns the process-wide rule set: ``CREDIT_RULES_PATH`` (JSON) when set,
+    otherwise ``default_rules``.
+    """
+    global _default_rule_set
+    with _default_rule_set_lock:
+        if _default_rule_set is None:
+            path = os.environ.get("CREDIT_RULES_PATH")
+            _default_rule_set = RuleSet.from_json(path) if path else RuleSet.from_dict(default_rules)
+        return _default_rule_set
+
+
+def rule_scores(df: pd.DataFrame, prediction=None) -> np.ndarray:
+    """
+    Scores that pick the rule band for a batch.
+
+    Uses ``simulated_credit_score``. Inputs without it (C1 models) are banded
+    by the model instead: approved rows (class 1) count as "high".
+    """
+    if "simulated_credit_score" in df.columns:
+        return df["simulated_credit_score"].to_numpy(dtype=float)
+    threshold = get_rule_set().score_threshold
+    return np.where(np.asarray(prediction) == 1, threshold, threshold - 1).astype(float)
@@ -0,0 +1,936 @@
+"""
+Scoring logic shared by the Streamlit app and the headless entry points.
+
+Everything here is free of Streamlit so it can be imported by batch jobs and
+services without rerunning the UI.
+"""
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from attribution import get_attributor
+from encoder import get_encoder
+from linear_engine import LinearModel, expit, is_linear
+from metrics import span
+from model_descriptor import ModelDescriptor, load_descriptor
+from model_registry import get_registry
+from result_cache import get_result_cache
+from rules import get_rule_set, rule_scores
+
+
+# รายการของไฟล์โมเดลที่อยู่ในโฟลเดอร์เดียวกัน
+model_options = [
+    "C2M2_Credit_score_with_Random_Forest_Model.pkl",
+  #  "C2M1_Credit_score_with_Logistic_Regression_Model.pkl",
+    "C1M2_No_credit_score_with_Random_Forest_Model.pkl",
+  #  "C1M1_No_credit_score_with_Logistic_Regression_Model.pkl"
+]
+
+# เครื่องมือทำนาย: "sklearn" ใช้ไฟล์ .pkl, "flat" ใช้ไฟล์ .npz ที่ export ด้วย forest_engine.py
+# (map จากไฟล์ แชร์หน้าหน่วยความจำข้าม process), "onnx" ใช้ไฟล์ .onnx ที่ export ด้วย onnx_engine.py (onnxruntime)
+inference_backends = ("sklearn", "flat", "onnx")
+inference_backend = os.environ.get("INFERENCE_BACKEND", "sklearn")
+
+# โมเดลที่ให้คะแนนเทียบกันในโหมดเปรียบเทียบ (champion/challenger) ตัวแรกคือ champion
+comparison_models = [
+    "C2M2_Credit_score_with_Random_Forest_Model.pkl",
+    "C2M1_Credit_score_with_Logistic_Regression_Model.pkl",
+    "C1M2_No_credit_score_with_Random_Forest_Model.pkl",
+    "C1M1_No_credit_score_with_Logistic_Regression_Model.pkl",
+]
+
+# Manual mapping สำหรับแปลงค่าจากข้อความเป็นตัวเลข
+education_map = {'Vocational': 0, 'Secondary': 1, 'Primary': 2, 'None': 3}
+loan_purpose_map = {'business': 0, 'personal': 1}
+home_ownership_map = {'own': 0, 'rent': 1}
+certificate_map = {'Yes': 0, 'No': 1}
+gender_map = {'Male': 0, 'Female': 1}
+marital_status_map = {'Single': 0, 'Married': 1, 'Divorced': 2}
+region_map = {'North': 0, 'Central': 1, 'South': 2, 'East': 3, 'West': 4}
+occupation_map = {'Private': 0, 'Government': 1, 'Freelancer': 2, 'Unemployed': 3}
+
+categorical_maps = {
+    "Gender": gender_map,
+    "Occupation": occupation_map,
+    "Education": education_map,
+    "Marital_Status": marital_status_map,
+    "Certificate": certificate_map,
+    "Region": region_map,
+    "loan_purpose": loan_purpose_map,
+    "home_ownership": home_ownership_map,
+}
+
+# "None" เป็นค่าหนึ่งของ Education จึงต้องไม่ให้ pandas แปลงเป็น NaN ตอนอ่าน CSV
+csv_read_options = {"keep_default_na": False, "na_values": [""]}
+
+status_map = {0: "มีความเสี่ยงสูง (ไม่อนุมัติ)", 1: "มีความเสี่ยงต่ำ (อนุมัติ)", 2: "รอการตรวจสอบเพิ่มเติม"}
+
+# ลำดับคอลัมน์ของ data_to_predict (ตรงกับลำดับตอนเทรน Random Forest)
+raw_features_credit_score = [
+    "Gender", "Age", "Occupation", "Education", "Marital_Status", "Work_Experience",
+    "Certificate", "Region", "Monthly_Income", "Loan_Amount", "loan_purpose",
+    "home_ownership", "dependents", "job_completion_rate", "on_time_rate",
+    "avg_response_time_mins", "customer_rating_avg", "job_acceptance_rate",
+    "job_cancellation_count", "weekly_active_days", "membership_duration_months",
+    "simulated_credit_score", "work_consistency_index", "inactive_days_last_30",
+    "rejected_jobs_last_30",
+]
+raw_features_no_credit_score = [c for c in raw_features_credit_score if c != "simulated_credit_score"]
+
+
+# (ชื่อตัวแปร, label EN, label TH, ค่าต่ำสุด, ค่าสูงสุด, ค่าเริ่มต้น) ของ slider ข้อมูลทางเลือกในฟอร์ม
+metrics_config = [
+     ("job_completion_rate", " ", "อัตราสำเร็จงาน", 0.0, 100.0, 85.0),
+     ("on_time_rate", " ", "อัตราตรงเวลา", 0.0, 100.0, 90.0),
+     ("avg_response_time_mins", " ", "เวลาตอบกลับเฉลี่ย (นาที)", 0.0, 120.0, 10.0),
+     ("customer_rating_avg", " ", "คะแนนเฉลี่ยจากลูกค้า", 0.0, 5.0, 4.2),
+     ("job_acceptance_rate", " ", "อัตรารับงาน", 0.0, 100.0, 80.0),
+     ("job_cancellation_count", " ", "จำนวนยกเลิกงาน", 0, 100, 2),
+     ("weekly_active_days", " ", "วันทำงานต่อสัปดาห์", 0, 7, 5),
+     ("membership_duration_months", " ", "ระยะเวลาสมาชิก (เดือน)", 0, 240, 24),
+     ("work_consistency_index", " ", "ดัชนีความสม่ำเสมอ", 0.0, 1.0, 0.75),
+     ("inactive_days_last_30", " ", "วันที่ไม่ทำงานใน 30 วัน", 0, 30, 3),
+     ("rejected_jobs_last_30", " ", "จำนวนงานที่ปฏิเสธใน 30 วัน", 0, 30, 1),
+]
+
+# ช่วงค่าของ slider อื่น ๆ ในฟอร์ม
+slider_bounds = {
+    "Age": (18, 70),
+    "Work_Experience": (0, 40),
+    "dependents": (0, 10),
+    "simulated_credit_score": (400, 900),
+}
+
+# ช่วงค่าของจำนวนเงินที่ใช้สุ่มข้อมูลทดสอบและเป็นช่วงเริ่มต้นของ what-if (ฟอร์มไม่มีขอบบน)
+amount_bounds = {
+    "Monthly_Income": (5_000.0, 100_000.0),
+    "Loan_Amount": (1_000.0, 500_000.0),
+}
+
+# ค่าเริ่มต้นของฟอร์มในหน้าแอป ใช้เป็นตัวอย่าง payload และข้อมูลทดสอบโหลด
+example_applicant = {
+    "Gender": "Male",
+    "Age": 30,
+    "Occupation": "Private",
+    "Education": "Vocational",
+    "Marital_Status": "Single",
+    "Work_Experience": 5,
+    "Certificate": "Yes",
+    "Region": "North",
+    "Monthly_Income": 25000.0,
+    "Loan_Amount": 10000.0,
+    "loan_purpose": "business",
+    "home_ownership": "own",
+    "dependents": 1,
+    "job_completion_rate": 85.0,
+    "on_time_rate": 90.0,
+    "avg_response_time_mins": 10.0,
+    "customer_rating_avg": 4.2,
+    "job_acceptance_rate": 80.0,
+    "job_cancellation_count": 2,
+    "weekly_active_days": 5,
+    "membership_duration_months": 24,
+    "simulated_credit_score": 600,
+    "work_consistency_index": 0.75,
+    "inactive_days_last_30": 3,
+    "rejected_jobs_last_30": 1,
+}
+
+
+def synthetic_applicants(n: int, seed: int = 0, labels: bool = True) -> pd.DataFrame:
+    """
+    Generates ``n`` random applicants inside the form's input ranges.
+
+    Used for benchmarks, load tests and model comparisons where no real
+    applicant data is available.
+
+    Args:
+        n (int): Number of rows.
+        seed (int): Random seed.
+        labels (bool): Categorical fields as labels ("Male") when True,
+            as integer codes when False.
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for col, mapping in categorical_maps.items():
+        keys = np.array(list(mapping))
+        picks = rng.integers(0, len(keys), n)
+        data[col] = keys[picks] if labels else np.array(list(mapping.values()))[picks]
+    for col, (low, high) in slider_bounds.items():
+        data[col] = rng.integers(low, high + 1, n)
+    for col, (low, high) in amount_bounds.items():
+        data[col] = rng.uniform(low, high, n).round(0)
+    for var_name, _, _, min_val, max_val, default in metrics_config:
+        if isinstance(default, float):
+            data[var_name] = rng.uniform(min_val, max_val, n)
+        else:
+            data[var_name] = rng.integers(min_val, max_val + 1, n)
+    return pd.DataFrame(data)[raw_features_credit_score]
+
+
+def backend_model_file(model_file: str, backend: str = None) -> str:
+    """
+    The file ``backend`` scores ``model_file`` with.
+
+    ``model_file`` itself for ``"sklearn"``; for ``"flat"`` the
+    ``<model>.npz`` flat forest of a Random Forest, which ``ModelRegistry``
+    memory-maps so every worker shares one copy (other model families have no
+    flat form and keep ``model_file``); ``<model>.onnx`` for ``"onnx"``.
+    ``backend`` defaults to ``INFERENCE_BACKEND`` (``"sklearn"``). The
+    descriptor is always read next to ``model_file``.
+
+    Raises:
+        ValueError: If ``backend`` is unknown.
+        FileNotFoundError: If the model has not been exported for ``backend``.
+    """
+    backend = backend or inference_backend
+    if backend not in inference_backends:
+        raise ValueError(f"Unknown inference backend {backend!r}; expected one of {inference_backends}")
+    if backend == "sklearn":
+        return model_file
+    if backend == "flat":
+        if load_descriptor(model_file).family != "random_forest":
+            return model_file
+        flat_file = os.path.splitext(model_file)[0] + ".npz"
+        if not os.path.exists(flat_file):
+            raise FileNotFoundError(f"{flat_file} not found; export it with 'python forest_engine.py {model_file}'")
+        return flat_file
+    onnx_file = os.path.splitext(model_file)[0] + ".onnx"
+    if not os.path.exists(onnx_file):
+        raise FileNotFoundError(f"{onnx_file} not found; export it with 'python onnx_engine.py {model_file}'")
+    return onnx_file
+
+
+def feature_ranges() -> Dict[str, Tuple[float, float]]:
+    """
+    ``(low, high)`` of every numeric form field.
+
+    Bounds are ints for integer fields (sliders with int steps) and floats
+    otherwise, so ``sensitivity_axis`` can keep integer fields integral.
+    """
+    ranges = dict(slider_bounds)
+    ranges.update(amount_bounds)
+    for var_name, _, _, min_val, max_val, _ in metrics_config:
+        ranges[var_name] = (min_val, max_val)
+    return ranges
+
+
+def sensitivity_axis(feature: str, points: int, low=None, high=None) -> np.ndarray:
+    """
+    ``points`` evenly spaced values of ``feature`` between ``low`` and ``high``.
+
+    The bounds default to ``feature_ranges()``. Integer fields are rounded
+    and de-duplicated, so they may get fewer than ``points`` values.
+    """
+    default_low, default_high = feature_ranges()[feature]
+    low = default_low if low is None else low
+    high = default_high if high is None else high
+    values = np.linspace(low, high, max(int(points), 2))
+    if isinstance(default_low, int):
+        return np.unique(np.round(values).astype(np.int64))
+    return values
+
+
+def sensitivity_grid(row: dict, axes: Dict[str, Sequence]) -> pd.DataFrame:
+    """
+    Variants of one ``data_to_predict`` row over the product of ``axes``.
+
+    Args:
+        row (dict): The applicant to vary.
+        axes (dict): Feature -> values. The first feature varies slowest.
+
+    Returns:
+        pd.DataFrame: One row per combination; every other column keeps the
+        value (and dtype) it has in ``row``.
+    """
+    mesh = np.meshgrid(*[np.asarray(values) for values in axes.values()], indexing="ij")
+    n = mesh[0].size
+    grid = pd.DataFrame([row]).iloc[np.zeros(n, dtype=np.intp)].reset_index(drop=True)
+    for feature, values in zip(axes, mesh):
+        grid[feature] = values.ravel()
+    return grid
+
+
+def uses_credit_score(model_file: str) -> bool:
+    """Whether the model takes ``simulated_credit_score`` (from its descriptor)."""
+    return load_descriptor(model_file).requires_credit_score
+
+
+def is_logistic(model_file: str) -> bool:
+    """Whether the model is a Logistic Regression (from its descriptor)."""
+    return load_descriptor(model_file).family == "logistic_regression"
+
+
+def raw_features(model_file: str) -> List[str]:
+    """Returns the ``data_to_predict`` columns for the given model file."""
+    return list(load_descriptor(model_file).features)
+
+
+def logistic_features(model_file: str) -> List[str]:
+    """Returns the One-Hot encoded feature names a Logistic Regression model expects."""
+    return list(load_descriptor(model_file).encoded_features)
+
+
+def build_data_to_predict(applicant: dict, model_file: str) -> dict:
+    """
+    Builds the ``data_to_predict`` row for one applicant.
+
+    Args:
+        applicant (dict): Form values keyed by column name. Categorical fields
+            may be labels (``"Male"``) or codes (``0``).
+        model_file (str): File name of the model that will score the row.
+
+    Returns:
+        dict: Column -> value in the order the models were trained on.
+
+    Raises:
+        ValueError: If a field is missing or a label or code is not in its map.
+    """
+    return build_row(applicant, load_descriptor(model_file).features)
+
+
+def build_row(applicant: dict, columns: Sequence[str]) -> dict:
+    """``build_data_to_predict`` for an explicit column list."""
+    data_to_predict = {}
+    for col in columns:
+        if applicant.get(col) is None:
+            raise ValueError(f"Missing field '{col}'")
+        value = applicant[col]
+        mapping = categorical_maps.get(col)
+        if mapping is not None and isinstance(value, str):
+            if value not in mapping:
+                raise ValueError(f"Unknown value for '{col}': {value!r}")
+            value = mapping[value]
+        elif mapping is not None and (isinstance(value, (bool, np.bool_)) or value not in mapping.values()):
+            # True == 1 จึงต้องตรวจ bool แยก ไม่ให้ผ่านเป็นรหัส 1
+            raise ValueError(f"Unknown code for '{col}': {value!r}")
+        data_to_predict[col] = value
+    return data_to_predict
+
+
+def get_credit_grade(score):
+    """Maps a credit score to a grade based on NCB criteria."""
+    if 753 <= score <= 900:
+        return "AA", "ดีเยี่ยม"
+    elif 725 <= score <= 752:
+        return "BB", "ดี"
+    elif 699 <= score <= 724:
+        return "CC", "ดีพอใช้"
+    elif 681 <= score <= 698:
+        return "DD", "ปานกลาง"
+    elif 666 <= score <= 680:
+        return "EE", "ควรปรับปรุง"
+    elif 616 <= score <= 665:
+        return "FF", "ต้องปรับปรุง"
+    elif 300 <= score <= 615:
+        return "HH", "มีความเสี่ยงสูง"
+    else:
+        return "N/A", "ไม่สามารถประเมินได้"
+
+
+credit_grade_bands = [
+    (753, 900, "AA"), (725, 752, "BB"), (699, 724, "CC"), (681, 698, "DD"),
+    (666, 680, "EE"), (616, 665, "FF"), (300, 615, "HH"),
+]
+
+
+def get_credit_grades(scores) -> np.ndarray:
+    """Vectorized ``get_credit_grade`` returning only the grade codes."""
+    scores = np.asarray(scores, dtype=float)
+    conditions = [(scores >= low) & (scores <= high) for low, high, _ in credit_grade_bands]
+    return np.select(conditions, [grade for _, _, grade in credit_grade_bands], default="N/A")
+
+
+def preprocess_data(input_df: pd.DataFrame, expected_features: list) -> pd.DataFrame:
+    """
+    Transforms raw input data to match the expected format for the model.
+
+    This function performs One-Hot Encoding and aligns the columns to ensure
+    the input DataFrame has the same features and order as the data used
+    to train the model.
+
+    Args:
+        input_df (pd.DataFrame): The raw DataFrame with user-provided data.
+        expected_features (list): A list of feature names the model expects.
+
+    Returns:
+        pd.DataFrame: The preprocessed DataFrame ready for prediction.
+    """
+    # Define categorical columns to encode
+    cat_cols_to_encode = [
+        'Gender', 'Occupation', 'Education', 'Marital_Status', 'Region',
+        'Certificate', 'loan_purpose', 'home_ownership'
+    ]
+
+    # Perform One-Hot Encoding
+    input_df_encoded = pd.get_dummies(input_df, columns=cat_cols_to_encode, drop_first=True)
+
+    # Add any missing columns (from the expected list) and fill with zeros
+    missing_cols = set(expected_features) - set(input_df_encoded.columns)
+    for c in missing_cols:
+        input_df_encoded[c] = 0
+
+    # Remove any extra columns that are not in the expected list
+    extra_cols = set(input_df_encoded.columns) - set(expected_features)
+    if extra_cols:
+        input_df_encoded.drop(columns=extra_cols, inplace=True)
+
+    # Reorder the columns to match the expected order
+    input_df_encoded = input_df_encoded[expected_features]
+
+    return input_df_encoded
+
+
+def encode_categoricals(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Applies the manual categorical maps column-wise.
+
+    Columns holding text labels (``"Male"``, ``"Freelancer"`` ...) are mapped
+    to their integer codes in one vectorized ``Series.map`` each; columns that
+    are already numeric hold codes and are only checked against the map.
+
+    Raises:
+        ValueError: If a column contains labels or codes that are not in its map.
+    """
+    df = df.copy()
+    for col, mapping in categorical_maps.items():
+        if col not in df.columns:
+            continue
+        if pd.api.types.is_bool_dtype(df[col]):
+            raise ValueError(f"Column '{col}' holds booleans, expected labels or codes")
+        if pd.api.types.is_numeric_dtype(df[col]):
+            unknown = df[col][~df[col].isin(list(mapping.values()))]
+            if len(unknown):
+                raise ValueError(
+                    f"Unknown codes in column '{col}': {sorted(unknown.unique().tolist())[:5]}"
+                )
+            continue
+        codes = df[col].map(mapping)
+        unknown = df[col][codes.isna()]
+        if len(unknown):
+            raise ValueError(
+                f"Unknown values in column '{col}': {sorted(unknown.astype(str).unique())[:5]}"
+            )
+        df[col] = codes.astype(np.int64)
+    return df
+
+
+def prepare_features(df: pd.DataFrame, model_file: str) -> pd.DataFrame:
+    """
+    Builds the model input for a batch of applicants.
+
+    Args:
+        df (pd.DataFrame): Applicants with the ``data_to_predict`` columns,
+            categoricals either as labels or as codes.
+        model_file (str): File name of the model that will score the batch.
+
+    Returns:
+        pd.DataFrame | np.ndarray: Raw codes for ``"codes"`` models, or the
+        One-Hot encoded matrix (``FeatureEncoder``) for ``"one_hot"`` models.
+    """
+    descriptor = load_descriptor(model_file)
+    return encode_features(df, descriptor.features, descriptor_encoder(descriptor), descriptor.name)
+
+
+def descriptor_encoder(descriptor: ModelDescriptor):
+    """The ``FeatureEncoder`` of a ``"one_hot"`` descriptor, None for ``"codes"``."""
+    if descriptor.encoding != "one_hot":
+        return None
+    return get_encoder(descriptor.encoded_features, descriptor.categorical_columns)
+
+
+def encode_features(df: pd.DataFrame, columns: Sequence[str], encoder=None, name: str = "model"):
+    """``prepare_features`` for an explicit column list and encoder."""
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns for {name}: {missing}")
+    features = encode_categoricals(df[list(columns)])
+    if encoder is not None:
+        return encoder.transform(features)
+    return features
+
+
+def predict_with_proba(model, X):
+    """
+    Returns ``(classes, probabilities)`` from a single pass over the model.
+
+    For the Random Forest ``predict`` is the arg-max of ``predict_proba``, so
+    the class is derived from the probabilities instead of walking every tree a
+    second time. For the Logistic Regression models the decision function is
+    computed once and both outputs are derived from it the same way sklearn
+    does; deriving the class from the probabilities would be wrong there,
+    because one-vs-rest probabilities saturate and tie for extreme inputs.
+    Models with their own ``predict_with_proba`` (``FlatForest``) use it.
+    """
+    if hasattr(model, "predict_with_proba"):
+        return model.predict_with_proba(X)
+    classes = np.asarray(model.classes_)
+    if hasattr(model, "coef_") and hasattr(model, "decision_function"):
+        scores = model.decision_function(X)
+        if scores.ndim == 1:
+            prediction = classes[(scores > 0).astype(int)]
+            positive = expit(scores)
+            return prediction, np.column_stack([1.0 - positive, positive])
+        prediction = classes[scores.argmax(axis=1)]
+        ovr = getattr(model, "multi_class", "auto") == "ovr" or getattr(model, "solver", None) == "liblinear"
+        if ovr:
+            proba = expit(scores)
+            proba /= proba.sum(axis=1, keepdims=True)
+        else:
+            shifted = np.exp(scores - scores.max(axis=1, keepdims=True))
+            proba = shifted / shifted.sum(axis=1, keepdims=True)
+        return prediction, proba
+
+    proba = model.predict_proba(X)
+    return classes[proba.argmax(axis=1)], proba
+
+
+@dataclass
+class Prediction:
+    """
+    Everything the app reports about a batch, from one model pass.
+
+    Attributes:
+        classes (np.ndarray): ``model.classes_``, the column order of ``probabilities``.
+        prediction (np.ndarray): Predicted class per row.
+        probabilities (np.ndarray): ``(n_rows, n_classes)`` class probabilities.
+        prob_default (np.ndarray): Probability of the default class (0) per row.
+        confidence (np.ndarray): Probability of the predicted class per row.
+    """
+    classes: np.ndarray
+    prediction: np.ndarray
+    probabilities: np.ndarray
+    prob_default: np.ndarray
+    confidence: np.ndarray
+
+    def __len__(self):
+        return len(self.prediction)
+
+
+def class_index(classes, label) -> int:
+    """Column of ``label`` in ``model.classes_`` (the ``np.where(classes == label)`` lookup)."""
+    matches = np.flatnonzero(np.asarray(classes) == label)
+    if not len(matches):
+        raise ValueError(f"Class {label!r} is not one of the model classes {list(classes)}")
+    return int(matches[0])
+
+
+def predict_batch(model, X, default_class=0) -> Prediction:
+    """
+    Predicts class, probabilities, default probability and confidence in one pass.
+
+    Args:
+        model: Fitted model.
+        X: Model input from ``prepare_features``.
+        default_class: Class label whose probability is ``prob_default``.
+    """
+    prediction, proba = predict_with_proba(model, X)
+    classes = np.asarray(model.classes_)
+    return Prediction(
+        classes=classes,
+        prediction=prediction,
+        probabilities=proba,
+        prob_default=proba[:, class_index(classes, default_class)],
+        confidence=proba.max(axis=1),
+    )
+
+
+class ScoringPipeline:
+    """
+    A model compiled with its descriptor into a ready-to-call scorer.
+
+    Column lists, the encoder and the class labels are resolved once here, so
+    scoring a request is a direct call without any per-request dispatch.
+    Logistic Regression models are scored by a ``LinearModel`` built from
+    their coefficients (``scorer``) instead of through sklearn.
+
+    Args:
+        model: Fitted model.
+        descriptor (ModelDescriptor): How to score ``model``.
+
+    Raises:
+        ValueError: If ``model`` does not match ``descriptor``.
+    """
+
+    def __init__(self, model, descriptor: ModelDescriptor):
+        descriptor.validate(model)
+        self.model = model
+        # โมเดลเชิงเส้นคำนวณด้วย NumPy ตรง ๆ (linear_engine) ไม่ผ่านการตรวจ input ของ sklearn
+        self.scorer = LinearModel.from_sklearn(model) if is_linear(model) else model
+        self.descriptor = descriptor
+        self.columns = list(descriptor.features)
+        self.encoder = descriptor_encoder(descriptor)
+        # โมเดล ONNX ของ Logistic Regression ทำ One-Hot ในกราฟเอง จึงรับคอลัมน์ดิบ
+        self.model_encoder = None if getattr(model, "encodes_inputs", False) else self.encoder
+        self.class_labels = dict(descriptor.class_labels)
+        self.units = "log-odds" if descriptor.family == "logistic_regression" else "probability"
+        # sklearn ที่ fit ด้วยชื่อคอลัมน์ต้องรับ DataFrame ส่วน engine ของเราเอง (LinearModel, FlatForest, ONNX) รับ array
+        self.frame_input = hasattr(self.scorer, "feature_names_in_") and not hasattr(self.scorer, "predict_with_proba")
+        self._row_buffers = threading.local()
+
+    def build_row(self, applicant: dict) -> dict:
+        """The ``data_to_predict`` row for one applicant (see ``build_data_to_predict``)."""
+        return build_row(applicant, self.columns)
+
+    def features(self, df: pd.DataFrame):
+        """Model input for a batch (see ``prepare_features``)."""
+        return encode_features(df, self.columns, self.model_encoder, self.descriptor.name)
+
+    def row_features(self, row: dict) -> np.ndarray:
+        """
+        Model input for one ``build_row`` dict, without pandas.
+
+        ``build_row`` has already validated and mapped the categorical fields,
+        so the values go straight into a ``(1, n)`` buffer kept per thread:
+        through ``FeatureEncoder.transform_row`` for ``"one_hot"`` models, in
+        column order otherwise. The next call on the same thread overwrites
+        the returned array.
+        """
+        buffer = getattr(self._row_buffers, "model", None)
+        if buffer is None:
+            width = self.model_encoder.n_features if self.model_encoder is not None else len(self.columns)
+            buffer = self._row_buffers.model = np.zeros((1, width))
+        if self.model_encoder is not None:
+            return self.model_encoder.transform_row(row, out=buffer)
+        buffer[0] = [row[col] for col in self.columns]
+        return buffer
+
+    def predict(self, df: pd.DataFrame) -> Prediction:
+        with span("preprocess"):
+            X = self.features(df)
+        with span("inference"):
+            return predict_batch(self.scorer, X)
+
+    def predict_row(self, row: dict) -> Prediction:
+        """``predict`` for one ``build_row`` dict, encoded by ``row_features``."""
+        with span("preprocess"):
+            X = self.row_features(row)
+        return self._predict_row_features(X)
+
+    def _predict_row_features(self, X: np.ndarray) -> Prediction:
+        if self.frame_input:
+            X = pd.DataFrame(X, columns=self.columns)
+        with span("inference"):
+            return predict_batch(self.scorer, X)
+
+    def score_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Scores a batch of applicants in one vectorized pass of the model.
+
+        Returns:
+            pd.DataFrame: One row per applicant with ``prediction``, ``status``,
+            ``prob_<class>`` for every class, ``prob_default``, ``confidence``
+            and, when the input has ``simulated_credit_score``, ``credit_grade``.
+        """
+        predicted = self.predict(df)
+
+        result = pd.DataFrame(index=df.index)
+        result["prediction"] = predicted.prediction
+        result["status"] = pd.Series(predicted.prediction, index=df.index).map(self.class_labels)
+        for i, cls in enumerate(predicted.classes):
+            result[f"prob_{cls}"] = predicted.probabilities[:, i]
+        result["prob_default"] = predicted.prob_default
+        result["confidence"] = predicted.confidence
+        if "simulated_credit_score" in df.columns:
+            result["credit_grade"] = get_credit_grades(df["simulated_credit_score"])
+        return result
+
+    def attribute(self, df: pd.DataFrame, prediction=None) -> pd.DataFrame:
+        """
+        Per-feature contributions towards each applicant's predicted class.
+
+        Probability points for Random Forest models, log-odds for Logistic
+        Regression models (``units``; see ``attribution``).
+
+        Args:
+            prediction (array-like, optional): Classes to attribute; predicted
+                again from ``df`` when omitted.
+
+        Returns:
+            pd.DataFrame: One row per applicant, one column per raw feature.
+        """
+        with span("attribution"):
+            # โมเดล ONNX คำนวณจากโมเดลต้นฉบับ (onnx_engine.OnnxModel.attribution_model)
+            model = getattr(self.model, "attribution_model", self.model)
+            X = encode_features(df, self.columns, self.encoder, self.descriptor.name)
+            attributor = get_attributor(model, encoder=self.encoder, feature_names=self.columns)
+            if prediction is None:
+                prediction, _ = predict_with_proba(self.scorer if model is self.model else model, X)
+            _, contributions = attributor.explain(X)
+        class_idx = np.searchsorted(attributor.classes, np.asarray(prediction))
+        values = contributions[np.arange(len(class_idx)), :, class_idx]
+        return pd.DataFrame(values, columns=attributor.feature_names, index=df.index)
+
+    def attribute_row(self, row: dict, prediction, X: np.ndarray = None) -> Dict[str, float]:
+        """
+        ``attribute`` for one ``build_row`` dict, without pandas.
+
+        Args:
+            prediction: Class to attribute.
+            X (np.ndarray, optional): ``row_features(row)`` already computed
+                for ``predict``; reused when the model takes the same input
+                as its attributor, so the row is encoded only once.
+
+        Returns:
+            dict: Raw feature -> contribution towards ``prediction``.
+        """
+        with span("attribution"):
+            model = getattr(self.model, "attribution_model", self.model)
+            if X is None or self.model_encoder is not self.encoder:
+                # โมเดล ONNX ของ Logistic Regression รับคอลัมน์ดิบ แต่ attribution ต้องใช้ One-Hot
+                if self.encoder is not None:
+                    X = self.encoder.transform_row(row)
+                else:
+                    X = np.array([[row[col] for col in self.columns]], dtype=float)
+            attributor = get_attributor(model, encoder=self.encoder, feature_names=self.columns)
+            _, contributions = attributor.explain(X)
+        class_idx = int(np.searchsorted(attributor.classes, prediction))
+        return {name: float(value) for name, value in zip(attributor.feature_names, contributions[0, :, class_idx])}
+
+    def sensitivity(self, row: dict, axes: Dict[str, Sequence]) -> pd.DataFrame:
+        """
+        What-if scores of one applicant over a grid of one or more features.
+
+        Every combination of ``axes`` (see ``sensitivity_grid``) is scored in
+        a single ``predict`` call, so a grid of a thousand points costs about
+        as much as one batch of a thousand applicants.
+
+        Returns:
+            pd.DataFrame: The ``axes`` columns, ``prediction``, ``prob_<class>``
+            for every class and ``prob_default``.
+        """
+        grid = sensitivity_grid(row, axes)
+        with span("sensitivity"):
+            predicted = self.predict(grid)
+        result = grid[list(axes)]
+        result["prediction"] = predicted.prediction
+        for i, cls in enumerate(predicted.classes):
+            result[f"prob_{cls}"] = predicted.probabilities[:, i]
+        result["prob_default"] = predicted.prob_default
+        return result
+
+    def score_row(self, row: dict, model_sha256: str, attributions: bool = False) -> Tuple[str, dict, bool]:
+        """
+        Scores one ``data_to_predict`` row through the shared result cache.
+
+        Args:
+            row (dict): ``build_row`` output.
+            model_sha256 (str): Digest of the model file (``ModelEntry.sha256``),
+                so results of a replaced model file are never reused.
+            attributions (bool): Also compute the feature attributions. They
+                are computed at most once per key, on the first request that
+                asks for them, from the row already encoded for ``predict``.
+
+        Returns:
+            tuple: ``(key, result, cached)``. ``result`` is JSON-serializable:
+            ``prediction``, ``classes``, ``probabilities``, ``prob_default``,
+            ``confidence``, ``credit_grade`` and ``grade_description`` (None
+            when the row has no ``simulated_credit_score``), ``attributions``
+            (feature -> contribution towards the predicted class, None until
+            requested) and ``explanation``, which stays None until the caller
+            stores a GPT explanation under ``key``.
+        """
+        cache = get_result_cache()
+        key = cache.key(self.descriptor.name, model_sha256, row)
+        result = cache.get(key)
+        cached = result is not None
+        if cached and (not attributions or result["attributions"] is not None):
+            return key, result, True
+
+        X = None
+        if not cached:
+            with span("preprocess"):
+                X = self.row_features(row)
+            predicted = self._predict_row_features(X)
+            grade, grade_desc = (get_credit_grade(row["simulated_credit_score"])
+                                 if "simulated_credit_score" in row else (None, None))
+            result = {
+                "prediction": predicted.prediction[:1].tolist()[0],
+                "classes": np.asarray(predicted.classes).tolist(),
+                "probabilities": predicted.probabilities[0].tolist(),
+                "prob_default": float(predicted.prob_default[0]),
+                "confidence": float(predicted.confidence[0]),
+                "credit_grade": grade,
+                "grade_description": grade_desc,
+                "attributions": None,
+                "explanation": None,
+            }
+        if attributions:
+            # X คือ buffer ของ thread นี้จาก row_features ยังไม่ถูกเขียนทับ
+            result = {**result, "attributions": self.attribute_row(row, result["prediction"], X)}
+        cache.set(key, result)
+        return key, result, cached
+
+
+_pipelines: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_pipelines_lock = threading.Lock()
+
+
+def compile_pipeline(model, model_file: str) -> ScoringPipeline:
+    """
+    Returns the pipeline for ``model`` and the descriptor next to ``model_file``.
+
+    Pipelines are cached per model object, so a model reloaded by the
+    registry is compiled again.
+    """
+    descriptor = load_descriptor(model_file)
+    with _pipelines_lock:
+        pipeline = _pipelines.get(model)
+        if pipeline is None or pipeline.descriptor is not descriptor:
+            pipeline = ScoringPipeline(model, descriptor)
+            _pipelines[model] = pipeline
+        return pipeline
+
+
+def get_pipeline(model_file: str, backend: str = None) -> ScoringPipeline:
+    """Loads ``model_file`` for ``backend`` (see ``backend_model_file``) and returns its pipeline."""
+    return compile_pipeline(get_registry().get(backend_model_file(model_file, backend)), model_file)
+
+
+_comparison_executor = None
+_comparison_executor_lock = threading.Lock()
+
+
+def get_comparison_executor() -> ThreadPoolExecutor:
+    """
+    Thread pool that scores the models of a comparison concurrently.
+
+    Sized once from ``COMPARISON_WORKERS`` (default: one thread per model in
+    ``comparison_models``).
+    """
+    global _comparison_executor
+    with _comparison_executor_lock:
+        if _comparison_executor is None:
+            workers = int(os.environ.get("COMPARISON_WORKERS", len(comparison_models)))
+            _comparison_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="compare")
+        return _comparison_executor
+
+
+def available_comparison_models() -> List[str]:
+    return [f for f in comparison_models if os.path.exists(f)]
+
+
+def preload_models(model_files: Sequence[str]):
+    """Loads and compiles every model concurrently on the comparison pool."""
+    list(get_comparison_executor().map(get_pipeline, model_files))
+
+
+def _score_one_model(model_file: str, applicant: dict) -> dict:
+    start = time.perf_counter()
+    result = {"model": model_file.split("_", 1)[0], "model_file": model_file}
+    try:
+        pipeline = get_pipeline(model_file)
+        predicted = pipeline.predict_row(pipeline.build_row(applicant))
+    except Exception as e:
+        # challenger ที่เสียไม่ควรทำให้การเปรียบเทียบทั้งหมดล้ม
+        return {**result, "error": f"{type(e).__name__}: {e}", "latency_ms": (time.perf_counter() - start) * 1000}
+    prediction = predicted.prediction[0]
+    result.update(prediction=prediction, status=pipeline.class_labels.get(prediction, "N/A"))
+    for i, cls in enumerate(predicted.classes):
+        result[f"prob_{cls}"] = float(predicted.probabilities[0, i])
+    result.update(prob_default=float(predicted.prob_default[0]), confidence=float(predicted.confidence[0]),
+                  latency_ms=(time.perf_counter() - start) * 1000, error=None)
+    return result
+
+
+def compare_models(applicant: dict, model_files: Sequence[str] = None) -> pd.DataFrame:
+    """
+    Scores one applicant with several models at once.
+
+    Every model runs as its own task on ``get_comparison_executor()``, so
+    the wall time is close to the slowest model instead of the sum. A model
+    that fails is reported in the ``error`` column instead of raising.
+
+    Args:
+        applicant (dict): Form-style applicant (see ``build_data_to_predict``).
+        model_files (Sequence[str], optional): Models to compare, champion
+            first; defaults to ``available_comparison_models()``.
+
+    Returns:
+        pd.DataFrame: One row per model with ``model``, ``prediction``,
+        ``status``, ``prob_<class>``, ``prob_default``, ``confidence``,
+        ``latency_ms``, ``error`` and ``agrees`` (same class as the first
+        model that scored).
+    """
+    if model_files is None:
+        model_files = available_comparison_models()
+    with span("compare"):
+        futures = [get_comparison_executor().submit(_score_one_model, f, applicant) for f in model_files]
+        result = pd.DataFrame([future.result() for future in futures])
+    scored = result["error"].isna()
+    if pd.api.types.is_numeric_dtype(result["prediction"]):
+        # แถวของโมเดลที่ error ไม่มี class จึงใช้ nullable integer ไม่ให้ class กลายเป็น float
+        result["prediction"] = result["prediction"].astype("Int64")
+    champion = result.loc[scored, "prediction"].iloc[0] if scored.any() else None
+    result["agrees"] = scored & (result["prediction"] == champion)
+    return result
+
+
+def score_frame(model, model_file: str, df: pd.DataFrame) -> pd.DataFrame:
+    """``ScoringPipeline.score_frame`` for ``model`` loaded from ``model_file``."""
+    return compile_pipeline(model, model_file).score_frame(df)
+
+
+def attribute_frame(model, model_file: str, df: pd.DataFrame, prediction=None) -> pd.DataFrame:
+    """``ScoringPipeline.attribute`` for ``model`` loaded from ``model_file``."""
+    return compile_pipeline(model, model_file).attribute(df, prediction)
+
+
+def format_top_factors(attributions: pd.DataFrame, k: int = 3) -> pd.Series:
+    """Formats the ``k`` strongest contributions of each row as ``"feature +0.123, ..."``."""
+    names = np.asarray(attributions.columns)
+    values = attributions.to_numpy()
+    order = np.argsort(-np.abs(values), axis=1, kind="stable")[:, :k]
+    top_names = names[order]
+    top_values = np.take_along_axis(values, order, axis=1)
+    return pd.Series(
+        [", ".join(f"{name} {value:+.3f}" for name, value in zip(row_names, row_values))
+         for row_names, row_values in zip(top_names, top_values)],
+        index=attributions.index,
+    )
+
+
+def rule_reasons(df: pd.DataFrame, prediction=None) -> pd.Series:
+    """
+    Rule-based reasons for every applicant, joined with " | ".
+
+    Categorical fields are not used by the rules, so ``df`` may hold labels
+    or codes.
+    """
+    reasons = get_rule_set().evaluate(rule_scores(df, prediction), df)
+    return pd.Series([" | ".join(r) for r in reasons], index=df.index)
+
+
+def iter_score_chunks(model, model_file: str, chunks: Iterable[pd.DataFrame],
+                      explain_rules: bool = False, top_factors: int = 0) -> Iterator[pd.DataFrame]:
+    """
+    Scores each chunk and yields it with the result columns appended.
+
+    With ``explain_rules`` a ``reasons`` column from the rule engine is added;
+    with ``top_factors`` > 0 a ``top_factors`` column lists that many of the
+    strongest feature contributions.
+    """
+    pipeline = compile_pipeline(model, model_file)
+    for chunk in chunks:
+        scored = pipeline.score_frame(chunk)
+        if explain_rules:
+            scored["reasons"] = rule_reasons(chunk, scored["prediction"])
+        if top_factors:
+            attributions = pipeline.attribute(chunk, scored["prediction"])
+            scored["top_factors"] = format_top_factors(attributions, top_factors)
+        yield pd.concat([chunk, scored], axis=1)
+
+
+def summarize_throughput(rows: int, seconds: float) -> Dict[str, float]:
+    return {
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows / seconds, 1) if seconds > 0 else float("inf"),
+    }
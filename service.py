@@ -0,0 +1,381 @@
+"""
+Headless HTTP scoring service for the loan origination system.
+
+Uses the same preprocessing and models as the Streamlit app, without the UI.
+Every model in ``model_options`` is loaded and warmed up once at startup;
+requests are scored on a thread pool so slow batches do not block the event
+loop.
+
+Requests can ask for credit reasons with ``explanation``: "rules" evaluates the
+rules engine (also for batches), "llm" and "rules-then-llm" additionally ask
+GPT for single-applicant requests.
+
+Run with:
+    uvicorn service:app --host 0.0.0.0 --port 8000
+
+or, to use more than one core, with pre-forked worker processes that share
+the loaded models (see ``prefork.py``):
+    python prefork.py --workers 4 --port 8000
+
+``/score`` goes through the shared result cache (``result_cache.py``): an
+applicant already scored with the same model file, by this service or by the
+Streamlit app, reuses the stored prediction, attributions and GPT explanation.
+
+``/stats`` also lists the startup timings (file checks and warm-up per model,
+see ``startup.py``); ``openai`` is only imported by the first GPT request.
+
+Stage latencies, GPT errors, cache hits and model loads are exported in the
+Prometheus text format at ``GET /metrics`` (see ``metrics.py``). Under
+``prefork.py`` the series carry the ``pid`` of their worker and every worker
+answers with the series of all of them.
+
+Configuration (environment variables):
+    SCORING_WORKERS         Size of the scoring thread pool (default: CPU count)
+    LATENCY_TARGET_P50_MS   p50 latency target for /score (default: 20)
+    LATENCY_TARGET_P99_MS   p99 latency target for /score (default: 100)
+    INFERENCE_BACKEND       "sklearn" (default); "flat" to score the Random Forests
+                            from their exported .npz files, memory-mapped and shared
+                            by every process (see forest_engine.py); or "onnx" to
+                            score with the exported .onnx models through onnxruntime
+                            (see onnx_engine.py)
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Literal, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, ConfigDict, Field, StrictInt
+
+from attribution import top_contributors
+from explanations import credit_reason_fields, get_explanation_service
+from metrics import render_prometheus, span
+from model_registry import get_registry
+from result_cache import get_result_cache
+from rules import get_rule_set, rule_scores
+from scoring import backend_model_file, example_applicant, get_credit_grade, get_pipeline, model_options
+from startup import check_model_files, get_startup_timings
+
+logger = logging.getLogger(__name__)
+
+SCORING_WORKERS = int(os.environ.get("SCORING_WORKERS", os.cpu_count() or 4))
+LATENCY_TARGET_P50_MS = float(os.environ.get("LATENCY_TARGET_P50_MS", "20"))
+LATENCY_TARGET_P99_MS = float(os.environ.get("LATENCY_TARGET_P99_MS", "100"))
+DEFAULT_MODEL = model_options[0]
+
+Category = Union[str, StrictInt]
+
+
+class Applicant(BaseModel):
+    """One applicant. Categorical fields accept labels ("Male") or codes (0)."""
+    model_config = ConfigDict(json_schema_extra={"example": example_applicant})
+
+    Gender: Category
+    Age: float
+    Occupation: Category
+    Education: Category
+    Marital_Status: Category
+    Work_Experience: float
+    Certificate: Category
+    Region: Category
+    Monthly_Income: float
+    Loan_Amount: float
+    loan_purpose: Category
+    home_ownership: Category
+    dependents: float
+    job_completion_rate: float
+    on_time_rate: float
+    avg_response_time_mins: float
+    customer_rating_avg: float
+    job_acceptance_rate: float
+    job_cancellation_count: float
+    weekly_active_days: float
+    membership_duration_months: float
+    simulated_credit_score: Optional[float] = None
+    work_consistency_index: float
+    inactive_days_last_30: float
+    rejected_jobs_last_30: float
+
+
+class ScoreRequest(BaseModel):
+    applicant: Applicant
+    model: Optional[str] = None
+    explanation: Optional[Literal["rules-then-llm", "llm", "rules"]] = None
+    top_factors: int = Field(0, ge=0, description="Strongest per-feature contributions to return")
+
+
+class BatchScoreRequest(BaseModel):
+    applicants: List[Applicant]
+    model: Optional[str] = None
+    # GPT ต่อแถวช้าเกินไปสำหรับ batch จึงรองรับเฉพาะเหตุผลจากเกณฑ์คะแนน
+    explanation: Optional[Literal["rules"]] = None
+    top_factors: int = Field(0, ge=0, description="Strongest per-feature contributions to return")
+
+
+class ScoreResult(BaseModel):
+    prediction: int
+    status: str
+    probabilities: Dict[str, float]
+    prob_default: float
+    confidence: float
+    credit_grade: str
+    grade_description: str
+    reasons: Optional[List[str]] = None
+    factors: Optional[Dict[str, float]] = None
+
+
+class ScoreResponse(ScoreResult):
+    model: str
+    latency_ms: float
+    explanation: Optional[str] = None
+
+
+class BatchScoreResponse(BaseModel):
+    model: str
+    results: List[ScoreResult]
+    latency_ms: float
+
+
+class LatencyTracker:
+    """Keeps the most recent request latencies for percentile reporting."""
+
+    def __init__(self, maxlen: int = 10_000):
+        self._samples = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, latency_ms: float):
+        with self._lock:
+            self._samples.append(latency_ms)
+            self.count += 1
+
+    def percentiles(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            samples = np.fromiter(self._samples, dtype=float)
+        if not len(samples):
+            return {"p50_ms": None, "p99_ms": None}
+        p50, p99 = np.percentile(samples, [50, 99])
+        return {"p50_ms": round(float(p50), 3), "p99_ms": round(float(p99), 3)}
+
+
+def score_applicants(model_file: str, applicants: List[dict], explain_rules: bool = False,
+                     top_factors: int = 0) -> List[dict]:
+    """
+    Scores applicants (form-style dicts) with one model pass and returns one result per applicant.
+
+    With ``explain_rules`` every result also carries the rule-based ``reasons``;
+    with ``top_factors`` > 0 the strongest per-feature contributions towards the
+    predicted class (``factors``).
+    """
+    pipeline = get_pipeline(model_file)
+    rows = pd.DataFrame([pipeline.build_row(applicant) for applicant in applicants])
+    scored = pipeline.score_frame(rows)
+    prob_columns = [c for c in scored.columns if c.startswith("prob_") and c != "prob_default"]
+    reasons = [None] * len(rows)
+    if explain_rules:
+        reasons = get_rule_set().evaluate(rule_scores(rows, scored["prediction"]), rows)
+    factors = [None] * len(rows)
+    if top_factors:
+        attributions = pipeline.attribute(rows, scored["prediction"])
+        names = list(attributions.columns)
+        factors = [dict(top_contributors(row, names, top_factors)) for row in attributions.to_numpy()]
+
+    results = []
+    records = scored.to_dict(orient="records")
+    for applicant, record, applicant_reasons, applicant_factors in zip(applicants, records, reasons, factors):
+        credit_score = applicant.get("simulated_credit_score")
+        grade, grade_desc = get_credit_grade(credit_score) if credit_score is not None else ("N/A", "ไม่สามารถประเมินได้")
+        results.append({
+            "prediction": int(record["prediction"]),
+            "status": record["status"],
+            "probabilities": {c[len("prob_"):]: float(record[c]) for c in prob_columns},
+            "prob_default": float(record["prob_default"]),
+            "confidence": float(record["confidence"]),
+            "credit_grade": grade,
+            "grade_description": grade_desc,
+            "reasons": applicant_reasons,
+            "factors": applicant_factors,
+        })
+    return results
+
+
+def score_applicant_cached(model_file: str, applicant: dict, explain_rules: bool = False,
+                           top_factors: int = 0) -> Tuple[dict, str, dict]:
+    """
+    ``score_applicants`` for one applicant through the shared result cache.
+
+    Returns:
+        tuple: ``(result, key, entry)``; ``entry`` is the cached result under
+        ``key``, whose ``explanation`` holds a stored GPT explanation or None.
+    """
+    pipeline = get_pipeline(model_file)
+    row = pipeline.build_row(applicant)
+    sha256 = get_registry().get_entry(backend_model_file(model_file)).sha256
+    key, entry, _ = pipeline.score_row(row, sha256, attributions=bool(top_factors))
+    prediction = entry["prediction"]
+
+    reasons = None
+    if explain_rules:
+        # เหตุผลจากกฎไม่เก็บใน result cache: ชุดกฎ (CREDIT_RULES_PATH) ไม่อยู่ใน key ของ cache
+        # ที่แชร์ข้าม process และเก็บลงดิสก์ จึงคำนวณจากชุดกฎของ process นี้ (แถวเดียว ใช้เวลาน้อย)
+        rows = pd.DataFrame([row])
+        reasons = get_rule_set().evaluate(rule_scores(rows, [prediction]), rows)[0]
+    factors = None
+    if top_factors:
+        names = list(entry["attributions"])
+        factors = dict(top_contributors(np.fromiter(entry["attributions"].values(), dtype=float), names,
+                                        top_factors))
+
+    credit_score = applicant.get("simulated_credit_score")
+    if entry.get("credit_grade") is not None:
+        grade, grade_desc = entry["credit_grade"], entry["grade_description"]
+    else:
+        # โมเดล C1 ไม่มี simulated_credit_score ในแถว จึงคิดเกรดจากข้อมูลผู้สมัคร
+        grade, grade_desc = get_credit_grade(credit_score) if credit_score is not None else ("N/A", "ไม่สามารถประเมินได้")
+    result = {
+        "prediction": int(prediction),
+        "status": pipeline.class_labels.get(prediction),
+        "probabilities": {str(cls): p for cls, p in zip(entry["classes"], entry["probabilities"])},
+        "prob_default": entry["prob_default"],
+        "confidence": entry["confidence"],
+        "credit_grade": grade,
+        "grade_description": grade_desc,
+        "reasons": reasons,
+        "factors": factors,
+    }
+    return result, key, entry
+
+
+async def explain_with_llm(model_file: str, applicant: dict, result: dict) -> Optional[str]:
+    """GPT reasons for one scored applicant (cached and de-duplicated by the explanation service)."""
+    data = get_pipeline(model_file).build_row(applicant)
+    fields = {field: data.get(field) for field in credit_reason_fields}
+    fields["simulated_credit_score"] = applicant.get("simulated_credit_score")
+    return await get_explanation_service().explain_async(**fields, Loan_Status_3Class=result["status"])
+
+
+def available_models() -> List[str]:
+    problems = check_model_files(model_options)
+    return [f for f in model_options if f not in problems]
+
+
+def warm_up_models():
+    """
+    Loads every model in ``model_options`` and runs one prediction through its
+    pipeline, recording each stage in the startup timings.
+    """
+    timings = get_startup_timings()
+    with timings.timed("check model files"):
+        problems = check_model_files(model_options)
+    for model_file in model_options:
+        if model_file in problems:
+            logger.warning("ข้ามการโหลดโมเดล '%s': %s", model_file, problems[model_file])
+            continue
+        with timings.timed(f"warm up {os.path.basename(model_file).split('_')[0]}"):
+            score_applicants(model_file, [example_applicant], explain_rules=True, top_factors=1)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # โหลดและ warm up ทุกโมเดลครั้งเดียวตอนเริ่ม service
+    # (ใน worker ของ prefork.py โมเดลถูกโหลดไว้แล้วใน process แม่ ขั้นตอนนี้จึงเร็ว)
+    warm_up_models()
+    app.state.executor = ThreadPoolExecutor(max_workers=SCORING_WORKERS, thread_name_prefix="scoring")
+    app.state.latency = LatencyTracker()
+    yield
+    app.state.executor.shutdown(wait=False)
+
+
+app = FastAPI(title="AI-Powered Credit Rating Service", lifespan=lifespan)
+
+
+def _resolve_model(model: Optional[str]) -> str:
+    model_file = model or DEFAULT_MODEL
+    if model_file not in available_models():
+        raise HTTPException(status_code=404, detail=f"Unknown or missing model '{model_file}'")
+    return model_file
+
+
+async def _run_scoring(func, *args):
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        with span("request"):
+            results = await loop.run_in_executor(app.state.executor, func, *args)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return results, (time.perf_counter() - start) * 1000
+
+
+@app.post("/score", response_model=ScoreResponse)
+async def score(request: ScoreRequest):
+    model_file = _resolve_model(request.model)
+    applicant = request.applicant.model_dump()
+    (result, key, entry), latency_ms = await _run_scoring(
+        score_applicant_cached, model_file, applicant, request.explanation in ("rules", "rules-then-llm"),
+        request.top_factors)
+    # latency ของการให้คะแนนไม่รวมเวลารอ GPT
+    app.state.latency.record(latency_ms)
+
+    explanation = None
+    if request.explanation in ("llm", "rules-then-llm"):
+        explanation = entry["explanation"]
+        if explanation is None:
+            explanation = await explain_with_llm(model_file, applicant, result)
+            if explanation is not None:
+                get_result_cache().set(key, {**entry, "explanation": explanation})
+        if explanation is None and result["reasons"]:
+            explanation = "\n\n".join(result["reasons"])
+    return {**result, "model": model_file, "latency_ms": round(latency_ms, 3), "explanation": explanation}
+
+
+@app.post("/score/batch", response_model=BatchScoreResponse)
+async def score_batch(request: BatchScoreRequest):
+    model_file = _resolve_model(request.model)
+    if not request.applicants:
+        return {"model": model_file, "results": [], "latency_ms": 0.0}
+    results, latency_ms = await _run_scoring(score_applicants, model_file,
+                                             [a.model_dump() for a in request.applicants],
+                                             request.explanation == "rules", request.top_factors)
+    return {"model": model_file, "results": results, "latency_ms": round(latency_ms, 3)}
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "models": available_models()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Stage latencies, GPT errors, cache hits and model loads in the Prometheus text format."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats")
+def stats():
+    """Latency percentiles of /score against the configured targets, plus model load, result cache and startup stats."""
+    percentiles = app.state.latency.percentiles()
+    within_target = None
+    if percentiles["p50_ms"] is not None:
+        within_target = (percentiles["p50_ms"] <= LATENCY_TARGET_P50_MS
+                         and percentiles["p99_ms"] <= LATENCY_TARGET_P99_MS)
+    return {
+        "requests": app.state.latency.count,
+        **percentiles,
+        "target_p50_ms": LATENCY_TARGET_P50_MS,
+        "target_p99_ms": LATENCY_TARGET_P99_MS,
+        "within_target": within_target,
+        "workers": SCORING_WORKERS,
+        "pid": os.getpid(),
+        "models": get_registry().stats(),
+        "result_cache": get_result_cache().stats(),
+        "startup": get_startup_timings().rows(),
+    }
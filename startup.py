@@ -0,0 +1,185 @@
+"""
+Cold start of the app and the service: model file checks, background preload
+and warm-up, and a breakdown of where the startup time went.
+
+The first request after a restart used to pay for everything at once:
+unpickling the model, sklearn's lazy imports, building the encoder, the
+attributor and the rule set, and the first-call overheads of each. Here
+every model in ``model_options`` is loaded and scored once on a background
+thread as soon as the process starts, so the UI is up immediately and the
+first submit finds warm models.
+
+``StartupTimings`` collects how long each stage took (imports, file checks,
+load and warm-up per model) for the sidebar of the app, the service's
+``/stats`` and the log.
+
+Configuration (environment variables):
+    PRELOAD_MODELS  "1" (default) preloads and warms every model in the
+                    background; "0" loads each model on first use.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+from model_descriptor import descriptor_path
+
+logger = logging.getLogger(__name__)
+
+preload_enabled = os.environ.get("PRELOAD_MODELS", "1") != "0"
+
+
+class StartupTimings:
+    """
+    Thread-safe, ordered record of startup stages and their durations.
+
+    Every stage is recorded once; later records of the same stage (a Streamlit
+    rerun re-executing the imports) are ignored, so the table keeps the cold
+    numbers.
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, **details):
+        with self._lock:
+            self._stages.setdefault(stage, {"stage": stage, "ms": round(seconds * 1000, 1), **details})
+
+    @contextmanager
+    def timed(self, stage: str, **details):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, **details)
+
+    def rows(self) -> List[dict]:
+        """One dict per stage, in the order they were recorded."""
+        with self._lock:
+            return [dict(row) for row in self._stages.values()]
+
+    def summary(self) -> str:
+        """``"stage 12 ms, ..."`` for the log."""
+        return ", ".join(f"{row['stage']} {row['ms']:.0f} ms" for row in self.rows())
+
+
+_timings = StartupTimings()
+
+
+def get_startup_timings() -> StartupTimings:
+    """The process-wide ``StartupTimings``."""
+    return _timings
+
+
+def check_model_files(model_files: Sequence[str]) -> Dict[str, str]:
+    """
+    Problems with the listed model files, e.g. a model in ``model_options``
+    that is not shipped.
+
+    Returns:
+        dict: Model file -> what is missing; empty when every file is usable.
+    """
+    problems = {}
+    for model_file in model_files:
+        if not os.path.exists(model_file):
+            problems[model_file] = "missing model file"
+        elif not os.path.exists(descriptor_path(model_file)):
+            problems[model_file] = f"missing descriptor {os.path.basename(descriptor_path(model_file))}"
+    return problems
+
+
+def _short(model_file: str) -> str:
+    return os.path.basename(model_file).split("_")[0]
+
+
+def warm_up_model(model_file: str, timings: Optional[StartupTimings] = None):
+    """
+    Loads ``model_file`` and scores ``example_applicant`` once through its pipeline.
+
+    The warm-up runs prediction, attribution and the rule engine, which
+    triggers the lazy imports and one-time setup of each, and stays out of
+    the result cache so it does not count as a request.
+    """
+    from explanations import get_credit_reasons
+    from scoring import example_applicant, get_pipeline
+
+    timings = timings or _timings
+    name = _short(model_file)
+    with timings.timed(f"load {name}"):
+        pipeline = get_pipeline(model_file)
+    with timings.timed(f"warm up {name}"):
+        row = pipeline.build_row(example_applicant)
+        predicted = pipeline.predict_row(row)
+        pipeline.attribute_row(row, predicted.prediction[0])
+        get_credit_reasons(example_applicant["simulated_credit_score"], row)
+
+
+class ModelPreloader:
+    """
+    Loads and warms a list of models on one background thread.
+
+    Args:
+        model_files (Sequence[str]): Models to preload; files with problems
+            (``check_model_files``) are skipped and listed in ``problems``.
+        load (bool): Load the models; False only checks the files.
+
+    Attributes:
+        problems (dict): Model file -> problem found before loading.
+        errors (dict): Model file -> error raised while loading or warming it.
+    """
+
+    def __init__(self, model_files: Sequence[str], load: bool = True):
+        with _timings.timed("check model files"):
+            self.problems = check_model_files(model_files)
+        self.model_files = [f for f in model_files if f not in self.problems] if load else []
+        self.errors: Dict[str, str] = {}
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="model-preload", daemon=True)
+
+    def start(self) -> "ModelPreloader":
+        if self.model_files:
+            self._thread.start()
+        else:
+            self._done.set()
+        return self
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            for model_file in self.model_files:
+                try:
+                    warm_up_model(model_file)
+                except Exception as e:
+                    self.errors[model_file] = f"{type(e).__name__}: {e}"
+            _timings.record("preload total", time.perf_counter() - start)
+            logger.info("startup: %s", _timings.summary())
+        finally:
+            self._done.set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+
+_preloader: Optional[ModelPreloader] = None
+_preloader_lock = threading.Lock()
+
+
+def start_preload(model_files: Sequence[str]) -> ModelPreloader:
+    """
+    Starts the process-wide ``ModelPreloader`` once; later calls return it.
+
+    With ``PRELOAD_MODELS=0`` the files are still checked but nothing is
+    loaded ahead of use.
+    """
+    global _preloader
+    with _preloader_lock:
+        if _preloader is None:
+            _preloader = ModelPreloader(model_files, load=preload_enabled).start()
+        return _preloader
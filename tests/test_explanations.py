@@ -0,0 +1,224 @@
+"""
+``ExplanationService`` caching, de-duplication and streaming, with local
+stand-ins for the OpenAI API (``completion_fn`` and ``stream_fn``), so no
+network access or API key is needed.
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import cache
+from explanations import (
+    ExplanationService, StreamDeadline, StreamStall, credit_reason_fields, get_credit_reasons,
+)
+from scoring import build_data_to_predict, example_applicant, model_options
+
+fields = {field: example_applicant[field] for field in credit_reason_fields}
+rule_reasons_text = "\n\n".join(get_credit_reasons(example_applicant["simulated_credit_score"],
+                                                    build_data_to_predict(example_applicant, model_options[0])))
+
+
+class FakeCompletion:
+    """``prompt -> str`` that counts its calls and can hold them until released."""
+
+    def __init__(self, gate: threading.Event = None):
+        self.prompts = []
+        self.gate = gate
+        self.started = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt: str) -> str:
+        with self._lock:
+            self.prompts.append(prompt)
+            n = len(self.prompts)
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        return f"explanation {n}"
+
+    @property
+    def calls(self) -> int:
+        return len(self.prompts)
+
+
+class FakeTokenSource:
+    """
+    ``prompt -> iterator of tokens``: ``first`` tokens at once, then one
+    token every ``interval`` seconds, each only once ``gate`` (if given) is set.
+    """
+
+    def __init__(self, first: int = 1, interval: float = 0.0, gate: threading.Event = None):
+        self.first = first
+        self.interval = interval
+        self.gate = gate
+        self.pulled = 0
+        self.closed = threading.Event()
+
+    def __call__(self, prompt: str):
+        try:
+            while True:
+                if self.pulled >= self.first:
+                    if self.gate is not None:
+                        self.gate.wait(timeout=5)
+                    time.sleep(self.interval)
+                self.pulled += 1
+                yield f"token{self.pulled} "
+        finally:
+            self.closed.set()
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=clock.time))
+    return clock
+
+
+def test_identical_normalized_inputs_hit_the_cache():
+    fake = FakeCompletion()
+    service = ExplanationService(completion_fn=fake)
+
+    first = service.submit(**fields).result(timeout=5)
+    second = service.submit(**fields).result(timeout=5)
+    prompt = "ข้อมูลลูกค้า\nรายได้ 30000"
+    spaced = service.submit_prompt(prompt).result(timeout=5)
+    respaced = service.submit_prompt("\n  ข้อมูลลูกค้า  \n\tรายได้ 30000\n\n").result(timeout=5)
+
+    assert first == second == "explanation 1"
+    assert spaced == respaced == "explanation 2"
+    assert fake.calls == 2
+    assert service.stats()["hits"] == 2
+
+
+def test_entries_expire_after_ttl(clock):
+    fake = FakeCompletion()
+    service = ExplanationService(completion_fn=fake, ttl_seconds=60)
+
+    service.submit(**fields).result(timeout=5)
+    clock.now += 59
+    assert service.submit(**fields).result(timeout=5) == "explanation 1"
+    clock.now += 2
+    assert service.submit(**fields).result(timeout=5) == "explanation 2"
+    assert fake.calls == 2
+
+
+def test_disk_entries_keep_their_expiry_in_a_new_instance(clock, tmp_path):
+    path = str(tmp_path / "explanations.db")
+    writer = ExplanationService(completion_fn=FakeCompletion(), ttl_seconds=60, cache_path=path)
+    writer.submit(**fields).result(timeout=5)
+
+    clock.now += 40
+    fake = FakeCompletion()
+    reader = ExplanationService(completion_fn=fake, ttl_seconds=60, cache_path=path)
+    assert reader.submit(**fields).result(timeout=5) == "explanation 1"
+    assert reader.stats()["disk_hits"] == 1
+
+    # อ่านจากดิสก์แล้วต้องไม่ได้ TTL เต็มใหม่: หมดอายุที่ 60 วินาทีหลังเขียน
+    clock.now += 21
+    assert reader.submit(**fields).result(timeout=5) == "explanation 1"
+    assert fake.calls == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    fake = FakeCompletion()
+    service = ExplanationService(completion_fn=fake, max_entries=2)
+
+    for prompt in ("a", "b"):
+        service.submit_prompt(prompt).result(timeout=5)
+    service.submit_prompt("a").result(timeout=5)  # "b" เป็นตัวที่ใช้ล่าสุดน้อยที่สุด
+    service.submit_prompt("c").result(timeout=5)
+
+    assert service.submit_prompt("a").result(timeout=5) == "explanation 1"
+    assert service.submit_prompt("b").result(timeout=5) == "explanation 4"
+    assert fake.calls == 4
+    assert service.cache.evictions == 2
+
+
+def test_sqlite_cache_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "explanations.db")
+    writer = ExplanationService(completion_fn=FakeCompletion(), cache_path=path)
+    expected = writer.submit(**fields).result(timeout=5)
+
+    fake = FakeCompletion()
+    reader = ExplanationService(completion_fn=fake, cache_path=path)
+
+    assert reader.submit(**fields).result(timeout=5) == expected
+    assert fake.calls == 0
+    assert reader.stats()["disk_hits"] == 1
+
+
+def test_concurrent_identical_requests_make_one_call():
+    gate = threading.Event()
+    fake = FakeCompletion(gate)
+    service = ExplanationService(completion_fn=fake, max_workers=4)
+
+    first = service.submit(**fields)
+    assert fake.started.wait(timeout=5)
+    futures = [first]
+    threads = [threading.Thread(target=lambda: futures.append(service.submit(**fields))) for _ in range(7)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    gate.set()
+
+    assert {future.result(timeout=5) for future in futures} == {"explanation 1"}
+    assert fake.calls == 1
+    assert service.deduplicated == 7
+
+
+def test_stream_stall_falls_back_to_rule_reasons_and_stops_the_pump():
+    gate = threading.Event()
+    source = FakeTokenSource(first=2, gate=gate)
+    service = ExplanationService(stream_fn=source, stall_timeout=0.2, deadline=30)
+
+    stream = service.stream(fallback_text=rule_reasons_text, **fields)
+    updates = list(stream)
+    gate.set()
+
+    assert updates[:2] == ["token1 ", "token1 token2 "]
+    assert updates[-1] == stream.text == rule_reasons_text
+    assert stream.fell_back and isinstance(stream.error, StreamStall)
+    stream._thread.join(timeout=5)
+    assert not stream._thread.is_alive() and source.closed.is_set()
+    assert source.pulled <= 3
+    # คำตอบที่ไม่ครบไม่ถูกเก็บใน cache
+    assert service.stats()["entries"] == 0
+
+
+def test_stream_deadline_falls_back_to_rule_reasons_and_stops_the_pump():
+    source = FakeTokenSource(first=1, interval=0.02)
+    service = ExplanationService(stream_fn=source, stall_timeout=5, deadline=0.3)
+
+    stream = service.stream(fallback_text=rule_reasons_text, **fields)
+    updates = list(stream)
+
+    assert len(updates) > 2
+    assert updates[-1] == stream.text == rule_reasons_text
+    assert stream.fell_back and isinstance(stream.error, StreamDeadline)
+    stream._thread.join(timeout=5)
+    assert not stream._thread.is_alive() and source.closed.is_set()
+    pulled = source.pulled
+    time.sleep(0.1)
+    assert source.pulled == pulled
+
+
+def test_completed_stream_is_cached():
+    service = ExplanationService(stream_fn=lambda prompt: iter(["สรุป", " ผล "]), stall_timeout=5, deadline=5)
+
+    stream = service.stream(fallback_text=rule_reasons_text, **fields)
+    assert list(stream)[-1] == "สรุป ผล"
+    assert not stream.fell_back and stream.error is None
+    replay = service.stream(fallback_text=rule_reasons_text, **fields)
+    assert list(replay)[-1] == "สรุป ผล"
+    assert service.llm_calls == 1